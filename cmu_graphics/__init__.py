@@ -210,6 +210,7 @@ from cmu_graphics.cmu_graphics import (
     drawRect,
     drawRegularPolygon,
     drawStar,
+    drawCachedLayer,
     ArcShape,
     CircleShape,
     ImageShape,
@@ -277,6 +278,7 @@ __all__.extend(
         'cmu_graphics',
         'dcos',
         'dsin',
+        'drawCachedLayer',
     ]
 )
 __all__.extend(
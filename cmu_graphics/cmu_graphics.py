@@ -3,6 +3,20 @@ import os
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'hide'
 
+from cmu_graphics.libs import loader_util
+
+# Headless apps draw offscreen with no window (see App.runHeadless).
+# SDL's dummy drivers work without a display or a sound card.
+HEADLESS = loader_util.is_headless()
+if HEADLESS:
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+# Set CMU_GRAPHICS_RECORD to a file name to record the session's input there,
+# or CMU_GRAPHICS_REPLAY to play such a file back (see App.runReplay)
+RECORD_PATH = loader_util.get_setting('CMU_GRAPHICS_RECORD')
+REPLAY_PATH = loader_util.get_setting('CMU_GRAPHICS_REPLAY')
+
 from cmu_graphics.shape_logic import TRANSLATED_KEY_NAMES, _ShapeMetaclass
 from cmu_graphics import shape_logic
 
@@ -138,7 +152,8 @@ class Shape(object, metaclass=_ShapeMetaclass):
             isMvc = kwargs['isMvc']
             del kwargs['isMvc']
 
-        for attr in list(kwargs.keys()):
+        # Trusted kwargs (see buildShape) are already translated and checked
+        for attr in [] if shape_logic.TRUST_SHAPE_ARGS else list(kwargs.keys()):
             en_attr = toEnglish(attr, 'shape-attr')
             if attr != en_attr and en_attr is not None:
                 kwargs[en_attr] = kwargs[attr]
@@ -539,13 +554,91 @@ def makeDrawFn(shape):
             )
         if not app._app.inRedrawAll:
             raise MvcException('Cannot draw (modify the view) outside of redrawAll')
-        with NoMvc():
-            kwargs['isMvc'] = True
-            shape(*args, **kwargs)
+        key = kwargs.pop('key', None)
+        if shape is Image and drawImagePlaceholder(args, kwargs):
+            return
+        if app._app.retainedMode:
+            app._app.drawRetained(shape, key, sys._getframe(1), args, kwargs)
+            return
+        buildShape(shape, args, kwargs)
 
     return drawFn
 
 
+IMAGE_PLACEHOLDER_FILL = 'gainsboro'
+
+
+def drawImagePlaceholder(args, kwargs):
+    # While drawImage's url is still loading in the background, draws a plain
+    # rect of the requested size in its place and returns True. Without a width
+    # and height the size isn't known, so the call waits for the image instead.
+    # Headless renders and replays always wait, so they draw the same every time
+    if (
+        HEADLESS
+        or REPLAY_PATH is not None
+        or len(args) != 3
+        or 'width' not in kwargs
+        or 'height' not in kwargs
+        or not shape_logic.isImageLoading(args[0])
+    ):
+        return False
+    rectKwargs = {
+        attr: value
+        for attr, value in kwargs.items()
+        if attr in ('align', 'rotateAngle', 'opacity', 'visible')
+    }
+    buildShape(
+        Rect,
+        (args[1], args[2], kwargs['width'], kwargs['height']),
+        dict(fill=IMAGE_PLACEHOLDER_FILL, **rectKwargs),
+    )
+    return True
+
+
+# (shape class, kwarg names, arg types, kwarg types) -> English kwarg names,
+# for every draw call signature that has passed the full checks
+TRUSTED_SIGNATURES = dict()
+
+
+def buildShape(shapeClass, args, kwargs):
+    # Builds a shape for a draw call. With app.fastDraw, a call whose argument
+    # names and types match one that already passed every check skips the
+    # translation and type checks (so bad values of a known type aren't caught).
+    with NoMvc():
+        if not app._app.fastDraw:
+            return shapeClass(*args, isMvc=True, **kwargs)
+        signature = (
+            shapeClass,
+            tuple(kwargs),
+            tuple(map(type, args)),
+            tuple(map(type, kwargs.values())),
+        )
+        englishNames = TRUSTED_SIGNATURES.get(signature)
+        if englishNames is None:
+            result = shapeClass(*args, isMvc=True, **kwargs)
+            TRUSTED_SIGNATURES[signature] = tuple(
+                toEnglish(attr, 'shape-attr') for attr in kwargs
+            )
+            return result
+        shape_logic.TRUST_SHAPE_ARGS = True
+        try:
+            return shapeClass(
+                *args, isMvc=True, **dict(zip(englishNames, kwargs.values()))
+            )
+        finally:
+            shape_logic.TRUST_SHAPE_ARGS = False
+
+
+# Attributes a retained shape can have changed in place; anything else means
+# building a new shape
+RETAINED_STYLE_ATTRS = {'fill', 'border', 'borderWidth', 'opacity', 'dashes'}
+
+
+def isRetainable(values):
+    # Mutable arguments could change behind our back between frames
+    return not any(isinstance(v, (list, dict, set, bytearray)) for v in values)
+
+
 def makeInvisibleConstructor(shape):
     def constructor(*args, **kwargs):
         if not app._app._isMvc:
@@ -573,6 +666,31 @@ def createDrawingFunctions():
 createDrawingFunctions()
 
 
+class _LayerCapture:
+    # Stands in for the top level group while a cached layer's shapes are drawn
+    def __init__(self, layer):
+        self._shape = layer
+
+    def add(self, shape):
+        self._shape.add(shape)
+
+    def remove(self, shape):
+        self._shape.remove(shape)
+
+
+def drawCachedLayer(key, drawFn, *args, deps=()):
+    # Draws what drawFn(*args) draws, but drawFn only runs again when deps or the
+    # window size changed since this key was last drawn. Otherwise last frame's
+    # pixels are reused. deps should be plain values (tuples, numbers, strings).
+    if not app._app._isMvc:
+        raise Exception(
+            'You called drawCachedLayer (a CPCS Mode function) outside of redrawAll.'
+        )
+    if not app._app.inRedrawAll:
+        raise MvcException('Cannot draw (modify the view) outside of redrawAll')
+    app._app.drawCachedLayer(key, drawFn, args, deps)
+
+
 class KeyName(str):
     def __init__(self, baseKey):
         self.__dict__['accentCombinations'] = accentCombinations(str(self))
@@ -725,14 +843,109 @@ class App(object):
         fn(*args, **kwargs)
 
         if redraw and self._isMvc and baseFnName != 'redrawAll':
+            self.redrawScene()
+
+    def redrawScene(self):
+        # While the run loop is handling a frame's input, handlers only mark the
+        # scene dirty and redrawAll runs once at the end of the frame
+        if self._deferRedraw:
+            self._sceneDirty = True
+        else:
             self.redrawAllWrapper()
 
+    def flushRedraw(self):
+        self._deferRedraw = False
+        if self._sceneDirty:
+            self._sceneDirty = False
+            # A handler that raised has already replaced the scene with the error screen
+            if not self.stopped:
+                self.redrawAllWrapper()
+
     def redrawAllWrapper(self):
         self.group.clear()
 
+        self._layersDrawn = set()
+        self._retainedCounts = dict()
+        self._newRetainedShapes = dict()
         self.inRedrawAll = True
-        self.callUserFn('redrawAll', ())
-        self.inRedrawAll = False
+        try:
+            self.callUserFn('redrawAll', ())
+        finally:
+            self.inRedrawAll = False
+            # Shapes that weren't drawn this time can't be reused next time
+            self._retainedShapes = self._newRetainedShapes
+
+        # Layers that weren't drawn this time (e.g. after a screen change) are dropped
+        for key in list(self._layerCache):
+            if key not in self._layersDrawn:
+                del self._layerCache[key]
+
+    def drawRetained(self, shapeClass, key, caller, args, kwargs):
+        # Draws the shape, reusing the one this call made last frame if only
+        # style attributes changed. Calls without a key are told apart by call
+        # site, then by how many times that call site has run this frame.
+        if key is None:
+            key = (caller.f_code, caller.f_lasti)
+        else:
+            key = ('key', key)
+        key = (shapeClass, key)
+        count = self._retainedCounts.get(key, 0)
+        self._retainedCounts[key] = count + 1
+        key = (key, count)
+
+        tlg = shape_logic.activeDrawing.tlg
+        if isinstance(tlg, _LayerCapture) or not isRetainable(
+            list(args) + list(kwargs.values())
+        ):
+            # Cached layers keep their own shapes
+            buildShape(shapeClass, args, kwargs)
+            return
+
+        entry = self._retainedShapes.get(key)
+        if entry is not None:
+            oldArgs, oldKwargs, oldShape = entry
+            if oldArgs == args and oldKwargs.keys() == kwargs.keys():
+                changed = [
+                    attr for attr in kwargs if not (kwargs[attr] == oldKwargs[attr])
+                ]
+                if all(
+                    toEnglish(attr, 'shape-attr') in RETAINED_STYLE_ATTRS
+                    for attr in changed
+                ):
+                    for attr in changed:
+                        sli.slSetWithTypeCheck(
+                            oldShape._shape, toEnglish(attr, 'shape-attr'), kwargs[attr]
+                        )
+                    # Forget where it was last frame so it goes on top like a new shape
+                    oldShape._shape.oldGroup = None
+                    tlg._shape.add(oldShape._shape)
+                    self._newRetainedShapes[key] = (args, kwargs, oldShape)
+                    return
+
+        newShape = buildShape(shapeClass, args, kwargs)
+        self._newRetainedShapes[key] = (args, kwargs, newShape)
+
+    def drawCachedLayer(self, key, drawFn, args, deps):
+        signature = (deps, self.width, self.height)
+        entry = self._layerCache.get(key)
+        tlg = shape_logic.activeDrawing.tlg
+        if entry is None or entry[0] != signature:
+            # Collect the layer's shapes in their own group instead of the app's
+            layer = shape_logic.CachedLayer({'noGroup': True})
+            sli.setTopLevelGroup(_LayerCapture(layer))
+            try:
+                drawFn(*args)
+            finally:
+                sli.setTopLevelGroup(tlg)
+            layer.render(self.width, self.height)
+            entry = (signature, layer)
+            self._layerCache[key] = entry
+        self._layersDrawn.add(key)
+
+        layer = entry[1]
+        # Forget where it was last frame so it goes on top like a new shape
+        layer.oldGroup = None
+        tlg._shape.add(layer)
 
     @staticmethod
     def getKey(keyCode, modifierMask):
@@ -864,6 +1077,89 @@ class App(object):
         modifiers = self.getModifiers(modifierMask)
         self.callUserFn('onKeyRelease', (key, modifiers))
 
+    def getDisplayList(self):
+        # One (shape, attrs, bounds) per shape that paints itself, in drawing
+        # order, or None if this frame can't be compared with the next one.
+        # Only in CPCS Mode are shapes changed just by drawing them (fresh each
+        # frame, or retained and restyled), so only there are the attrs a
+        # faithful record of what was drawn.
+        if not self._isMvc or self.shouldDrawInspector():
+            return None
+        displayList = []
+        for shape in shape_logic.iterDrawnShapes(self._tlg._shape):
+            if isinstance(shape, shape_logic.CachedLayer):
+                attrs = (id(shape), shape.version)
+            else:
+                if shape.db:
+                    # Debug markers are drawn outside the shape's bounds
+                    return None
+                attrs = dict(shape.attrs)
+            displayList.append((shape, attrs, shape_logic.getDrawnBounds(shape)))
+        return displayList
+
+    def findDamage(self, displayList):
+        # Rects (left, top, width, height) holding every pixel that can differ
+        # from the last frame, or None to redraw the whole window
+        oldList = self._lastDisplayList
+        if oldList is None or displayList is None:
+            return None
+
+        def same(a, b):
+            return a[1] == b[1] and a[2] == b[2]
+
+        # Skip the shapes that match at both ends
+        n = min(len(oldList), len(displayList))
+        start = 0
+        while start < n and same(oldList[start], displayList[start]):
+            start += 1
+        end = 0
+        while end < n - start and same(oldList[-1 - end], displayList[-1 - end]):
+            end += 1
+        oldMiddle = oldList[start : len(oldList) - end]
+        newMiddle = displayList[start : len(displayList) - end]
+
+        bounds = []
+        if len(oldMiddle) == len(newMiddle):
+            # Same stacking order: only the shapes that changed matter
+            for a, b in zip(oldMiddle, newMiddle):
+                if not same(a, b):
+                    bounds.extend([a[2], b[2]])
+        else:
+            bounds.extend(entry[2] for entry in oldMiddle)
+            bounds.extend(entry[2] for entry in newMiddle)
+
+        rects = []
+        for left, top, right, bottom in bounds:
+            left = max(0, math.floor(left))
+            top = max(0, math.floor(top))
+            right = min(self.width, math.ceil(right))
+            bottom = min(self.height, math.ceil(bottom))
+            if left < right and top < bottom:
+                rects.append([left, top, right, bottom])
+
+        # Merge overlapping rects until none overlap
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                for j in range(len(rects) - 1, i, -1):
+                    a, b = rects[i], rects[j]
+                    if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                        rects[i] = [
+                            min(a[0], b[0]),
+                            min(a[1], b[1]),
+                            max(a[2], b[2]),
+                            max(a[3], b[3]),
+                        ]
+                        rects.pop(j)
+                        merged = True
+
+        area = sum((r[2] - r[0]) * (r[3] - r[1]) for r in rects)
+        if len(rects) > 32 or area > self.width * self.height / 2:
+            # Not worth clipping
+            return None
+        return [(r[0], r[1], r[2] - r[0], r[3] - r[1]) for r in rects]
+
     def redrawAll(self, screen, cairo_surface, ctx):
         shape = shape_logic.Rect(
             {
@@ -875,6 +1171,19 @@ class App(object):
                 'fill': self.background or 'white',
             }
         )
+
+        displayList = self.getDisplayList()
+        if self.background != self._lastBackground:
+            damage = None
+        else:
+            damage = self.findDamage(displayList)
+        self._lastDisplayList = displayList
+        self._lastBackground = self.background
+
+        if damage is not None:
+            self.redrawDamage(screen, cairo_surface, ctx, shape, displayList, damage)
+            return
+
         shape.draw(ctx)
 
         ctx.save()
@@ -890,20 +1199,48 @@ class App(object):
         finally:
             ctx.restore()
 
-        # Get the cairo buffer and convert it from BGRA to RGBA
-        data_string = cairo_surface.get_data()
+        # Show the frame
+        screen.blit(self.getFrameSurface(cairo_surface), (0, 0))
+        if not HEADLESS:
+            pygame.display.flip()
 
-        # Create PyGame surface
-        pygame_surface = pygame.image.frombuffer(
-            data_string, (self.width, self.height), 'RGBA'
-        )
+        self.frameworkRedrew = True
 
-        # Show PyGame surface
-        screen.blit(pygame_surface, (0, 0))
-        pygame.display.flip()
+    def redrawDamage(self, screen, cairo_surface, ctx, background, displayList, damage):
+        # Repaints and presents only the damaged rects
+        for left, top, width, height in damage:
+            ctx.save()
+            try:
+                ctx.rectangle(left, top, width, height)
+                ctx.clip()
+                background.draw(ctx)
+                right, bottom = left + width, top + height
+                for shape, attrs, bounds in displayList:
+                    if (
+                        bounds[0] < right
+                        and bounds[2] > left
+                        and bounds[1] < bottom
+                        and bounds[3] > top
+                    ):
+                        shape.draw(ctx)
+            finally:
+                ctx.restore()
+
+        frame_surface = self.getFrameSurface(cairo_surface)
+        for rect in damage:
+            screen.blit(frame_surface, rect[:2], rect)
+        if not HEADLESS:
+            pygame.display.update(damage)
 
         self.frameworkRedrew = True
 
+    def getFrameSurface(self, cairo_surface):
+        # A pygame surface over the cairo surface's own pixels (no copy)
+        cairo_surface.flush()
+        if cairo_surface is self._cairo_surface:
+            return self._frame_surface
+        return pygameSurfaceFromCairoSurface(cairo_surface)
+
     def shouldDrawInspector(self):
         return self.inspectorEnabled and (
             self.paused or self.alwaysShowInspector or self.isCtrlKeyDown
@@ -928,6 +1265,19 @@ class App(object):
 
         self._tlg = Group()
         sli.setTopLevelGroup(self._tlg)
+        self._layerCache = dict()
+        self._layersDrawn = set()
+        self._lastDisplayList = None
+        self._lastBackground = None
+        # Off by default: draw calls build new shapes every frame
+        self.retainedMode = False
+        # Off by default: every draw call is fully checked
+        self.fastDraw = False
+        self._retainedShapes = dict()
+        self._retainedCounts = dict()
+        self._newRetainedShapes = dict()
+        self._deferRedraw = False
+        self._sceneDirty = False
 
         self.paused = False
         self._stopped = False
@@ -985,6 +1335,18 @@ class App(object):
 
     maxShapeCount = property(getMaxShapeCount, setMaxShapeCount)
 
+    def prefetchImages(self, urls):
+        # Starts loading every image in the background, several at a time.
+        # drawImage draws a placeholder for any that haven't arrived yet.
+        for url in urls:
+            shape_logic.prefetchImage(url)
+
+    def handleImagesLoaded(self):
+        # Cached layers may have been drawn with placeholders
+        self._layerCache.clear()
+        if self._isMvc:
+            self.redrawScene()
+
     def updateScreenSize(self):
         if self._running:
             self.updateScreen(True)
@@ -997,7 +1359,7 @@ class App(object):
         # Redraw even if onResize is not present in the user's globals
         self.callUserFn('onResize', (), redraw=False)
         if self._isMvc:
-            self.redrawAllWrapper()
+            self.redrawScene()
 
     def handleSetActiveScreen(self, newScreen, redraw=True):
         self.activeScreen = newScreen
@@ -1123,8 +1485,47 @@ class App(object):
         )
         return p
 
+    def hasStepHandlers(self):
+        # Whether anything runs on a step. If not, only events can change what
+        # is drawn, so the run loop neither steps nor redraws until one arrives.
+        if self.paused or self.stopped:
+            return False
+        if not self._isMvc or len(onStepEvent.receivers) > 0:
+            # Outside of MVC, shapes can also change from the console thread
+            return True
+        if self.getFnNameAndLanguage('onStep', True)[0] is not None:
+            return True
+        return (
+            len(self._allKeysDown) > 0
+            and self.getFnNameAndLanguage('onKeyHold', True)[0] is not None
+        )
+
+    def getStepTimeout(self, lastTick):
+        # ms until the run loop has to wake up by itself, or None if it can
+        # sleep until the next event
+        if len(onMainLoopEvent.receivers) > 0:
+            return 1
+        if not self.hasStepHandlers():
+            return None
+        return lastTick + 1000 / self.stepsPerSecond - 1 - pygame.time.get_ticks()
+
+    def waitForEvents(self, timeout):
+        if timeout is None:
+            # Still wake up now and then, in case another thread called
+            # app.quit() or changed app.paused
+            timeout = MAX_IDLE_WAIT_MS
+        if timeout < 1:
+            return pygame.event.get()
+        event = pygame.event.wait(int(timeout))
+        if event.type == pygame.NOEVENT:
+            return pygame.event.get()
+        return [event] + pygame.event.get()
+
     def updateScreen(self, newScreen):
-        if newScreen:
+        if newScreen and HEADLESS:
+            # Same pixel layout as a display surface (and the frame surface)
+            self._screen = pygame.Surface((self.width, self.height), 0, 32)
+        elif newScreen:
             self._screen = pygame.display.set_mode(
                 (self.width, self.height), pygame.RESIZABLE
             )
@@ -1132,6 +1533,9 @@ class App(object):
             cairo.FORMAT_ARGB32, self.width, self.height
         )
         self._ctx = cairo.Context(self._cairo_surface)
+        self._frame_surface = pygameSurfaceFromCairoSurface(self._cairo_surface)
+        # A new surface starts blank, so the next frame can't reuse anything
+        self._lastDisplayList = None
 
     @_safeMethod
     def run(self):
@@ -1141,80 +1545,280 @@ class App(object):
         self._screen = None
         self.updateScreen(True)
 
+        recorder = None
+        if RECORD_PATH is not None:
+            recorder = event_recording.EventRecorder(
+                RECORD_PATH, self.width, self.height
+            )
+
         lastTick = 0
         self._running = True
+        # The first frame is presented even if nothing happens
+        first_frame = True
 
         while self._running:
             sys.stdout.flush()
+            # Sleep (without holding the lock) until an event arrives or a step is due
+            events = self.waitForEvents(self.getStepTimeout(lastTick))
             with DRAWING_LOCK:
-                had_event = False
-                for event in pygame.event.get():
-                    had_event = True
-                    if not self.stopped:
-                        if event.type == pygame.MOUSEBUTTONDOWN and event.button <= 3:
-                            self.callUserFn(
-                                'onMousePress', (*event.pos, event.button - 1)
-                            )
-                        elif event.type == pygame.MOUSEBUTTONUP and event.button <= 3:
-                            self.callUserFn(
-                                'onMouseRelease', (*event.pos, event.button - 1)
-                            )
-                        elif event.type == pygame.MOUSEMOTION:
-                            if event.buttons == (0, 0, 0):
-                                self.callUserFn('onMouseMove', event.pos)
-                            else:
-                                self.callUserFn(
-                                    'onMouseDrag',
-                                    (
-                                        *event.pos,
-                                        [i for i in range(3) if event.buttons[i] != 0],
-                                    ),
-                                )
-                        elif event.type == pygame.KEYDOWN:
-                            self.handleKeyPress(event.key, event.mod)
-                        elif event.type == pygame.KEYUP:
-                            self.handleKeyRelease(event.key, event.mod)
-                        elif event.type == SET_ACTIVE_SCREEN:
-                            self.handleSetActiveScreen(event.newScreen)
-                        elif event.type == pygame.WINDOWSIZECHANGED:
-                            self.handleResize(event.x, event.y)
-                    if event.type == pygame.QUIT:
-                        self._running = False
-                    elif event.type == pygame.MOUSEMOTION:
-                        self.inspector.setMousePosition(*event.pos)
-                    elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
-                        key = App.getKey(event.key, event.mod)
-                        if key == 'ctrl':
-                            self.isCtrlKeyDown = event.type == pygame.KEYDOWN
-
-                    pygameEvent.send_robust(event, self.callUserFn, self._wrapper)
-
-                should_redraw = had_event
-
-                msPassed = pygame.time.get_ticks() - lastTick
-                if 1000 / self.stepsPerSecond - msPassed < 1:
-                    lastTick = pygame.time.get_ticks()
-                    if not (self.paused or self.stopped):
-                        self.callUserFn('onStep', ())
-                        if len(self._allKeysDown) > 0:
-                            self.callUserFn(
-                                'onKeyHold',
-                                (list(self._allKeysDown), list(self._modifiers)),
-                            )
-                        onStepEvent.send_robust(self.callUserFn, self._wrapper)
-                        should_redraw = True
-
-                if should_redraw:
-                    self.inspector.clearCache()
-                    self.redrawAll(self._screen, self._cairo_surface, self._ctx)
+                ticks = pygame.time.get_ticks()
+                msPassed = ticks - lastTick
+                step = 1000 / self.stepsPerSecond - msPassed < 1
+                if step:
+                    lastTick = ticks
+                if recorder is not None:
+                    # Before the frame runs, so a frame that crashes is kept
+                    recorder.recordFrame(
+                        ticks, events, step, first_frame or len(events) > 0
+                    )
+                self.runFrame(events, step, first_frame)
+                first_frame = False
 
                 onMainLoopEvent.send_robust(msPassed, self.callUserFn, self._wrapper)
 
-                pygame.time.wait(1)
+        if recorder is not None:
+            recorder.close()
+        pygame.quit()
+        cleanAndClose()
+
+    @_safeMethod
+    def runReplay(self, path):
+        # Plays back a recording made with CMU_GRAPHICS_RECORD instead of
+        # reading input. The app gets the same events in the same frames and
+        # steps on the same frames, with the recorded times as its clock, so it
+        # does the same work as in the session. Frames run back to back unless
+        # CMU_GRAPHICS_REPLAY_SPEED is 'realtime'. Each frame is timed; the
+        # trace goes to CMU_GRAPHICS_REPLAY_TRACE (JSON) if that is set.
+        # CMU_GRAPHICS_REPLAY_CHECK names an earlier trace whose frames this
+        # replay's pixels are checked against.
+        width, height, frames = event_recording.readRecording(path)
+        if (width, height) != (self.width, self.height):
+            raise Exception(
+                f'{path} was recorded with a {width}x{height} app, not {self.width}x{self.height}'
+            )
+        realTime = loader_util.get_setting('CMU_GRAPHICS_REPLAY_SPEED') == 'realtime'
+        tracePath = loader_util.get_setting('CMU_GRAPHICS_REPLAY_TRACE')
+        checkPath = loader_util.get_setting('CMU_GRAPHICS_REPLAY_CHECK')
+
+        pygame.init()
+        pygame.display.set_caption(self.title)
+
+        self._screen = None
+        self.updateScreen(True)
+
+        # Images the app prefetched are loaded before the first frame, so no
+        # frame waits on a loader thread. Their IMAGE_LOADED events come from
+        # the recording instead, in the frames they arrived in the session.
+        shape_logic.waitForPendingImages()
+
+        trace = []
+        lastTick = 0
+        self._running = True
+        replayStart = time.perf_counter()
+
+        for ticks, events, step, redraw in frames:
+            if realTime:
+                delay = ticks / 1000 - (time.perf_counter() - replayStart)
+                if delay > 0:
+                    time.sleep(delay)
+            # Real input would change what happens, so only the events the app
+            # posted itself (screen changes and such) are kept, and closing the
+            # window still works. Live IMAGE_LOADED events are replaced by the
+            # recorded ones.
+            posted = []
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self._running = False
+                elif event.type >= pygame.USEREVENT and event.type != IMAGE_LOADED:
+                    posted.append(event)
+            if not self._running:
+                break
+
+            frameStart = time.perf_counter()
+            with DRAWING_LOCK:
+                msPassed = ticks - lastTick
+                if step:
+                    lastTick = ticks
+                self.runFrame(posted + events, step, redraw)
 
+                onMainLoopEvent.send_robust(msPassed, self.callUserFn, self._wrapper)
+            frameMs = 1000 * (time.perf_counter() - frameStart)
+            frame = {'ticks': ticks, 'events': len(events), 'step': step, 'ms': frameMs}
+            if tracePath is not None or checkPath is not None:
+                # Outside the timing: hashing a frame isn't work the app does
+                self._cairo_surface.flush()
+                frame['pixels'] = zlib.crc32(self._cairo_surface.get_data())
+            trace.append(frame)
+            # A recorded quit ends the replay like it ended the session
+            if not self._running:
+                break
+
+        summary = summarizeFrameTimes(trace)
+        print(
+            f"Replayed {summary['frames']} frames in {summary['seconds']:.2f}s: "
+            f"frame time p50 {summary['p50']:.2f} ms, p99 {summary['p99']:.2f} ms, "
+            f"max {summary['max']:.2f} ms"
+        )
+        if tracePath is not None:
+            with open(tracePath, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {
+                        'recording': path,
+                        'realTime': realTime,
+                        'summary': summary,
+                        'frames': trace,
+                    },
+                    f,
+                    indent=1,
+                )
+        if checkPath is not None:
+            print(checkReplayTrace(trace, checkPath))
         pygame.quit()
         cleanAndClose()
 
+    def runHeadless(self):
+        # Like run, but draws into an offscreen surface and returns right away.
+        # The app then only moves when the script calls app.sendMousePress,
+        # app.sendSteps and so on, and app.getScreenshot saves the last frame.
+        pygame.init()
+
+        self._screen = None
+        self.updateScreen(True)
+        self._running = True
+        with DRAWING_LOCK:
+            self.runFrame([], False, True)
+
+    def sendEvents(self, events, step=False):
+        # Runs one frame with the given pygame events, after any events the
+        # app posted itself (e.g. from setActiveScreen)
+        if not HEADLESS:
+            raise Exception('Synthetic events only work in headless mode')
+        if not self._running:
+            raise Exception('Call runApp before sending events')
+        with DRAWING_LOCK:
+            self.runFrame(pygame.event.get() + list(events), step, False)
+
+    def sendMousePress(self, x, y, button=0):
+        self.sendEvents(
+            [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(x, y), button=button + 1)]
+        )
+
+    def sendMouseRelease(self, x, y, button=0):
+        self.sendEvents(
+            [pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(x, y), button=button + 1)]
+        )
+
+    def sendMouseMove(self, x, y, buttons=()):
+        # A move with buttons held is a drag
+        buttons = tuple(int(i in buttons) for i in range(3))
+        self.sendEvents(
+            [pygame.event.Event(pygame.MOUSEMOTION, pos=(x, y), buttons=buttons)]
+        )
+
+    def sendKeyPress(self, key, modifiers=()):
+        keyCode, modifierMask = App.getKeyCode(key, modifiers)
+        self.sendEvents(
+            [pygame.event.Event(pygame.KEYDOWN, key=keyCode, mod=modifierMask)]
+        )
+
+    def sendKeyRelease(self, key, modifiers=()):
+        keyCode, modifierMask = App.getKeyCode(key, modifiers)
+        self.sendEvents(
+            [pygame.event.Event(pygame.KEYUP, key=keyCode, mod=modifierMask)]
+        )
+
+    def sendSteps(self, count=1):
+        for _ in range(count):
+            self.sendEvents([], step=True)
+
+    @staticmethod
+    def getKeyCode(key, modifiers):
+        # The (keyCode, modifierMask) that getKey turns into key
+        modifierMask = 0
+        for modifier in modifiers:
+            modifierMask |= {
+                'shift': pygame.KMOD_SHIFT,
+                'control': pygame.KMOD_CTRL,
+                'meta': pygame.KMOD_META,
+            }[modifier]
+        keyCodes = list(range(34, 127)) + [
+            pygame.K_TAB,
+            pygame.K_RETURN,
+            pygame.K_BACKSPACE,
+            pygame.K_DELETE,
+            pygame.K_ESCAPE,
+            pygame.K_SPACE,
+            pygame.K_RIGHT,
+            pygame.K_LEFT,
+            pygame.K_UP,
+            pygame.K_DOWN,
+            pygame.K_LCTRL,
+        ]
+        for mask in (modifierMask, modifierMask | pygame.KMOD_SHIFT):
+            for keyCode in keyCodes:
+                if App.getKey(keyCode, mask) == key:
+                    return keyCode, mask
+        raise Exception(f'{key!r} is not a key name')
+
+    def runFrame(self, events, step, present):
+        # One pass of the run loop: handles events, takes a step if one is due,
+        # then rebuilds and presents the frame if anything could have changed
+        should_redraw = present
+        # Handlers below only mark the scene dirty; see flushRedraw
+        self._deferRedraw = True
+        for event in coalesceMotionEvents(events):
+            should_redraw = True
+            if not self.stopped:
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button <= 3:
+                    self.callUserFn('onMousePress', (*event.pos, event.button - 1))
+                elif event.type == pygame.MOUSEBUTTONUP and event.button <= 3:
+                    self.callUserFn('onMouseRelease', (*event.pos, event.button - 1))
+                elif event.type == pygame.MOUSEMOTION:
+                    if event.buttons == (0, 0, 0):
+                        self.callUserFn('onMouseMove', event.pos)
+                    else:
+                        self.callUserFn(
+                            'onMouseDrag',
+                            (
+                                *event.pos,
+                                [i for i in range(3) if event.buttons[i] != 0],
+                            ),
+                        )
+                elif event.type == pygame.KEYDOWN:
+                    self.handleKeyPress(event.key, event.mod)
+                elif event.type == pygame.KEYUP:
+                    self.handleKeyRelease(event.key, event.mod)
+                elif event.type == SET_ACTIVE_SCREEN:
+                    self.handleSetActiveScreen(event.newScreen)
+                elif event.type == pygame.WINDOWSIZECHANGED:
+                    self.handleResize(event.x, event.y)
+                elif event.type == IMAGE_LOADED:
+                    self.handleImagesLoaded()
+            if event.type == pygame.QUIT:
+                self._running = False
+            elif event.type == pygame.MOUSEMOTION:
+                self.inspector.setMousePosition(*event.pos)
+            elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                key = App.getKey(event.key, event.mod)
+                if key == 'ctrl':
+                    self.isCtrlKeyDown = event.type == pygame.KEYDOWN
+
+            pygameEvent.send_robust(event, self.callUserFn, self._wrapper)
+
+        if step and self.hasStepHandlers():
+            self.callUserFn('onStep', ())
+            if len(self._allKeysDown) > 0:
+                self.callUserFn(
+                    'onKeyHold', (list(self._allKeysDown), list(self._modifiers))
+                )
+            onStepEvent.send_robust(self.callUserFn, self._wrapper)
+            should_redraw = True
+
+        self.flushRedraw()
+        if should_redraw:
+            self.inspector.clearCache()
+            self.redrawAll(self._screen, self._cairo_surface, self._ctx)
+
 
 class MvcException(Exception):
     pass
@@ -1236,6 +1840,14 @@ class AppWrapper(object):
             'top',
             'setMaxShapeCount',
             'printFullTracebacks',
+            'prefetchImages',
+            'getScreenshot',
+            'sendMousePress',
+            'sendMouseRelease',
+            'sendMouseMove',
+            'sendKeyPress',
+            'sendKeyRelease',
+            'sendSteps',
         ]
     )
     readWriteAttrs = set(
@@ -1251,6 +1863,8 @@ class AppWrapper(object):
             'maxShapeCount',
             'inspectorEnabled',
             'showFontWarnings',
+            'retainedMode',
+            'fastDraw',
         ]
     )
     allAttrs = readOnlyAttrs | readWriteAttrs
@@ -1505,6 +2119,16 @@ def run():
     global MAINLOOP_RUN
     MAINLOOP_RUN = True
 
+    if REPLAY_PATH is not None:
+        # The recording stands in for the user, so there is no console either
+        app._app.runReplay(REPLAY_PATH)
+        return
+
+    if HEADLESS:
+        # No console and no run loop; the script drives the app from here on
+        app._app.runHeadless()
+        return
+
     if not os.environ.get('CI', False):
         threading.Thread(target=CSAcademyConsole().interact).start()
 
@@ -1632,7 +2256,7 @@ def check_for_update():
         pass
 
 
-if 'CMU_GRAPHICS_NO_UPDATE' not in __main__.__dict__:
+if 'CMU_GRAPHICS_NO_UPDATE' not in __main__.__dict__ and not HEADLESS:
     check_for_update()
 
 
@@ -1666,7 +2290,9 @@ from random import *
 from cmu_graphics.utils import *
 import atexit
 import threading
+import time
 import traceback
+import zlib
 
 DRAWING_LOCK = threading.RLock()
 
@@ -1674,6 +2300,7 @@ DRAWING_LOCK = threading.RLock()
 from cmu_graphics.libs import pygame_loader as pygame
 
 ### END ZIPFILE VERSION ###
+from cmu_graphics.libs import event_recording
 
 
 sli = shape_logic.ShapeLogicInterface()
@@ -1688,6 +2315,90 @@ t = sli.t
 SHAPES_CREATED = 0
 MAINLOOP_RUN = False
 SET_ACTIVE_SCREEN = pygame.event.custom_type()
+MAX_IDLE_WAIT_MS = 250
+
+
+def pygameSurfaceFromCairoSurface(cairo_surface):
+    # Shares the cairo surface's memory, and has the same channel layout as a
+    # 32-bit display surface, so blitting it is a plain copy. Frames are opaque,
+    # so alpha is ignored rather than blended.
+    surface = pygame.image.frombuffer(
+        cairo_surface.get_data(),
+        (cairo_surface.get_width(), cairo_surface.get_height()),
+        shape_logic.CAIRO_PIXEL_FORMAT,
+    )
+    surface.set_alpha(None)
+    return surface
+
+
+def coalesceMotionEvents(events):
+    # A fast drag queues many motion events per frame. Only the last of each
+    # run of motion events (with the same buttons held) is kept, so presses,
+    # releases and everything else stay in order around them.
+    coalesced = []
+    for event in events:
+        if (
+            event.type == pygame.MOUSEMOTION
+            and len(coalesced) > 0
+            and coalesced[-1].type == pygame.MOUSEMOTION
+            and coalesced[-1].buttons == event.buttons
+        ):
+            coalesced[-1] = event
+        else:
+            coalesced.append(event)
+    return coalesced
+
+def summarizeFrameTimes(trace):
+    # Frame count, seconds spent in frames and frame time percentiles (ms)
+    frameTimes = sorted(frame['ms'] for frame in trace)
+    if len(frameTimes) == 0:
+        frameTimes = [0]
+
+    def getPercentile(percent):
+        # Nearest rank
+        return frameTimes[max(0, math.ceil(percent / 100 * len(frameTimes)) - 1)]
+
+    return {
+        'frames': len(trace),
+        'seconds': sum(frameTimes) / 1000,
+        'mean': sum(frameTimes) / len(frameTimes),
+        'p50': getPercentile(50),
+        'p90': getPercentile(90),
+        'p99': getPercentile(99),
+        'max': frameTimes[-1],
+    }
+
+
+def checkReplayTrace(trace, checkPath):
+    # Compares this replay's frame pixels with an earlier trace's; returns a
+    # message saying whether they match and, if not, where they first differ
+    with open(checkPath, encoding='utf-8') as f:
+        expectedFrames = json.load(f)['frames']
+    for i, (frame, expected) in enumerate(zip(trace, expectedFrames)):
+        if frame['pixels'] != expected.get('pixels'):
+            return f'Replay differs from {checkPath} at frame {i} (ticks {frame["ticks"]})'
+    if len(trace) != len(expectedFrames):
+        return (
+            f'Replay has {len(trace)} frames but {checkPath} has {len(expectedFrames)}'
+        )
+    return f'Replay matches {checkPath} ({len(trace)} frames)'
+
+
+IMAGE_LOADED = pygame.event.custom_type()
+# Recorded, since when it arrives changes what the app draws
+event_recording.RECORDED_EVENT_TYPES.append(IMAGE_LOADED)
+
+
+def postImageLoadedEvent():
+    # Called from an image loader thread
+    try:
+        pygame.event.post(pygame.event.Event(IMAGE_LOADED))
+    except pygame.error:
+        # No window yet; the first frame will pick the image up
+        pass
+
+
+shape_logic.onImageLoaded = postImageLoadedEvent
 
 
 # Checks to see if a user created shapes but did not call
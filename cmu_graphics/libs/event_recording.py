@@ -0,0 +1,145 @@
+'''
+Recordings of the input App.run handles, for replaying sessions exactly.
+
+A recording is a header (the app's size) followed by one record per frame
+in which anything happened: the frame's time in ms since the app started,
+whether the app stepped and redrew, and the input events of that frame
+(mouse, keys, resizes, quit, and finished background image loads),
+struct-packed. Other pygame events aren't kept; all they do is make the
+frame redraw, which the flags already say.
+
+Replaying hands the app the same events in the same frames and steps it on
+the same frames, with the recorded times as its clock, so a replay does the
+same work as the session did however fast it runs. Anything the app reads
+for itself (the wall clock, random numbers, files) is not recorded.
+'''
+
+import struct
+
+from cmu_graphics.libs import pygame_loader as pygame
+
+MAGIC = b'CMUR'
+VERSION = 1
+HEADER = struct.Struct('<4sHII')  # magic, version, app width, app height
+FRAME = struct.Struct('<IBH')  # time (ms), flags, event count
+EVENT_CODE = struct.Struct('<B')
+MOUSE_BUTTON = struct.Struct('<iiB')  # x, y, button
+MOUSE_MOTION = struct.Struct('<iiB')  # x, y, held buttons as bits
+KEY = struct.Struct('<IH')  # key code, modifiers
+SIZE = struct.Struct('<II')  # new width, new height
+
+STEP_FLAG = 1
+REDRAW_FLAG = 2
+
+# An event's code is its index here. cmu_graphics adds its own IMAGE_LOADED
+# (which has no fields) at the end when it is imported.
+RECORDED_EVENT_TYPES = [
+    pygame.MOUSEBUTTONDOWN,
+    pygame.MOUSEBUTTONUP,
+    pygame.MOUSEMOTION,
+    pygame.KEYDOWN,
+    pygame.KEYUP,
+    pygame.WINDOWSIZECHANGED,
+    pygame.QUIT,
+]
+
+
+class RecordingError(Exception):
+    pass
+
+
+def encodeEvent(event):
+    code = EVENT_CODE.pack(RECORDED_EVENT_TYPES.index(event.type))
+    if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return code + MOUSE_BUTTON.pack(*event.pos, event.button)
+    if event.type == pygame.MOUSEMOTION:
+        heldButtons = sum(1 << i for i in range(3) if event.buttons[i])
+        return code + MOUSE_MOTION.pack(*event.pos, heldButtons)
+    if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+        return code + KEY.pack(event.key, event.mod)
+    if event.type == pygame.WINDOWSIZECHANGED:
+        return code + SIZE.pack(event.x, event.y)
+    return code
+
+
+def decodeEvent(data, offset):
+    # Returns (event, offset just past it)
+    (code,) = EVENT_CODE.unpack_from(data, offset)
+    offset += EVENT_CODE.size
+    if code >= len(RECORDED_EVENT_TYPES):
+        raise RecordingError(f'unknown event code {code}')
+    eventType = RECORDED_EVENT_TYPES[code]
+    if eventType in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        x, y, button = MOUSE_BUTTON.unpack_from(data, offset)
+        event = pygame.event.Event(eventType, pos=(x, y), button=button)
+        offset += MOUSE_BUTTON.size
+    elif eventType == pygame.MOUSEMOTION:
+        x, y, heldButtons = MOUSE_MOTION.unpack_from(data, offset)
+        buttons = tuple((heldButtons >> i) & 1 for i in range(3))
+        event = pygame.event.Event(eventType, pos=(x, y), buttons=buttons)
+        offset += MOUSE_MOTION.size
+    elif eventType in (pygame.KEYDOWN, pygame.KEYUP):
+        key, mod = KEY.unpack_from(data, offset)
+        event = pygame.event.Event(eventType, key=key, mod=mod)
+        offset += KEY.size
+    elif eventType == pygame.WINDOWSIZECHANGED:
+        x, y = SIZE.unpack_from(data, offset)
+        event = pygame.event.Event(eventType, x=x, y=y)
+        offset += SIZE.size
+    else:
+        event = pygame.event.Event(eventType)
+    return event, offset
+
+
+class EventRecorder(object):
+    def __init__(self, path, width, height):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, width, height))
+
+    def recordFrame(self, ticks, events, step, redraw):
+        # Frames where nothing happened are left out
+        events = [event for event in events if event.type in RECORDED_EVENT_TYPES]
+        if not (events or step or redraw):
+            return
+        flags = (STEP_FLAG if step else 0) | (REDRAW_FLAG if redraw else 0)
+        parts = [FRAME.pack(ticks, flags, len(events))]
+        parts.extend(encodeEvent(event) for event in events)
+        self.file.write(b''.join(parts))
+        # The app can end with os._exit, which wouldn't flush for us
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def readRecording(path):
+    # Returns (width, height, frames), where frames is a list of
+    # (ticks, events, step, redraw)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise RecordingError(f'{path} is not a cmu_graphics recording')
+    magic, version, width, height = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise RecordingError(f'{path} is not a cmu_graphics recording')
+    if version != VERSION:
+        raise RecordingError(f'unsupported recording version {version}')
+
+    frames = []
+    offset = HEADER.size
+    # A recording cut off mid-frame (the app crashed) still replays up to there
+    while offset + FRAME.size <= len(data):
+        ticks, flags, eventCount = FRAME.unpack_from(data, offset)
+        frameEnd = offset + FRAME.size
+        events = []
+        try:
+            for i in range(eventCount):
+                event, frameEnd = decodeEvent(data, frameEnd)
+                events.append(event)
+        except struct.error:
+            break
+        frames.append(
+            (ticks, events, bool(flags & STEP_FLAG), bool(flags & REDRAW_FLAG))
+        )
+        offset = frameEnd
+    return width, height, frames
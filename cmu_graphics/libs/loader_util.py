@@ -4,6 +4,7 @@ import struct
 ### END ZIPFILE VERSION ###
 import platform
 import os
+import __main__
 
 min_minor_version = 9
 max_minor_version = 13
@@ -24,7 +25,8 @@ def get_platform_string():
     return plat
 
 def verify_os():
-    if sys.platform not in ["darwin", "win32"]:
+    # Headless apps use the system's pycairo and pygame, so any OS can run them
+    if sys.platform not in ["darwin", "win32"] and not is_headless():
         print("""\
 It looks like your computer is using a(n) %(os)s operating system.
 %(os)s is not currently supported by CMU Graphics. We support Python 3.%(min_minor_version)d
@@ -34,6 +36,19 @@ through Python 3.%(max_minor_version)d on Windows and MacOS."""
         
 ### END ZIPFILE VERSION ###
 
+def is_headless():
+    # Set CMU_GRAPHICS_HEADLESS in the environment, or as a global before
+    # importing cmu_graphics, to draw offscreen with no window
+    return (bool(os.environ.get('CMU_GRAPHICS_HEADLESS'))
+            or 'CMU_GRAPHICS_HEADLESS' in __main__.__dict__)
+
+def get_setting(name):
+    # A setting such as CMU_GRAPHICS_RECORD, from the environment or from a
+    # global set before importing cmu_graphics; None if it isn't set
+    if os.environ.get(name):
+        return os.environ[name]
+    return __main__.__dict__.get(name)
+
 def verify_support():
     python_major, python_minor, _ = platform.python_version_tuple()
     ### ZIPFILE VERSION ###
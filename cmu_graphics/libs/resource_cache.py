@@ -0,0 +1,198 @@
+'''
+Disk cache for images (and any other files) that are loaded by URL.
+
+Each URL has a small metadata file (ETag, Last-Modified, expiry) that points
+at its content, which is stored once under the SHA-256 of its bytes. A fresh
+entry is read straight from disk; a stale one is revalidated with
+If-None-Match / If-Modified-Since, and is still used if the network is down.
+
+URL prefixes can also be mapped to local directories with addLocalMirror, so
+files that ship next to the app (or a test fixture directory) are read
+without ever touching the network:
+
+    resource_cache.addLocalMirror('https://example.com/images/', 'images')
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import urllib.error
+
+from cmu_graphics.libs import webrequest
+
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+def getDefaultCacheDir():
+    cacheDir = os.environ.get('CMU_GRAPHICS_CACHE_DIR')
+    if cacheDir:
+        return cacheDir
+    return os.path.join(os.path.expanduser('~'), '.cmu_graphics_cache')
+
+
+class ResourceCache(object):
+    def __init__(self, cacheDir=None, maxAge=DEFAULT_MAX_AGE):
+        self.cacheDir = cacheDir or getDefaultCacheDir()
+        # Seconds a download is trusted without asking the server again, unless
+        # the response says otherwise (Cache-Control: max-age / no-cache)
+        self.maxAge = maxAge
+        self.localMirrors = []  # (urlPrefix, directory), longest prefix first
+        self.hits = 0
+        self.misses = 0
+
+    def addLocalMirror(self, urlPrefix, directory):
+        mirror = (urlPrefix, os.path.abspath(directory))
+        if mirror in self.localMirrors:
+            return
+        self.localMirrors.append(mirror)
+        self.localMirrors.sort(key=lambda mirror: -len(mirror[0]))
+
+    def getLocalPath(self, url):
+        # The mirrored file for url, or None if no mirror has it
+        for urlPrefix, directory in self.localMirrors:
+            if url.startswith(urlPrefix):
+                relativePath = url[len(urlPrefix) :].split('?')[0].split('#')[0]
+                path = os.path.normpath(os.path.join(directory, relativePath))
+                # Don't let '../' in a URL escape the mirror
+                if path.startswith(directory + os.sep) and os.path.isfile(path):
+                    return path
+        return None
+
+    def getMetadataPath(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, 'urls', name + '.json')
+
+    def getContentPath(self, digest):
+        return os.path.join(self.cacheDir, 'content', digest[:2], digest)
+
+    def get(self, url):
+        # The bytes at url, from a local mirror, the disk cache or the network
+        localPath = self.getLocalPath(url)
+        if localPath is not None:
+            self.hits += 1
+            with open(localPath, 'rb') as f:
+                return f.read()
+
+        metadata = self.readMetadata(url)
+        content = None if metadata is None else self.readContent(metadata['digest'])
+        if content is not None and time.time() < metadata['expires']:
+            self.hits += 1
+            return content
+
+        self.misses += 1
+        headers = dict()
+        if content is not None:
+            if metadata.get('etag'):
+                headers['If-None-Match'] = metadata['etag']
+            if metadata.get('lastModified'):
+                headers['If-Modified-Since'] = metadata['lastModified']
+        try:
+            response = webrequest.get(url, headers)
+            newContent = response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and content is not None:
+                metadata['expires'] = self.getExpiry(e.headers)
+                try:
+                    self.writeMetadata(url, metadata)
+                except OSError:
+                    pass
+                return content
+            raise
+        except OSError:
+            if content is not None:
+                # Offline: an out of date image beats no image
+                return content
+            raise
+
+        try:
+            self.store(url, newContent, response.headers)
+        except OSError:
+            # The cache is only a speedup (e.g. the cache directory is read-only)
+            pass
+        return newContent
+
+    def getExpiry(self, headers):
+        maxAge = self.maxAge
+        cacheControl = (headers.get('Cache-Control') or '').lower()
+        for directive in cacheControl.split(','):
+            directive = directive.strip()
+            if directive in ('no-cache', 'no-store'):
+                maxAge = 0
+            elif directive.startswith('max-age='):
+                try:
+                    maxAge = int(directive[len('max-age=') :])
+                except ValueError:
+                    pass
+        return time.time() + maxAge
+
+    def store(self, url, content, headers):
+        digest = hashlib.sha256(content).hexdigest()
+        contentPath = self.getContentPath(digest)
+        if not os.path.exists(contentPath):
+            writeFileAtomically(contentPath, content)
+        self.writeMetadata(
+            url,
+            {
+                'url': url,
+                'digest': digest,
+                'etag': headers.get('ETag'),
+                'lastModified': headers.get('Last-Modified'),
+                'expires': self.getExpiry(headers),
+            },
+        )
+
+    def readMetadata(self, url):
+        try:
+            with open(self.getMetadataPath(url), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if metadata.get('url') != url or 'digest' not in metadata:
+            return None
+        return metadata
+
+    def writeMetadata(self, url, metadata):
+        data = json.dumps(metadata).encode('utf-8')
+        writeFileAtomically(self.getMetadataPath(url), data)
+
+    def readContent(self, digest):
+        try:
+            with open(self.getContentPath(digest), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        # A torn or edited file is treated as missing
+        if hashlib.sha256(content).hexdigest() != digest:
+            return None
+        return content
+
+
+def writeFileAtomically(path, data):
+    # Other processes (or a crash halfway through) never see a partial file.
+    # The temp file gets a unique name, so threads of one process writing the
+    # same path don't share it.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(
+        dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp', delete=False
+    )
+    try:
+        with f:
+            f.write(data)
+        os.replace(f.name, path)
+    except BaseException:
+        os.remove(f.name)
+        raise
+
+
+defaultCache = ResourceCache()
+
+
+def get(url):
+    return defaultCache.get(url)
+
+
+def addLocalMirror(urlPrefix, directory):
+    defaultCache.addLocalMirror(urlPrefix, directory)
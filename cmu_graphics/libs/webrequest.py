@@ -1,18 +1,186 @@
+'''
+HTTP GETs for cmu_graphics (images, sounds and the update check).
+
+One module-level client keeps a single SSL context (parsing cacert.pem is
+slow) and a few idle keep-alive connections per host, so repeated requests
+to the same server skip the TCP and TLS handshakes. At most MAX_CONCURRENT
+requests are in flight at once, however many threads ask; getMany fetches
+a list of urls in parallel within that limit.
+
+Responses are read in full before get returns (that is what lets the
+connection go back to the pool). Like urllib, redirects are followed and
+any other non-2xx status raises urllib.error.HTTPError.
+'''
+
+import http.client
+import io
 import os
 import ssl
+import threading
+import urllib.error
+import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
+       'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+       'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
+       'Accept-Encoding': 'none',
+       'Accept-Language': 'en-US,en;q=0.8',
+       'Connection': 'keep-alive'
+}
+# This is the October 2025 certifi cacert.pem
+CAFILE_PATH = os.path.join(os.path.dirname(__file__), 'cacert.pem')
+MAX_CONCURRENT = 8
+MAX_IDLE_PER_HOST = 4
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+TIMEOUT = 30
+
+class Response(object):
+    # The parts of urllib's response that callers use, over a body already read
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = io.BytesIO(body)
+
+    def read(self, size=-1):
+        return self.body.read(size)
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class HttpClient(object):
+    def __init__(self, maxConcurrent=MAX_CONCURRENT, maxIdlePerHost=MAX_IDLE_PER_HOST,
+                 timeout=TIMEOUT):
+        self.maxConcurrent = maxConcurrent
+        self.maxIdlePerHost = maxIdlePerHost
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(maxConcurrent)
+        self.lock = threading.Lock()
+        self.sslContext = None
+        # (scheme, host, port) -> idle connections, most recently used last
+        self.idleConnections = dict()
+        self.connectionsOpened = 0
+
+    def getSslContext(self):
+        with self.lock:
+            if self.sslContext is None:
+                self.sslContext = ssl.create_default_context(cafile=CAFILE_PATH)
+            return self.sslContext
+
+    def get(self, url, extraHeaders=None):
+        headers = dict(DEFAULT_HEADERS)
+        if extraHeaders:
+            headers.update(extraHeaders)
+        with self.slots:
+            for i in range(MAX_REDIRECTS + 1):
+                if self.usesProxy(url):
+                    # Leave proxies to urllib, which knows how to talk to them
+                    return urllib.request.urlopen(
+                        urllib.request.Request(url, headers=headers),
+                        context=self.getSslContext(), timeout=self.timeout)
+                response, body = self.request(url, headers)
+                location = response.getheader('Location')
+                if response.status in REDIRECT_STATUSES and location:
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                if not (200 <= response.status < 300):
+                    raise urllib.error.HTTPError(url, response.status, response.reason,
+                                                 response.headers, io.BytesIO(body))
+                return Response(url, response.status, response.reason, response.headers, body)
+        raise urllib.error.HTTPError(url, response.status, 'Too many redirects',
+                                     response.headers, io.BytesIO(body))
+
+    def getMany(self, urls, extraHeaders=None):
+        # Responses in the same order as urls; raises the first error
+        urls = list(urls)
+        if len(urls) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(urls), self.maxConcurrent)) as pool:
+            return list(pool.map(lambda url: self.get(url, extraHeaders), urls))
+
+    def usesProxy(self, url):
+        parts = urllib.parse.urlsplit(url)
+        return (parts.scheme in urllib.request.getproxies()
+                and not urllib.request.proxy_bypass(parts.hostname or ''))
+
+    def request(self, url, headers):
+        # One GET on a pooled connection; returns (response, body)
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f'unsupported url: {url}')
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            connection, reused = self.takeConnection(key)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused:
+                    # The server probably closed it while it sat idle; try a new one
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.releaseConnection(key, connection)
+            return response, body
+
+    def takeConnection(self, key):
+        with self.lock:
+            idle = self.idleConnections.get(key)
+            if idle:
+                return idle.pop(), True
+            self.connectionsOpened += 1
+        scheme, host, port = key
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                                     context=self.getSslContext())
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        return connection, False
+
+    def releaseConnection(self, key, connection):
+        with self.lock:
+            idle = self.idleConnections.setdefault(key, [])
+            if len(idle) < self.maxIdlePerHost:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            idleConnections = self.idleConnections
+            self.idleConnections = dict()
+        for idle in idleConnections.values():
+            for connection in idle:
+                connection.close()
+
+defaultClient = HttpClient()
+
+def get(path, extraHeaders=None):
+    return defaultClient.get(path, extraHeaders)
 
-def get(path):
-    headers = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
-           'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-           'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-           'Accept-Encoding': 'none',
-           'Accept-Language': 'en-US,en;q=0.8',
-           'Connection': 'keep-alive'
-    }
-    request = urllib.request.Request(path, headers=headers)
-    # This is the October 2025 certifi cacert.pem
-    cafile_path = os.path.join(os.path.dirname(__file__), 'cacert.pem')
-    context = ssl.create_default_context(cafile=cafile_path)
-    response = urllib.request.urlopen(request, context=context)
-    return response
+def getMany(paths, extraHeaders=None):
+    return defaultClient.getMany(paths, extraHeaders)
@@ -10,7 +10,7 @@ from cmu_graphics.libs import pygame_loader as pygame
 ### END ZIPFILE VERSION ###
 
 
-from cmu_graphics.libs import webrequest
+from cmu_graphics.libs import resource_cache
 from io import BytesIO
 import array
 import sys
@@ -19,6 +19,8 @@ import atexit
 import unicodedata
 import uuid
 import re
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # fmt: off
 # start_translate
@@ -549,9 +551,18 @@ def getAlignAttrs(align):
     return [xattr, yattr]
 
 
+# The order of a pixel's bytes in cairo's FORMAT_ARGB32, which is a native-endian
+# 32-bit int. Pygame can read and write this layout directly.
+CAIRO_PIXEL_FORMAT = 'BGRA' if sys.byteorder == 'little' else 'ARGB'
+
+
 def cairoSurfaceFromPilImage(image):
     image = image.convert('RGBA')  # ensure we have the correct number of channels
-    a = array.array('B', image.tobytes('raw', 'RGBA'))
+    rgba = image.tobytes('raw', 'RGBA')
+    pixels = bytearray(len(rgba))
+    for i, channel in enumerate(CAIRO_PIXEL_FORMAT):
+        pixels[i::4] = rgba['RGBA'.index(channel) :: 4]
+    a = array.array('B', pixels)
     surface = cairo.ImageSurface.create_for_data(
         a, cairo.FORMAT_ARGB32, image.size[0], image.size[1]
     )
@@ -559,7 +570,7 @@ def cairoSurfaceFromPilImage(image):
 
 
 def cairoSurfaceFromPygameSurface(pygameSurface):
-    a = array.array('B', pygame.image.tostring(pygameSurface, 'RGBA'))
+    a = array.array('B', pygame.image.tostring(pygameSurface, CAIRO_PIXEL_FORMAT))
     surface = cairo.ImageSurface.create_for_data(
         a, cairo.FORMAT_ARGB32, *pygameSurface.get_size()
     )
@@ -590,8 +601,7 @@ def loadImageFromStringReference(reference):
     if reference.startswith('http'):
         # reference is a url
         try:
-            response = webrequest.get(reference)
-            image = pygame.image.load(BytesIO(response.read()))
+            image = pygame.image.load(BytesIO(resource_cache.get(reference)))
         except Exception:
             pyThrow(t('Failed to load image data'))
     else:
@@ -604,11 +614,14 @@ def loadImage(reference):
     referenceHash = hashReference(reference)
 
     if referenceHash not in activeDrawing.images:
+        future = pendingImages.pop(referenceHash, None)
         if isinstance(reference, PILWrapper):
             cairoSurface = reference.surface
+        elif future is not None:
+            # waits if it is still loading, and re-raises the loader's error
+            cairoSurface = future.result()
         else:
-            pygameSurface = loadImageFromStringReference(reference)
-            cairoSurface = cairoSurfaceFromPygameSurface(pygameSurface)
+            cairoSurface = loadImageSurface(reference)
         activeDrawing.images[hashReference(reference)] = cairoSurface
     else:
         cairoSurface = activeDrawing.images[referenceHash]
@@ -616,6 +629,58 @@ def loadImage(reference):
     return {'width': cairoSurface.get_width(), 'height': cairoSurface.get_height()}
 
 
+def loadImageSurface(reference):
+    return cairoSurfaceFromPygameSurface(loadImageFromStringReference(reference))
+
+
+# Background image loading. Futures live in pendingImages (keyed like
+# activeDrawing.images) until loadImage collects them on the drawing thread,
+# so the loader threads never touch the drawing itself.
+IMAGE_LOADER_THREADS = 8
+imageLoader = None
+pendingImages = dict()
+# called from a loader thread whenever an image finishes (or fails) loading
+onImageLoaded = None
+
+
+def prefetchImage(reference):
+    # starts loading reference in the background; returns its future, or None
+    # if there is nothing to wait for
+    if not isinstance(reference, str):
+        return None
+    referenceHash = hashReference(reference)
+    if referenceHash in activeDrawing.images:
+        return None
+    future = pendingImages.get(referenceHash)
+    if future is None:
+        global imageLoader
+        if imageLoader is None:
+            imageLoader = ThreadPoolExecutor(
+                max_workers=IMAGE_LOADER_THREADS, thread_name_prefix='cmu_graphics image'
+            )
+        future = imageLoader.submit(loadImageSurface, reference)
+        pendingImages[referenceHash] = future
+        future.add_done_callback(notifyImageLoaded)
+    return future
+
+
+def notifyImageLoaded(future):
+    if onImageLoaded is not None:
+        onImageLoaded()
+
+
+def waitForPendingImages():
+    # blocks until every background load has finished (or failed)
+    wait(list(pendingImages.values()))
+
+
+def isImageLoading(reference):
+    # True while reference is loading in the background (starting the load
+    # if nobody has asked for it yet)
+    future = prefetchImage(reference)
+    return future is not None and not future.done()
+
+
 shapeAttrs = dict()
 shapeAttrDefaults = dict()
 
@@ -674,6 +739,11 @@ def initShapeAttrs():
 
 initShapeAttrs()
 
+# Set while building a shape whose argument names and types already passed
+# every check once (see App.fastDraw): names are already English and the
+# type checks are skipped
+TRUST_SHAPE_ARGS = False
+
 
 # This metaclass prevents 'cmu_graphics.' from being included in the name
 # of the type, when type() is called on a Shape/rgb/gradient instance
@@ -1118,7 +1188,7 @@ class Shape(object):
         for attr in attrs:
             value = attrs[attr]
             attrSpec = shapeAttrs.get(attr, None)
-            if attrSpec is not None:
+            if attrSpec is not None and not TRUST_SHAPE_ARGS:
                 attrSpec.typeCheckFn(self, attr, value, False)
             result = self.setAttr(attr, value)
             # TODO: Handle labels
@@ -1559,11 +1629,10 @@ class Shape(object):
             return g
         if isinstance(fillOrBorder, str):
             fillOrBorder = CSS3_COLORS_TO_RGB[toEnglish(fillOrBorder, 'color').lower()]
-        # Flips RGBA to BGRA because Cairo is going to flip it back
         rgba = (
-            fillOrBorder.blue / 255,
-            fillOrBorder.green / 255,
             fillOrBorder.red / 255,
+            fillOrBorder.green / 255,
+            fillOrBorder.blue / 255,
             self.opacity / 100,
         )
         return rgba
@@ -1653,27 +1722,30 @@ class Shape(object):
                 [targetX, targetY] = self.getApproxPoints()[
                     6
                 ]  # target start,top of text
-                # rotate around targetX, targetY
-                if self.rotateAngle != 0:
-                    ctx.translate(targetX, targetY)
-                    ctx.rotate(utils.toRadians(self.rotateAngle))
-                    ctx.translate(-targetX, -targetY)
-
-                ctx.select_font_face(*getFont(self.font, self.bold, self.italic))
-                ctx.set_font_size(self.size)
-                text = str(self.value)
+                if not self.drawCachedText(ctx, targetX, targetY, bw):
+                    # rotate around targetX, targetY
+                    if self.rotateAngle != 0:
+                        ctx.translate(targetX, targetY)
+                        ctx.rotate(utils.toRadians(self.rotateAngle))
+                        ctx.translate(-targetX, -targetY)
+
+                    ctx.set_font_face(
+                        textExtentsCache.getFontFace(self.font, self.bold, self.italic)
+                    )
+                    ctx.set_font_size(self.size)
+                    text = str(self.value)
 
-                ctx.new_path()
-                ctx.move_to(targetX - self.attrs['xAdjust'], targetY)
+                    ctx.new_path()
+                    ctx.move_to(targetX - self.attrs['xAdjust'], targetY)
 
-                ctx.text_path(text)
+                    ctx.text_path(text)
 
-                self.setFillOrStrokeStyle(ctx, self.fill)
-                ctx.fill_preserve()
-                if bw:
-                    self.setFillOrStrokeStyle(ctx, self.border)
-                    ctx.set_line_width(bw)
-                    ctx.stroke()
+                    self.setFillOrStrokeStyle(ctx, self.fill)
+                    ctx.fill_preserve()
+                    if bw:
+                        self.setFillOrStrokeStyle(ctx, self.border)
+                        ctx.set_line_width(bw)
+                        ctx.stroke()
             elif isinstance(self, Line):
                 if self.fill:
                     ctx.new_path()
@@ -2210,6 +2282,107 @@ class Group(Shape):
                 shape.scaleToTarget(varName, target)
 
 
+class CachedLayer(Group):
+    # A group that is rasterized once by render() into an offscreen surface
+    # just big enough for what it draws. After that, draw() just paints that
+    # surface back in place. The children are kept so the inspector can still
+    # find them.
+    def __init__(self, attrs):
+        super().__init__(attrs)
+        self.surface = None
+        # Window coordinates of the surface's top-left pixel
+        self.surfaceLeft = 0
+        self.surfaceTop = 0
+        # Bumped on every render so damage tracking can tell the pixels changed
+        self.version = 0
+        self.bounds = None
+
+    def render(self, width, height):
+        # width and height are the window's; nothing outside it is kept
+        self.bounds = None
+        for child in self._shapes:
+            for s in iterDrawnShapes(child):
+                self.bounds = unionBounds(self.bounds, getDrawnBounds(s))
+
+        left = top = right = bottom = 0
+        if self.bounds is not None:
+            left = max(0, math.floor(self.bounds[0]))
+            top = max(0, math.floor(self.bounds[1]))
+            right = min(width, math.ceil(self.bounds[2]))
+            bottom = min(height, math.ceil(self.bounds[3]))
+        self.surfaceLeft = left
+        self.surfaceTop = top
+        self.surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32, max(0, right - left), max(0, bottom - top)
+        )
+        ctx = cairo.Context(self.surface)
+        ctx.translate(-left, -top)
+        for s in self._shapes:
+            s.draw(ctx)
+        self.surface.flush()
+        self.version += 1
+
+    def draw(self, ctx):
+        if self.surface is None:
+            super().draw(ctx)
+            return
+        # Filling just the layer's rect keeps the composite to its pixels
+        ctx.save()
+        ctx.set_source_surface(self.surface, self.surfaceLeft, self.surfaceTop)
+        ctx.rectangle(
+            self.surfaceLeft,
+            self.surfaceTop,
+            self.surface.get_width(),
+            self.surface.get_height(),
+        )
+        ctx.fill()
+        ctx.restore()
+
+
+def iterDrawnShapes(shape):
+    # Every shape that paints itself, in drawing order. Groups are walked into,
+    # but a rendered CachedLayer paints as one piece.
+    if isinstance(shape, CachedLayer) and shape.surface is not None:
+        if shape.bounds is not None:
+            yield shape
+    elif shape.isGroup:
+        for s in shape._shapes:
+            yield from iterDrawnShapes(s)
+    else:
+        yield shape
+
+
+def getDrawnBounds(shape):
+    # (left, top, right, bottom) covering every pixel shape.draw can touch,
+    # with a little extra for antialiasing
+    if isinstance(shape, CachedLayer):
+        return shape.bounds
+    margin = 2
+    if isinstance(shape, Line):
+        margin += shape.lineWidth + min(50, 10 * math.sqrt(shape.lineWidth)) / 3
+    else:
+        if isinstance(shape, Label):
+            margin += shape.size / 2
+        # Borders are stroked on the edge, so half of one can stick out
+        if getattr(shape, 'border', None):
+            margin += shape.borderWidth
+    left, top, right, bottom = shape.left, shape.top, shape.right, shape.bottom
+    if shape.rotateAngle:
+        # Whatever the angle, the shape stays inside this square
+        cx, cy = (left + right) / 2, (top + bottom) / 2
+        r = math.hypot(right - left, bottom - top) / 2
+        left, top, right, bottom = cx - r, cy - r, cx + r, cy + r
+    return (left - margin, top - margin, right + margin, bottom + margin)
+
+
+def unionBounds(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
 fontCtx = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 0, 0))
 
 
@@ -2250,6 +2423,126 @@ def getFont(baseFontName, isBold=False, isItalic=False):
     return (fontName, italic, bold)
 
 
+class TextExtentsCache(object):
+    # LRU cache of text_extents results keyed by (font, bold, italic, size, text),
+    # plus the cairo font face for each (font, bold, italic). Labels are rebuilt
+    # every frame in CPCS Mode, almost always with the same text.
+    def __init__(self, maxSize=1024):
+        self.maxSize = maxSize
+        self.extents = collections.OrderedDict()
+        self.fontFaces = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def getFontFace(self, font, bold, italic):
+        key = (font, bold, italic)
+        fontFace = self.fontFaces.get(key)
+        if fontFace is None:
+            fontFace = cairo.ToyFontFace(*getFont(font, bold, italic))
+            self.fontFaces[key] = fontFace
+        return fontFace
+
+    def lookup(self, font, bold, italic, size, text):
+        # Returns (fontFace, (xBearing, yBearing, width, height, xAdvance, yAdvance))
+        fontFace = self.getFontFace(font, bold, italic)
+        key = (font, bold, italic, size, text)
+        extents = self.extents.get(key)
+        if extents is not None:
+            self.hits += 1
+            self.extents.move_to_end(key)
+            return fontFace, extents
+
+        self.misses += 1
+        fontCtx.save()
+        fontCtx.set_font_face(fontFace)
+        fontCtx.set_font_size(size)
+        extents = tuple(fontCtx.text_extents(text))
+        fontCtx.restore()
+        self.extents[key] = extents
+        if len(self.extents) > self.maxSize:
+            self.extents.popitem(last=False)
+        return fontFace, extents
+
+    def clear(self):
+        self.extents.clear()
+        self.fontFaces.clear()
+        self.hits = self.misses = 0
+
+
+textExtentsCache = TextExtentsCache()
+
+
+class SurfaceCache(object):
+    # LRU of pre-rendered cairo surfaces (or tuples holding one), limited by the
+    # total bytes of pixel data rather than by count
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.entries = collections.OrderedDict()  # key -> (value, byteCount)
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, byteCount):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.totalBytes -= old[1]
+        if byteCount > self.maxBytes:
+            return
+        self.entries[key] = (value, byteCount)
+        self.totalBytes += byteCount
+        while self.totalBytes > self.maxBytes:
+            _, (_, evictedBytes) = self.entries.popitem(last=False)
+            self.totalBytes -= evictedBytes
+
+    def clear(self):
+        self.entries.clear()
+        self.totalBytes = 0
+        self.hits = self.misses = 0
+
+
+def getSurfaceBytes(surface):
+    return surface.get_stride() * surface.get_height()
+
+
+labelSurfaceCache = SurfaceCache(4 * 1024 * 1024)
+imageSurfaceCache = SurfaceCache(32 * 1024 * 1024)
+
+
+def renderTransformedImage(source, a, b, c, d, fracX, fracY):
+    # Resamples source through the linear map (a, b, c, d) (a cairo.Matrix's
+    # xx, yx, xy, yy) once, with the best filter. Returns (surface, offsetX,
+    # offsetY), where offset is the surface's top-left relative to the whole
+    # pixel the image's origin falls in.
+    width, height = source.get_width(), source.get_height()
+    corners = [(0, 0), (width, 0), (width, height), (0, height)]
+    xs = [a * u + c * v for u, v in corners]
+    ys = [b * u + d * v for u, v in corners]
+    offsetX, offsetY = math.floor(min(xs)), math.floor(min(ys))
+    surface = cairo.ImageSurface(
+        cairo.FORMAT_ARGB32,
+        max(1, math.ceil(max(xs)) - offsetX + 1),
+        max(1, math.ceil(max(ys)) - offsetY + 1),
+    )
+    ctx = cairo.Context(surface)
+    ctx.translate(fracX - offsetX, fracY - offsetY)
+    ctx.transform(cairo.Matrix(a, b, c, d, 0, 0))
+    pattern = cairo.SurfacePattern(source)
+    pattern.set_filter(cairo.FILTER_BEST)
+    ctx.set_source(pattern)
+    ctx.paint()
+    surface.flush()
+    return (surface, offsetX, offsetY)
+
+
 def maybe_show_font_warning(fontName):
     if SHOW_FONT_WARNINGS and fontName.lower() in FONTS_SHOW_WARNING:
         FONTS_SHOW_WARNING.remove(fontName.lower())
@@ -2270,22 +2563,107 @@ class Label(Shape):
     def getApproxPoints(self):
         return self.attrs['approxPoints']
 
+    def drawCachedText(self, ctx, targetX, targetY, bw):
+        # Paints the label from labelSurfaceCache, rendering it there first if
+        # needed. Returns False if it has to be drawn as a path instead.
+        xx, yx, xy, yy, x0, y0 = ctx.get_matrix()
+        if (xx, yx, xy, yy) != (1, 0, 0, 1):
+            return False
+        fillStyle = self.getFillOrStrokeStyle(self.fill)
+        borderStyle = self.getFillOrStrokeStyle(self.border) if bw else None
+        if isinstance(fillStyle, cairo.Gradient) or isinstance(
+            borderStyle, cairo.Gradient
+        ):
+            return False
+
+        # Whole device pixels go into where the surface is painted, quarter
+        # pixels into how the text sits inside it
+        deviceX, deviceY = targetX + x0, targetY + y0
+        wholeX, wholeY = math.floor(deviceX), math.floor(deviceY)
+        fracX = round((deviceX - wholeX) * 4) / 4
+        fracY = round((deviceY - wholeY) * 4) / 4
+
+        text = str(self.value)
+        key = (
+            text,
+            self.font,
+            self.bold,
+            self.italic,
+            self.size,
+            self.attrs['xAdjust'],
+            self.rotateAngle,
+            fillStyle,
+            borderStyle,
+            bw,
+            fracX,
+            fracY,
+        )
+        entry = labelSurfaceCache.get(key)
+        if entry is None:
+            entry = self.renderText(text, fracX, fracY, fillStyle, borderStyle, bw)
+            labelSurfaceCache.put(key, entry, getSurfaceBytes(entry[0]))
+        surface, offsetX, offsetY = entry
+        ctx.set_source_surface(surface, wholeX + offsetX - x0, wholeY + offsetY - y0)
+        ctx.paint()
+        return True
+
+    def renderText(self, text, fracX, fracY, fillStyle, borderStyle, bw):
+        # Returns (surface, offsetX, offsetY), where the surface's top-left goes
+        # at offset pixels from the whole-pixel part of the text's target point
+        fontFace, extents = textExtentsCache.lookup(
+            self.font, self.bold, self.italic, self.size, text
+        )
+        xBearing, yBearing, width, height, xAdvance, yAdvance = extents
+        startX = -self.attrs['xAdjust']
+        margin = bw + 2
+        corners = [
+            (startX + xBearing - margin, yBearing - margin),
+            (startX + xBearing + width + margin, yBearing - margin),
+            (startX + xBearing + width + margin, yBearing + height + margin),
+            (startX + xBearing - margin, yBearing + height + margin),
+        ]
+        angle = utils.toRadians(self.rotateAngle)
+        cos, sin = math.cos(angle), math.sin(angle)
+        xs = [x * cos - y * sin for x, y in corners]
+        ys = [x * sin + y * cos for x, y in corners]
+        offsetX, offsetY = math.floor(min(xs)), math.floor(min(ys))
+        surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32,
+            math.ceil(max(xs)) - offsetX + 1,
+            math.ceil(max(ys)) - offsetY + 1,
+        )
+
+        ctx = cairo.Context(surface)
+        ctx.translate(fracX - offsetX, fracY - offsetY)
+        if self.rotateAngle != 0:
+            ctx.rotate(angle)
+        ctx.set_font_face(fontFace)
+        ctx.set_font_size(self.size)
+        ctx.new_path()
+        ctx.move_to(startX, 0)
+        ctx.text_path(text)
+        ctx.set_source_rgba(*fillStyle)
+        ctx.fill_preserve()
+        if bw:
+            ctx.set_source_rgba(*borderStyle)
+            ctx.set_line_width(bw)
+            ctx.stroke()
+        surface.flush()
+        return (surface, offsetX, offsetY)
+
     def doRotate(self, degrees, cx, cy):
         newCenter = utils.rotatePoint([self.centerX, self.centerY], degrees, cx, cy)
         self.set({'centerX': newCenter[0], 'centerY': newCenter[1]})
         self.setDims()
 
     def setDims(self):
-        fontCtx.save()
-        fontCtx.select_font_face(*getFont(self.font, self.bold, self.italic))
-        fontCtx.set_font_size(self.size)
-
         cx = self.attrs['centerX']
         cy = self.attrs['centerY']
         stringValue = utils.convertLabelValue(self.value)
-        xBearing, yBearing, width, height, xAdvance, yAdvance = fontCtx.text_extents(
-            stringValue
+        fontFace, extents = textExtentsCache.lookup(
+            self.font, self.bold, self.italic, self.size, stringValue
         )
+        xBearing, yBearing, width, height, xAdvance, yAdvance = extents
         height = -yBearing
         unrotatedWidth = width
         hasOuterSpaces = len(stringValue) > 0 and (
@@ -2315,7 +2693,6 @@ class Label(Shape):
         self.set({'approxPoints': pts, 'xAdjust': 0 if hasOuterSpaces else xBearing})
         box = utils.getBoxDims(pts)
         self.set({'width': box['width'], 'height': box['height']})
-        fontCtx.restore()
 
     def get_area(self):
         return self.width * self.height
@@ -3135,11 +3512,51 @@ class CMUImage(PolygonWithTransform):
 
     def drawImage(self, ctx):
         mat = self.transformMatrix
+        if self.drawCachedImage(ctx, mat):
+            return
         ctx.translate(self.pointList[0][0], self.pointList[0][1])
         ctx.transform(cairo.Matrix(mat[0][0], mat[1][0], mat[0][1], mat[1][1], 0, 0))
         ctx.set_source_surface(activeDrawing.images[hashReference(self.url)], 0, 0)
         ctx.paint_with_alpha(self.opacity / 100)
 
+    def drawCachedImage(self, ctx, mat):
+        # Paints the image already scaled and rotated from imageSurfaceCache,
+        # resampling it there first if needed. Returns False if it has to be
+        # drawn through the transform instead.
+        xx, yx, xy, yy, x0, y0 = ctx.get_matrix()
+        if (xx, yx, xy, yy) != (1, 0, 0, 1):
+            return False
+        source = activeDrawing.images[hashReference(self.url)]
+        a, b, c, d = mat[0][0], mat[1][0], mat[0][1], mat[1][1]
+        if a * d - b * c == 0:
+            return False
+
+        # Whole device pixels go into where the surface is painted, quarter
+        # pixels into how the image sits inside it
+        deviceX, deviceY = self.pointList[0][0] + x0, self.pointList[0][1] + y0
+        wholeX, wholeY = math.floor(deviceX), math.floor(deviceY)
+        fracX = round((deviceX - wholeX) * 4) / 4
+        fracY = round((deviceY - wholeY) * 4) / 4
+
+        key = (
+            hashReference(self.url),
+            id(source),
+            round(a, 6),
+            round(b, 6),
+            round(c, 6),
+            round(d, 6),
+            fracX,
+            fracY,
+        )
+        entry = imageSurfaceCache.get(key)
+        if entry is None:
+            entry = renderTransformedImage(source, a, b, c, d, fracX, fracY)
+            imageSurfaceCache.put(key, entry, getSurfaceBytes(entry[0]))
+        surface, offsetX, offsetY = entry
+        ctx.set_source_surface(surface, wholeX + offsetX - x0, wholeY + offsetY - y0)
+        ctx.paint_with_alpha(self.opacity / 100)
+        return True
+
     def toString(self):
         args = [self.left, self.top, self.width, self.height]
         return t('Image{{args}}', {'args': utils.roundedTupleString(args, 2)})
@@ -3779,8 +4196,8 @@ class Inspector(object):
             return
 
         black = (0, 0, 0)
-        red = (0, 0, 255)
-        gold = (0, 215, 255)
+        red = (255, 0, 0)
+        gold = (255, 215, 0)
         white = (255, 255, 255)
 
         for pt in self.keyPoints:
@@ -4011,6 +4428,8 @@ class ShapeLogicInterface(object):
         actualClass = clsName
         if clsName == 'Image':
             actualClass = 'CMUImage'
+        if TRUST_SHAPE_ARGS:
+            return self.slInitTrustedShape(actualClass, argNames, args, kwargs, isMvc)
         checkArgCount(clsName, None, argNames, args)
         for attr in kwargs:
             if shapeAttrs.get(attr, None) is None:
@@ -4059,5 +4478,31 @@ class ShapeLogicInterface(object):
             raise e
         return shape
 
+    def slInitTrustedShape(self, actualClass, argNames, args, kwargs, isMvc):
+        # slInitShape without the checks, for arguments that passed them before
+        constructorArgs = dict(zip(argNames, args))
+        constructorArgs['isMvc'] = isMvc
+        shape = self.slNew(actualClass, constructorArgs)
+        try:
+            align = kwargs.pop('align', None)
+            for attr in kwargs:
+                setattr(shape, attr, kwargs[attr])
+            if align is not None:
+                xPoint = (
+                    constructorArgs.get('left', None)
+                    if constructorArgs.get('centerX', None) is None
+                    else constructorArgs['centerX']
+                )
+                yPoint = (
+                    constructorArgs.get('top', None)
+                    if constructorArgs.get('centerY', None) is None
+                    else constructorArgs['centerY']
+                )
+                shape.doAlign(xPoint, yPoint, align)
+        except Exception as e:
+            activeDrawing.tlg.remove(shape)
+            raise e
+        return shape
+
     def setTopLevelGroup(self, tlg):
         activeDrawing.tlg = tlg
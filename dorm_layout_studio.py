@@ -1,6 +1,16 @@
 from cmu_graphics import *
 from cmu_cpcs_utils import *
+from layout_geometry import rectsOverlap
+from layout_model import (ROOM_PRESETS, Furniture, Room, getScaleFactors,
+                          formatDistanceInches)
+from layout_solver import solvePacking
+from layout_optimizer import optimizeLayout, RoomGeometry
+from layout_format import makeDocument, saveDocument, loadDocument, LayoutLibrary, LayoutFormatError
+from layout_thumbnails import renderThumbnails, getThumbnailPath
+from layout_history import LayoutHistory
+from cmu_graphics.libs import resource_cache
 import copy
+import os
 
 '''
 Dorm Layout Studio (KEY FEATURES FOR GRADING)
@@ -49,6 +59,18 @@ Undo / Redo & Trash
 - Drag a furniture piece onto the trash can (bottom-right) and release to delete it;
   this action is also undoable
 
+Auto-fill
+
+- Press 'a' to replace the furniture with one bed, closet, and desk per resident,
+  packed automatically (pieces may be rotated); this action is also undoable
+- Press 'o' to rearrange the current furniture for more open floor space;
+  every step stays a valid placement, and this action is also undoable
+
+Save / open
+
+- Press 's' to save the design (room, furniture, measurements) to app.designFile
+  and 'l' to open it again (binary by default, JSON if the name ends in .json)
+
 '''
 
 ################################################
@@ -60,6 +82,11 @@ def onAppStart(app):
     # IMAGES AND BACKGROUND
     ################################################
     
+    # these images also ship next to this file, so they are read from disk
+    # instead of downloaded (see cmu_graphics/libs/resource_cache.py)
+    resource_cache.addLocalMirror('https://raw.githubusercontent.com/JosephOuyang/dorm_layout_studio/master/',
+                                  os.path.dirname(os.path.abspath(__file__)))
+    
     # images (Source: ChatGPT Image Generator)
     app.bedImage = 'https://raw.githubusercontent.com/JosephOuyang/dorm_layout_studio/master/bed2.jpg'
     app.closetImage = 'https://raw.githubusercontent.com/JosephOuyang/dorm_layout_studio/master/closet2.jpg'
@@ -71,6 +98,12 @@ def onAppStart(app):
     app.triplePreviewImage = 'https://raw.githubusercontent.com/JosephOuyang/dorm_layout_studio/master/triple_preview.png'
     app.rulerImage = 'https://raw.githubusercontent.com/JosephOuyang/dorm_layout_studio/master/ruler2.png'
     
+    # load them all at once in the background; until one arrives, drawImage
+    # draws a gray placeholder of the same size
+    # (the layout previews are usually replaced, see renderPresetPreviews)
+    app.prefetchImages([app.bedImage, app.closetImage, app.deskImage, app.trashImage,
+                        app.titleImage, app.rulerImage])
+    
     # background color
     app.background = rgb(254, 247, 232)
     
@@ -138,26 +171,30 @@ def onAppStart(app):
     # ROOM LAYOUTS
     ################################################
     
+    # columnar NumPy furniture store for huge generated scenes (needs numpy);
+    # the spatial grid alone is faster for normal rooms
+    app.useFurnitureStore = False
+    
+    # reuse last frame's shapes for draw calls whose arguments didn't change
+    app.retainedMode = True
+    
+    # under python -O, draw calls whose argument types already passed the checks skip them
+    app.fastDraw = not __debug__
+    
     # initialize room with dummy values
-    app.room = Room(0, 0, 0, 0, (0, 0, 0, 0), [])
+    app.room = Room(0, 0, 0, 0, (0, 0, 0, 0), [], useStore = app.useFurnitureStore)
     
     # deafult single room dimensions
-    app.singleRoomLeft = 300
-    app.singleRoomTop = 130
-    app.singleRoomWidth = 420
-    app.singleRoomHeight = 290
+    (app.singleRoomLeft, app.singleRoomTop,
+     app.singleRoomWidth, app.singleRoomHeight) = ROOM_PRESETS['single']['roomRect']
     
     # default double room dimensions
-    app.doubleRoomLeft = 300
-    app.doubleRoomTop = 100
-    app.doubleRoomWidth = 420
-    app.doubleRoomHeight = 500
+    (app.doubleRoomLeft, app.doubleRoomTop,
+     app.doubleRoomWidth, app.doubleRoomHeight) = ROOM_PRESETS['double']['roomRect']
     
     # default triple room dimensions
-    app.tripleRoomLeft = 300
-    app.tripleRoomTop = 100
-    app.tripleRoomWidth = 650
-    app.tripleRoomHeight = 400
+    (app.tripleRoomLeft, app.tripleRoomTop,
+     app.tripleRoomWidth, app.tripleRoomHeight) = ROOM_PRESETS['triple']['roomRect']
     
     # door/window sizes (shared)
     app.doorWidth = 70
@@ -206,6 +243,16 @@ def onAppStart(app):
     app.paletteTop = 100
     app.paletteSpacing = 160
     
+    # what 'a' (auto-fill) packs into each layout: one set per resident
+    app.autoFillCounts = {
+        'single' : {'bed' : 1, 'closet' : 1, 'desk' : 1},
+        'double' : {'bed' : 2, 'closet' : 2, 'desk' : 2},
+        'triple' : {'bed' : 3, 'closet' : 3, 'desk' : 3}
+    }
+    
+    # what 'o' (optimize) improves: a name from layout_optimizer.SCORES or a WeightedScore
+    app.optimizeScore = 'openFloor'
+    
     # trash bin (bottom-right)
     
     app.trashSize = 100
@@ -270,17 +317,32 @@ def onAppStart(app):
     # UNDO / REDO HISTORY 
     ################################################
     
-    app.history = []
-    app.redoStack = []
+    # only changed fields are stored per action; past the memory cap the oldest
+    # steps are dropped (see layout_history)
+    app.history = LayoutHistory(maxBytes = 4 * 1024 * 1024)
     app.didDrag = False
     
+    ################################################
+    # SAVE / OPEN
+    ################################################
+    
+    # 's' saves here and 'l' opens it (see layout_format for the file format)
+    app.designFile = 'my_dorm_layout.dls'
+    
+    ################################################
+    # LAYOUT PREVIEWS
+    ################################################
+    
+    # drawn from the preset loaders themselves so they never drift from them
+    renderPresetPreviews(app)
+    
 ##########################################
 # LAYOUT HELPERS
 ##########################################
     
 def loadSingleLayout(app):
     # clears room, then load default single room
-    app.room.furnitureList = []
+    app.room.clearFurniture()
     app.currentLayout = 'single'
     
     app.room.roomLeft = app.singleRoomLeft
@@ -322,13 +384,11 @@ def loadSingleLayout(app):
     app.room.addFurniture(desk)  
     
     # reset history upon entering initial state
-    app.history = []
-    app.redoStack = []
-    registerAction(app)
+    app.history.reset(app)
     
 def loadDoubleLayout(app):
     # clears room, then load default double room
-    app.room.furnitureList = []
+    app.room.clearFurniture()
     app.currentLayout = 'double'
     
     app.room.roomLeft = app.doubleRoomLeft
@@ -389,13 +449,11 @@ def loadDoubleLayout(app):
     app.room.addFurniture(desk2)
     
     # reset history upon entering initial state
-    app.history = []
-    app.redoStack = []
-    registerAction(app)
+    app.history.reset(app)
     
 def loadTripleLayout(app):
     # clears room, then load default triple room
-    app.room.furnitureList = []
+    app.room.clearFurniture()
     app.currentLayout = 'triple'
     
     app.room.roomLeft = app.tripleRoomLeft
@@ -466,9 +524,110 @@ def loadTripleLayout(app):
     app.room.addFurniture(desk2)
     
     # reset history upon entering initial state
-    app.history = []
-    app.redoStack = []
-    registerAction(app)
+    app.history.reset(app)
+    
+def renderPresetPreviews(app):
+    # renders each preset to a thumbnail (only when a preset or image changed)
+    # and uses those on the layout-select screen instead of the shipped PNGs
+    presetLoaders = {'single' : loadSingleLayout, 'double' : loadDoubleLayout,
+                     'triple' : loadTripleLayout}
+    
+    # twice the size the select screen draws them at, like the shipped PNGs
+    previewWidth = 2 * app.layoutPreviewWidth
+    previewHeight = 2 * 5 * app.layoutButtonHeight
+    previewSizes = {'single' : (previewWidth, previewHeight * 3 // 5),
+                    'double' : (previewWidth, previewHeight),
+                    'triple' : (previewWidth, previewHeight * 3 // 5)}
+    
+    layoutsBySize = dict()
+    for (layout, loadLayout) in presetLoaders.items():
+        loadLayout(app)
+        document = makeDocument(snapshotRoom(app), layout,
+                                (app.room.roomLeft, app.room.roomTop, app.room.roomWidth, app.room.roomHeight),
+                                app.room.doorRect, app.room.windowRects)
+        layoutsBySize.setdefault(previewSizes[layout], []).append((layout, document))
+    # the design screen loads its own layout when one is picked
+    app.room.clearFurniture()
+    app.currentLayout = None
+    app.history.reset(app)
+    
+    appDir = os.path.dirname(os.path.abspath(__file__))
+    previewPaths = dict()
+    for ((width, height), layouts) in layoutsBySize.items():
+        outputDir = os.path.join(resource_cache.getDefaultCacheDir(), 'previews', f'{width}x{height}')
+        try:
+            counts = renderThumbnails(layouts, outputDir, width, height,
+                                      imageDirs = [appDir], workers = 1)
+        except Exception:
+            # e.g. the cache directory isn't writable: keep the shipped PNGs
+            continue
+        if counts['error'] == 0:
+            for (layout, document) in layouts:
+                previewPaths[layout] = getThumbnailPath(outputDir, layout)
+    
+    app.singlePreviewImage = previewPaths.get('single', app.singlePreviewImage)
+    app.doublePreviewImage = previewPaths.get('double', app.doublePreviewImage)
+    app.triplePreviewImage = previewPaths.get('triple', app.triplePreviewImage)
+    app.prefetchImages([app.singlePreviewImage, app.doublePreviewImage, app.triplePreviewImage])
+    
+def saveDesign(app, path):
+    # returns False if path can't be written (e.g. a read-only folder) or the
+    # design can't be stored in the file format
+    document = makeDocument(snapshotRoom(app), app.currentLayout,
+                            (app.room.roomLeft, app.room.roomTop, app.room.roomWidth, app.room.roomHeight),
+                            app.room.doorRect, app.room.windowRects)
+    try:
+        saveDocument(path, document)
+    except (OSError, LayoutFormatError) as error:
+        print(f'Could not save the design to {path}: {error}')
+        return False
+    return True
+    
+def openDesign(app, path):
+    # returns False (and leaves the room as it is) if there is nothing saved at
+    # path yet, or the file can't be read as a design
+    try:
+        document = loadDocument(path)
+    except FileNotFoundError:
+        return False
+    except (OSError, LayoutFormatError) as error:
+        print(f'Could not open the design in {path}: {error}')
+        return False
+    loadDocumentIntoRoom(app, document)
+    return True
+    
+def openDesignFromLibrary(app, path, index):
+    # only the one entry is read from the (memory-mapped) library file; returns
+    # False (and leaves the room as it is) like openDesign if it can't be read
+    try:
+        with LayoutLibrary(path) as library:
+            document = library[index]
+    except FileNotFoundError:
+        return False
+    except (OSError, LayoutFormatError, IndexError) as error:
+        print(f'Could not open design {index} in {path}: {error}')
+        return False
+    loadDocumentIntoRoom(app, document)
+    return True
+    
+def loadDocumentIntoRoom(app, document):
+    # like the load*Layout functions, but the room and furniture come from a saved design
+    app.currentLayout = document['layout']
+    room = document['room']
+    (app.room.roomLeft, app.room.roomTop, app.room.roomWidth, app.room.roomHeight) = room['rect']
+    app.room.doorRect = room['doorRect']
+    app.room.windowRects = list(room['windowRects'])
+    
+    applySnapshot(app, {
+        'furniture' : document['furniture'],
+        'measureSegments' : document['measureSegments'],
+        'measureMode' : False,
+        'lastMeasureHintSegmentIndex' : None,
+        'showMeasureEscHint' : False
+    })
+    
+    # reset history upon entering initial state
+    app.history.reset(app)
     
 ##########################################
 # HOME SCREEN
@@ -759,7 +918,7 @@ def design_onMouseRelease(app, mX, mY):
     furniture = app.room.selectedFurniture
     if furniture != None and furnitureOverTrash(app, furniture):
         # delete furniture (valid move)
-        app.room.furnitureList.remove(furniture)
+        app.room.removeFurniture(furniture)
         app.room.selectedFurniture = None
         
         registerAction(app)
@@ -772,7 +931,7 @@ def design_onMouseRelease(app, mX, mY):
     if furniture != None and not app.ghostIsValid:
         # if from palette spawn, remove if invalid position
         if app.room.dragFromPalette:
-            app.room.furnitureList.remove(furniture)
+            app.room.removeFurniture(furniture)
             app.room.selectedFurniture = None
         # if picking up existing furniture, revert back to original position
         else:
@@ -784,9 +943,10 @@ def design_onMouseRelease(app, mX, mY):
                 furniture.width = app.room.originalWidth
             if app.room.originalHeight != None:
                 furniture.height = app.room.originalHeight
+            app.room.updateFurniture(furniture)
      
     elif furniture != None and app.room.dragFromPalette and not app.didDrag:
-        app.room.furnitureList.remove(furniture)
+        app.room.removeFurniture(furniture)
         app.room.selectedFurniture = None
     
     elif furniture != None and app.ghostIsValid and app.didDrag:
@@ -829,6 +989,14 @@ def design_onKeyPress(app, key):
         undoAction(app)
     elif key == 'y':
         redoAction(app)
+    elif key == 'a' and not app.measureMode and app.currentLayout in app.autoFillCounts:
+        autoFillRoom(app, app.autoFillCounts[app.currentLayout])
+    elif key == 'o' and not app.measureMode:
+        optimizeRoom(app, app.optimizeScore)
+    elif key == 's':
+        saveDesign(app, app.designFile)
+    elif key == 'l':
+        openDesign(app, app.designFile)
     elif key == 'escape' and app.measureMode:
         hadSegments = len(app.measureSegments) > 0
         app.measureMode = False
@@ -841,18 +1009,20 @@ def design_onKeyPress(app, key):
             registerAction(app)
         
 def design_redrawAll(app):
-    drawPalette(app)
-    drawTrash(app)
-    app.room.draw()
-    drawRoomDimensions(app)
+    # the palette, trash, room outline, dimensions and ruler panel don't move during
+    # a drag, so they are drawn from cached layers (redrawn only when their deps change)
+    drawCachedLayer('designBackground', drawDesignBackground, app,
+                    deps = getDesignBackgroundDeps(app))
+    drawRoomFurniture(app.room)
     drawGhost(app)
     drawFurnitureTooltip(app)
     
-    drawMeasurePanel(app)
+    drawCachedLayer('measurePanel', drawMeasurePanel, app,
+                    deps = getMeasurePanelDeps(app))
     drawMeasureRuler(app)
     
-    canUndo = len(app.history) > 1
-    canRedo = len(app.redoStack) > 0
+    canUndo = app.history.canUndo()
+    canRedo = app.history.canRedo()
     
     isBackHovering = (app.mouseX != None and isInsideRect(app.mouseX, app.mouseY,
                         app.backButtonLeft, app.backButtonTop, app.layoutButtonWidth,
@@ -916,6 +1086,20 @@ def design_redrawAll(app):
     drawLine(redoCx - 8, redoCy, redoCx + 8, redoCy,
              lineWidth = 4, fill = redoArrowColor, arrowStart = False, arrowEnd = True)
     
+def drawDesignBackground(app):
+    drawPalette(app)
+    drawTrash(app)
+    drawRoomOutline(app.room)
+    drawRoomDimensions(app)
+    
+def getDesignBackgroundDeps(app):
+    # everything drawDesignBackground reads that can change while designing
+    room = app.room
+    doorRect = None if room.doorRect == None else tuple(room.doorRect)
+    windowRects = tuple(tuple(rect) for rect in room.windowRects)
+    return (app.currentLayout, room.roomLeft, room.roomTop, room.roomWidth, room.roomHeight,
+            doorRect, windowRects, getPaletteHoverFlags(app))
+    
 ##########################################
 # PALETTE LOGIC
 ##########################################
@@ -930,14 +1114,14 @@ def drawPalette(app):
              fill = 'gray', border = 'black')
     drawLabel('Furniture Items', headerLeft + app.paletteWidth / 2,
               headerTop + headerHeight / 2, size = 14, bold = True, font = 'monospace', fill = 'white')
+    hoverFlags = getPaletteHoverFlags(app)
     for i, item in enumerate(app.paletteItems): # index and key
         left = app.paletteLeft
         top = app.paletteTop + i * app.paletteSpacing
         cX = app.paletteLeft + app.paletteWidth / 2
         cY = top + app.paletteHeight / 2
         
-        isHovering = (app.mouseX != None and isInsideRect(app.mouseX, app.mouseY,
-                      left, top, app.paletteWidth, app.paletteHeight))
+        isHovering = hoverFlags[i]
                       
         baseFill = rgb(253, 248, 238)
         glowFill = rgb(255, 245, 200)
@@ -954,6 +1138,14 @@ def drawPalette(app):
         scale = min(maxWidth / item['width'], maxHeight / item['height'])
         drawImage(item['image'], cX, cY, width = item['width'] * scale, height = item['height'] * scale, align = 'center')
         
+def getPaletteHoverFlags(app):
+    flags = []
+    for i in range(len(app.paletteItems)):
+        top = app.paletteTop + i * app.paletteSpacing
+        flags.append(app.mouseX != None and isInsideRect(app.mouseX, app.mouseY,
+                     app.paletteLeft, top, app.paletteWidth, app.paletteHeight))
+    return tuple(flags)
+    
 def paletteCheck(app, mX, mY):
     for i, item in enumerate(app.paletteItems):
         left = app.paletteLeft
@@ -985,6 +1177,63 @@ def spawnFurniture(app, paletteItem, mX, mY):
     
     app.room.dragFromPalette = True
     
+##########################################
+# AUTO-FILL
+##########################################
+
+def autoFillRoom(app, counts, keepExisting = False):
+    # counts maps a palette kind to how many to place, e.g. {'bed' : 2, 'desk' : 2};
+    # returns False (and leaves the room alone) if they can't all fit
+    room = app.room
+    paletteByKind = dict()
+    for item in app.paletteItems:
+        paletteByKind[item['kind']] = item
+        
+    pieces = []
+    for kind in counts:
+        item = paletteByKind[kind]
+        for i in range(counts[kind]):
+            pieces.append((kind, item['width'], item['height']))
+            
+    fixedRects = []
+    if keepExisting:
+        fixedRects = [(furniture.left, furniture.top, furniture.width, furniture.height)
+                      for furniture in room.furnitureList]
+        
+    placements = solvePacking((room.roomLeft, room.roomTop, room.roomWidth, room.roomHeight),
+                              pieces, fixedRects = fixedRects)
+    if placements == None:
+        return False
+        
+    if not keepExisting:
+        room.clearFurniture()
+    room.selectedFurniture = None
+    for (kind, left, top, width, height, angle) in placements:
+        item = paletteByKind[kind]
+        furniture = Furniture(kind, left, top, width, height, image = item['image'], angle = angle)
+        # rotated pieces still draw the image at its unrotated size (see rotateSelectedFurniture)
+        furniture.drawWidth = item['width']
+        furniture.drawHeight = item['height']
+        room.addFurniture(furniture)
+        
+    registerAction(app)
+    return True
+    
+def optimizeRoom(app, score):
+    # rearranges the current furniture to improve score (see layout_optimizer);
+    # does nothing if pieces overlap or stick out (e.g. an opened design)
+    room = app.room
+    if len(room.furnitureList) == 0:
+        return None
+    (overlappingPairs, outsidePieces) = room.findConflicts()
+    if len(overlappingPairs) > 0 or len(outsidePieces) > 0:
+        return None
+    geometry = RoomGeometry((room.roomLeft, room.roomTop, room.roomWidth, room.roomHeight),
+                            room.doorRect, room.windowRects)
+    snapshot = snapshotRoom(app)
+    applySnapshot(app, optimizeLayout(snapshot, geometry, score = score))
+    registerAction(app)
+    
 ##########################################
 # TRASH LOGIC
 ##########################################
@@ -993,14 +1242,8 @@ def drawTrash(app):
     drawImage(app.trashImage, app.trashLeft, app.trashTop, width = app.trashSize, height = app.trashSize)
     
 def furnitureOverTrash(app, furniture): # rectangles overlap
-    furnitureRight = furniture.left + furniture.width
-    trashRight = app.trashLeft + app.trashSize
-    furnitureBottom = furniture.top + furniture.height
-    trashBottom = app.trashTop + app.trashSize
-    return (furniture.left <= trashRight 
-            and furnitureRight >= app.trashLeft
-            and furniture.top <= trashBottom
-            and furnitureBottom >= app.trashTop)
+    return rectsOverlap(furniture.left, furniture.top, furniture.width, furniture.height,
+                        app.trashLeft, app.trashTop, app.trashSize, app.trashSize)
             
 ##########################################
 # GHOST LOGIC
@@ -1014,34 +1257,8 @@ def drawGhost(app):
     drawRect(furniture.left, furniture.top, furniture.width, furniture.height, fill = None, border = color, borderWidth = 4)
 
 def isValidPlacement(app, furniture):
-    # check if furniture is in room
-    furnitureRight = furniture.left + furniture.width
-    furnitureBottom = furniture.top + furniture.height
-    roomRight = app.room.roomLeft + app.room.roomWidth
-    roomBottom = app.room.roomTop + app.room.roomHeight
-    insideRoom = (furniture.left >= app.room.roomLeft 
-            and furnitureRight <= roomRight
-            and furniture.top >= app.room.roomTop
-            and furnitureBottom <= roomBottom)
-            
-    if not insideRoom:
-        return False
-        
-        # check if furniture overlaps with another furniture
-        
-    for otherFurniture in app.room.furnitureList:
-        if otherFurniture != furniture:
-            otherFurnitureRight = otherFurniture.left + otherFurniture.width
-            otherFurnitureBottom = otherFurniture.top + otherFurniture.height
-            
-            doesOverlap = (furniture.left <= otherFurnitureRight
-                           and furnitureRight >= otherFurniture.left
-                           and furniture.top <= otherFurnitureBottom
-                           and furnitureBottom >= otherFurniture.top)
-                           
-            if doesOverlap:
-                return False
-    return True
+    # inside the room and not overlapping other furniture (see Room.isValidPlacement)
+    return app.room.isValidPlacement(furniture)
     
 def rotateSelectedFurniture(app, furniture):
     # save old state so we can revert if invalid
@@ -1068,6 +1285,7 @@ def rotateSelectedFurniture(app, furniture):
     furniture.height = newHeight
     furniture.left = newLeft
     furniture.top = newTop
+    app.room.updateFurniture(furniture)
     
     if not isValidPlacement(app, furniture):
         # revert everything if invalid
@@ -1076,6 +1294,7 @@ def rotateSelectedFurniture(app, furniture):
         furniture.top = oldTop
         furniture.width = oldWidth
         furniture.height = oldHeight
+        app.room.updateFurniture(furniture)
         app.ghostIsValid = False
     else:
         app.ghostIsValid = True
@@ -1092,7 +1311,7 @@ def drawFurnitureTooltip(app):
         return None
     hoveredFurniture = app.room.getFurnitureAt(app.mouseX, app.mouseY)
     if hoveredFurniture != None:
-        hoveredFurniture.drawTooltip(app)
+        drawFurnitureHint(app, hoveredFurniture)
         return None
     
     # door tooltip
@@ -1134,7 +1353,7 @@ def drawMeasurePanel(app):
     width = app.measurePanelWidth
     height = app.measurePanelHeight
     
-    isHovering = app.mouseX != None and isInsideRect(app.mouseX, app.mouseY, left, top, width, height)
+    isHovering, isCloseHovering = getMeasurePanelHover(app)
     
     baseFill = rgb(255, 252, 246)
     glowFill = rgb(255, 245, 200)
@@ -1182,12 +1401,27 @@ def drawMeasurePanel(app):
         closeSize = app.measureCloseSize
         closeLeft = left + width - closeSize - 6
         closeTop = top + 6
-        isCloseHovering = app.mouseX != None and isInsideRect(app.mouseX, app.mouseY, closeLeft, closeTop, closeSize, closeSize)
         closeBorderColor = 'gold' if isCloseHovering else 'black'
         drawRect(closeLeft, closeTop, closeSize, closeSize, fill = 'firebrick', border = closeBorderColor)
         drawLabel('X', closeLeft + closeSize / 2, closeTop + closeSize / 2,
                   size = 10, bold = True, fill = 'white')
 
+def getMeasurePanelHover(app):
+    # (over the panel, over its X button); the X button only exists in measure mode
+    if app.mouseX == None:
+        return (False, False)
+    left = app.measurePanelLeft
+    top = app.measurePanelTop
+    width = app.measurePanelWidth
+    closeSize = app.measureCloseSize
+    isHovering = isInsideRect(app.mouseX, app.mouseY, left, top, width, app.measurePanelHeight)
+    isCloseHovering = app.measureMode and isInsideRect(app.mouseX, app.mouseY, left + width - closeSize - 6, top + 6,
+                                   closeSize, closeSize)
+    return (isHovering, isCloseHovering)
+
+def getMeasurePanelDeps(app):
+    return (app.measureMode, getMeasurePanelHover(app))
+
 def drawMeasureRuler(app):
     # not in measurement mode, so don't draw ruler
     if not app.measureMode:
@@ -1266,28 +1500,8 @@ def drawMeasureRuler(app):
         drawLabel(label, midX, midY, size = 12, font = 'monospace', bold = True, fill = 'darkOliveGreen')
         
 def getCurrentScaleFactors(app):
-    if app.currentLayout == 'single':
-        widthInches = 12 * 12 + 11
-        heightInches = 8 * 12 + 7
-        return widthInches / app.singleRoomWidth, heightInches / app.singleRoomHeight
-        
-    elif app.currentLayout == 'double':
-        widthInches = 11 * 12 + 11
-        heightInches = 14 * 12 + 3
-        return widthInches / app.doubleRoomWidth, heightInches / app.doubleRoomHeight
-      
-    elif app.currentLayout == 'triple':
-        widthInches = 24 * 12 + 10
-        heightInches = 12 * 12 + 9
-        return widthInches / app.tripleRoomWidth, heightInches / app.tripleRoomHeight  
-    else:
-        return (None, None)
-    
-def formatDistanceInches(inches):
-    total = rounded(inches)
-    feet = total // 12
-    inches = total % 12 # remainder, inches remaining
-    return f"{feet}' {inches}\""
+    # inches per pixel for the current layout (see ROOM_PRESETS)
+    return getScaleFactors(app.currentLayout)
     
 ##########################################
 # DIMENSION LINES
@@ -1331,131 +1545,53 @@ def isInsideRect(mX, mY, left, top, width, height):
     return left <= mX <= right and top <= mY <= bottom
     
 ################################################
-# CLASSES
+# ROOM AND FURNITURE DRAWING
 ################################################
 
-class Furniture:
-    def __init__(self, kind, left, top, width, height, image, angle):
-        self.kind = kind
-        self.left = left
-        self.top = top
-        self.width = width
-        self.height = height
-        self.image = image
-        self.angle = angle
-        
-        # image draw size to maintain nice proportions
-        self.drawWidth = width
-        self.drawHeight = height
-        
-    def containsPoint(self, x, y):
-        right = self.left + self.width
-        bottom = self.top + self.height
-        return (self.left <= x <= right) and (self.top <= y <= bottom)
-        
-    def furnitureDraw(self):
-        furnitureCenterX = self.left + self.width / 2
-        furnitureCenterY = self.top + self.height / 2
-        drawImage(self.image, furnitureCenterX, furnitureCenterY, 
-                  width = self.drawWidth, height = self.drawHeight, 
-                  align = 'center', rotateAngle = self.angle)
-                  
-    def drawTooltip(self, app):
-        if not app.measureMode:
-            message = "CLICK ITEM, THEN PRESS 'r' TO ROTATE"
-            fontSize = 12
-            paddingX = 8
-            paddingY = 4
-            
-            approxTextWidth = len(message) * fontSize * 0.6
-            boxWidth = max(approxTextWidth + 2 * paddingX, 220)
-            boxHeight = fontSize + 2 * paddingY
-            
-            centerX = self.left + self.width / 2
-            gap = 6
-            bottomY = self.top - gap
-            left = centerX - boxWidth / 2
-            top = bottomY - boxHeight
-            
-            labelY = top + paddingY + fontSize / 2
-            drawRect(left, top, boxWidth, boxHeight, fill = 'black', opacity = 80)
-            drawLabel(message, centerX, labelY, size = fontSize, font = 'monospace', bold = True, fill = 'white')
-        
-class Room:
-    def __init__(self, roomLeft, roomTop, roomWidth, roomHeight, doorRect, windowRects):
-        self.roomLeft = roomLeft
-        self.roomTop = roomTop
-        self.roomWidth = roomWidth
-        self.roomHeight = roomHeight
-        self.doorRect = doorRect
-        self.windowRects = windowRects
-        self.furnitureList = []
-        self.selectedFurniture = None
-        
-        # furniture object can drag normally no matter the location pressed
-        self.dragOffsetX = 0 # furniture's cx doesn't "snap" right/left suddenly
-        self.dragOffsetY = 0 # furniture's cy doesn't "snap" up/down suddenly
-        
-        # snap-back behavior
-        self.originalLeft = None
-        self.originalTop = None
-        self.dragFromPalette = False
-        
-        # snap-back behavior to remember original orientation and dimensions
-        self.originalAngle = None
-        self.originalWidth = None
-        self.originalHeight = None
-        
-    def addFurniture(self, furniture):
-        self.furnitureList.append(furniture)
-        
-    def getFurnitureAt(self, mX, mY):
-        for furniture in reversed(self.furnitureList): # if furniture pieces overlap, returns topmost
-            if furniture.containsPoint(mX, mY):
-                return furniture
-        return None
+def drawRoomOutline(room):
+    # draw the room
+    drawRect(room.roomLeft, room.roomTop, room.roomWidth, room.roomHeight, fill = None, border = 'black')
     
-    # functions BELOW are called by event handlers 
+    # draw the door
+    if room.doorRect != None:
+        (doorX, doorY, doorW, doorH) = room.doorRect
+        drawRect(doorX, doorY, doorW, doorH, fill = 'red')
     
-    def handleMousePress(self, mX, mY):
-        furniture = self.getFurnitureAt(mX, mY)
-        if furniture != None:
-            self.selectedFurniture = furniture
-            self.dragOffsetX = mX - furniture.left
-            self.dragOffsetY = mY - furniture.top
-            
-            # drag started from the room, no the palette
-            self.dragFromPalette = False
-            
-            # remember original position for possible snap-back
-            self.originalLeft = furniture.left
-            self.originalTop = furniture.top
-            self.originalAngle = furniture.angle
-            self.originalWidth = furniture.width
-            self.originalHeight = furniture.height
-        else:
-            self.selectedFurniture = None
+    # draw all the windows
+    for (windowX, windowY, windowW, windowH) in room.windowRects:
+        drawRect(windowX, windowY, windowW, windowH, fill = 'lightBlue')
+       
+def drawRoomFurniture(room):
+    for furniture in room.furnitureList:
+        drawFurniture(furniture)
         
-    def handleMouseDrag(self, mX, mY):
-        if self.selectedFurniture != None:
-            self.selectedFurniture.left = mX - self.dragOffsetX
-            self.selectedFurniture.top = mY - self.dragOffsetY
-            
-    def draw(self):
-        # draw the room
-        drawRect(self.roomLeft, self.roomTop, self.roomWidth, self.roomHeight, fill = None, border = 'black')
+def drawFurniture(furniture):
+    furnitureCenterX = furniture.left + furniture.width / 2
+    furnitureCenterY = furniture.top + furniture.height / 2
+    drawImage(furniture.image, furnitureCenterX, furnitureCenterY, 
+              width = furniture.drawWidth, height = furniture.drawHeight, 
+              align = 'center', rotateAngle = furniture.angle)
+              
+def drawFurnitureHint(app, furniture):
+    if not app.measureMode:
+        message = "CLICK ITEM, THEN PRESS 'r' TO ROTATE"
+        fontSize = 12
+        paddingX = 8
+        paddingY = 4
         
-        # draw the door
-        (doorX, doorY, doorW, doorH) = self.doorRect
-        drawRect(doorX, doorY, doorW, doorH, fill = 'red')
+        approxTextWidth = len(message) * fontSize * 0.6
+        boxWidth = max(approxTextWidth + 2 * paddingX, 220)
+        boxHeight = fontSize + 2 * paddingY
         
-        # draw all the windows
-        for (windowX, windowY, windowW, windowH) in self.windowRects:
-            drawRect(windowX, windowY, windowW, windowH, fill = 'lightBlue')
-           
-        # draw all the furniture
-        for furniture in self.furnitureList:
-            furniture.furnitureDraw()
+        centerX = furniture.left + furniture.width / 2
+        gap = 6
+        bottomY = furniture.top - gap
+        left = centerX - boxWidth / 2
+        top = bottomY - boxHeight
+        
+        labelY = top + paddingY + fontSize / 2
+        drawRect(left, top, boxWidth, boxHeight, fill = 'black', opacity = 80)
+        drawLabel(message, centerX, labelY, size = fontSize, font = 'monospace', bold = True, fill = 'white')
 
 ################################################
 # HISTORY / SNAPSHOTS FOR UNDO AND REDO
@@ -1486,7 +1622,7 @@ def snapshotRoom(app):
     
 def applySnapshot(app, snapshot):
     # restore a snapshot into the current app
-    app.room.furnitureList = []
+    app.room.clearFurniture()
     for data in snapshot['furniture']:
         # add every piece of furniture back
         furniture = Furniture(
@@ -1510,6 +1646,9 @@ def applySnapshot(app, snapshot):
     app.lastMeasureHintSegmentIndex = snapshot['lastMeasureHintSegmentIndex']
     app.showMeasureEscHint = snapshot['showMeasureEscHint']
     
+    clearTransientState(app)
+    
+def clearTransientState(app):
     # always clear any in-progress measurement preview
     app.measureStart = None
     app.measureTempEnd = None
@@ -1522,25 +1661,20 @@ def applySnapshot(app, snapshot):
     
 def registerAction(app):
     # this works only after a VALID move completes
-    snapshot = snapshotRoom(app)
-    app.history.append(snapshot)
-    app.redoStack = []
+    app.history.record(app)
     
 def undoAction(app):
-    if len(app.history) <= 1:
-        return None
-    last = app.history.pop()
-    app.redoStack.append(last)
-    applySnapshot(app, app.history[-1])
+    if app.history.undo(app):
+        clearTransientState(app)
     
 def redoAction(app):
-    if len(app.redoStack) == 0:
-        return None
-    snapshot = app.redoStack.pop()
-    app.history.append(snapshot)
-    applySnapshot(app, snapshot)
+    if app.history.redo(app):
+        clearTransientState(app)
     
 def main():
     runAppWithScreens(initialScreen = 'home', width = 1280, height = 720)
     
-main()
+# the auto-fill solver's worker processes may re-import this file, so only start
+# the app when it is run directly
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+'''
+Headless batch checker for Dorm Layout Studio layouts.
+
+Reads layouts as JSON Lines (one layout per line) from a file or stdin and
+writes one JSON result line per layout, in input order:
+
+    python layout_batch.py submissions.jsonl -o results.jsonl --workers 8
+
+An input line looks like
+
+    {"id": "abc123", "layout": "double",
+     "furniture": [{"kind": "bed", "left": 300, "top": 380,
+                    "width": 120, "height": 220, "angle": 180}, ...]}
+
+where layout is one of ROOM_PRESETS (or give "roomRect": [left, top, width,
+height] plus "widthInches"/"heightInches" for a custom room) and each piece
+uses the same fields as snapshotRoom. The result line reports whether the
+layout is valid, every overlapping pair and out-of-room piece (by index),
+and real-world sizes. Lines that can't be checked get an "error" instead.
+
+Chunks of lines are checked in worker processes. Only a few chunks are in
+flight at a time, so memory stays flat however long the input is.
+'''
+
+import argparse
+import collections
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from layout_model import ROOM_PRESETS, Furniture, Room, formatDistanceInches
+
+################################################
+# CHECKING ONE LAYOUT
+################################################
+
+def checkLayout(record):
+    # returns the result dict for one parsed input record
+    if 'roomRect' in record:
+        (roomLeft, roomTop, roomWidth, roomHeight) = record['roomRect']
+        widthInches = record['widthInches']
+        heightInches = record['heightInches']
+    else:
+        layout = record['layout']
+        if layout not in ROOM_PRESETS:
+            raise ValueError(f'unknown layout {layout!r}')
+        preset = ROOM_PRESETS[layout]
+        (roomLeft, roomTop, roomWidth, roomHeight) = preset['roomRect']
+        widthInches = preset['widthInches']
+        heightInches = preset['heightInches']
+    scaleX = widthInches / roomWidth
+    scaleY = heightInches / roomHeight
+
+    room = Room(roomLeft, roomTop, roomWidth, roomHeight, None, [])
+    indexes = dict()
+    furnitureResults = []
+    for (i, data) in enumerate(record['furniture']):
+        furniture = Furniture(data['kind'], data['left'], data['top'], data['width'],
+                              data['height'], image = None, angle = data.get('angle', 0))
+        room.addFurniture(furniture)
+        indexes[furniture] = i
+        furnitureResults.append({
+            'kind' : furniture.kind,
+            'widthInches' : furniture.width * scaleX,
+            'heightInches' : furniture.height * scaleY,
+            'width' : formatDistanceInches(furniture.width * scaleX),
+            'height' : formatDistanceInches(furniture.height * scaleY)
+        })
+
+    (overlappingPairs, outsidePieces) = room.findConflicts()
+    return {
+        'id' : record.get('id'),
+        'valid' : len(overlappingPairs) == 0 and len(outsidePieces) == 0,
+        'overlaps' : [[indexes[furniture], indexes[otherFurniture]]
+                      for (furniture, otherFurniture) in overlappingPairs],
+        'outside' : [indexes[furniture] for furniture in outsidePieces],
+        'room' : {
+            'widthInches' : widthInches,
+            'heightInches' : heightInches,
+            'width' : formatDistanceInches(widthInches),
+            'height' : formatDistanceInches(heightInches)
+        },
+        'furniture' : furnitureResults
+    }
+
+def checkLayoutLine(lineNumber, line):
+    # one input line -> (output line, 'valid' / 'invalid' / 'error'); never raises
+    record = None
+    try:
+        record = json.loads(line)
+        result = checkLayout(record)
+        status = 'valid' if result['valid'] else 'invalid'
+    except Exception as error:
+        result = {'error' : f'{type(error).__name__}: {error}'}
+        if isinstance(record, dict) and 'id' in record:
+            result['id'] = record['id']
+        status = 'error'
+    result['line'] = lineNumber
+    return (json.dumps(result), status)
+
+def checkLayoutLines(numberedLines):
+    # runs in a worker: a whole chunk per task keeps the pickling overhead low
+    return [checkLayoutLine(lineNumber, line) for (lineNumber, line) in numberedLines]
+
+################################################
+# STREAMING
+################################################
+
+def readChunks(lines, chunkSize):
+    chunk = []
+    for (lineNumber, line) in enumerate(lines, 1):
+        if line.strip() == '':
+            continue
+        chunk.append((lineNumber, line))
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+def runBatch(lines, output, workers = None, chunkSize = 256):
+    '''
+    Checks every layout in lines (any iterable of JSON strings) and writes
+    the result lines to output in input order. Returns a Counter with
+    'valid', 'invalid' and 'error'.
+    '''
+    if workers == None:
+        workers = os.cpu_count() or 1
+    counts = collections.Counter(valid = 0, invalid = 0, error = 0)
+
+    def writeResults(results):
+        for (resultLine, status) in results:
+            output.write(resultLine + '\n')
+            counts[status] += 1
+
+    if workers <= 1:
+        for chunk in readChunks(lines, chunkSize):
+            writeResults(checkLayoutLines(chunk))
+        return counts
+
+    # a fixed window of chunks in flight: results come back in submission order
+    # and the reader never gets more than a couple of chunks per worker ahead
+    maxPending = 2 * workers
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        pending = collections.deque()
+        for chunk in readChunks(lines, chunkSize):
+            pending.append(pool.submit(checkLayoutLines, chunk))
+            if len(pending) >= maxPending:
+                writeResults(pending.popleft().result())
+        while len(pending) > 0:
+            writeResults(pending.popleft().result())
+    return counts
+
+################################################
+# COMMAND LINE
+################################################
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Validate Dorm Layout Studio layouts (JSON Lines).')
+    parser.add_argument('input', nargs = '?', default = '-',
+                        help = 'JSONL file of layouts (default: stdin)')
+    parser.add_argument('-o', '--output', default = '-',
+                        help = 'where to write JSONL results (default: stdout)')
+    parser.add_argument('-w', '--workers', type = int, default = None,
+                        help = 'worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', dest = 'chunkSize', type = int, default = 256,
+                        help = 'layouts per worker task (default: 256)')
+    args = parser.parse_args(argv)
+
+    inputFile = sys.stdin if args.input == '-' else open(args.input, encoding = 'utf-8')
+    outputFile = sys.stdout if args.output == '-' else open(args.output, 'w', encoding = 'utf-8')
+    try:
+        counts = runBatch(inputFile, outputFile, workers = args.workers, chunkSize = args.chunkSize)
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+
+    print(f"checked {sum(counts.values())} layouts: {counts['invalid']} invalid, "
+          f"{counts['error']} errors", file = sys.stderr)
+    # non-zero exit status when anything needs a human to look at it
+    return 0 if counts['invalid'] == 0 and counts['error'] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+'''
+Scenario benchmarks for the Dorm Layout Studio design screen.
+
+Each scenario loads a synthetic room of N pieces (see makeScene), then
+feeds scripted mouse and key events to the design screen through
+cmu_graphics' headless mode. Each event is one full frame: the design_*
+handler, then design_redrawAll and the present. Results are written as JSON:
+
+    python layout_benchmark.py --pieces 10 100 1000 10000 -o results.json
+
+The scenarios:
+
+    drag      pick up the piece nearest the middle and drag it around the room
+    rotate    select pieces one after another and press 'r' on each a few times
+    undoRedo  1,000 rounds of 'z' then 'y'
+    ruler     turn on measure mode and draw 500 ruler segments
+
+Every (scenario, N) pair runs in its own process, so they all start from a
+fresh app and the peak memory (max RSS) belongs to that run alone. Each
+result has per-event latency percentiles in milliseconds, frames per second
+over the whole scenario, and the peak RSS in bytes before and after the
+events were sent.
+'''
+
+# draw offscreen with no window (see cmu_graphics/libs/loader_util.py)
+CMU_GRAPHICS_HEADLESS = True
+
+# cmu_graphics calls the screen handlers it finds in __main__, which is this file
+from dorm_layout_studio import *
+import dorm_layout_studio
+
+# after the * import, which brings in cmu_graphics' random() and friends
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+SCENE_LAYOUT = 'triple'
+DRAG_STEPS = 600
+ROTATE_PIECES = 50
+ROTATIONS_PER_PIECE = 12
+UNDO_REDO_CYCLES = 1000
+RULER_SEGMENTS = 500
+
+################################################
+# SYNTHETIC SCENES
+################################################
+
+# unrotated sizes, the same proportions as the real pieces
+SCENE_PIECES = [('bed', 120, 220), ('closet', 100, 50), ('desk', 70, 40)]
+
+def makeScene(count, layout = SCENE_LAYOUT, seed = 0, images = None):
+    '''
+    Returns a layout document (see layout_format) with count pieces on a
+    jittered grid over the preset room, about a third of them turned 90
+    degrees. No two pieces overlap, and every piece has room to turn in
+    place. images maps each kind to its image (None draws nothing useful,
+    but is fine for tools that don't draw).
+    '''
+    rng = random.Random(seed)
+    roomRect = ROOM_PRESETS[layout]['roomRect']
+    (roomLeft, roomTop, roomWidth, roomHeight) = roomRect
+    cols = max(1, math.ceil(math.sqrt(count * roomWidth / roomHeight)))
+    rows = max(1, math.ceil(count / cols))
+    cellWidth = roomWidth / cols
+    cellHeight = roomHeight / rows
+    side = min(cellWidth, cellHeight)
+    margin = 0.05 * side
+
+    furniture = []
+    for i in range(count):
+        (row, col) = divmod(i, cols)
+        (kind, baseWidth, baseHeight) = SCENE_PIECES[i % len(SCENE_PIECES)]
+        # the long side fits the cell either way round
+        scale = (side - 2 * margin) / max(baseWidth, baseHeight)
+        drawWidth = baseWidth * scale
+        drawHeight = baseHeight * scale
+        longSide = max(drawWidth, drawHeight)
+        angle = rng.choice((0, 0, 90))
+        (width, height) = (drawWidth, drawHeight) if angle == 0 else (drawHeight, drawWidth)
+
+        cellLeft = roomLeft + col * cellWidth
+        cellTop = roomTop + row * cellHeight
+        centerX = cellLeft + margin + longSide / 2 + rng.random() * (cellWidth - 2 * margin - longSide)
+        centerY = cellTop + margin + longSide / 2 + rng.random() * (cellHeight - 2 * margin - longSide)
+        furniture.append({
+            'kind' : kind,
+            'left' : centerX - width / 2,
+            'top' : centerY - height / 2,
+            'width' : width,
+            'height' : height,
+            'angle' : angle,
+            'image' : None if images == None else images[kind],
+            'drawWidth' : drawWidth,
+            'drawHeight' : drawHeight
+        })
+
+    return makeDocument({'furniture' : furniture, 'measureSegments' : []}, layout,
+                        roomRect, None, [])
+
+def getPieceCenter(data):
+    return (data['left'] + data['width'] / 2, data['top'] + data['height'] / 2)
+
+################################################
+# SCENARIOS
+################################################
+
+# each scenario gets the app, the scene document and send(method, *args),
+# which sends one event and times it; they return nothing
+
+def runDragScenario(app, scene, send):
+    # grab the piece nearest the middle of the room and drag it in a loop
+    # around the room (most positions overlap something, so it snaps back)
+    (roomLeft, roomTop, roomWidth, roomHeight) = scene['room']['rect']
+    middleX = roomLeft + roomWidth / 2
+    middleY = roomTop + roomHeight / 2
+    (startX, startY) = min((getPieceCenter(data) for data in scene['furniture']),
+                           key = lambda center: (center[0] - middleX) ** 2 + (center[1] - middleY) ** 2)
+    send(app.sendMousePress, startX, startY)
+    for i in range(DRAG_STEPS):
+        t = 2 * math.pi * i / DRAG_STEPS
+        x = middleX + 0.45 * roomWidth * math.cos(t) * math.sin(3 * t)
+        y = middleY + 0.45 * roomHeight * math.sin(t)
+        send(app.sendMouseMove, x, y, (0,))
+    send(app.sendMouseRelease, startX, startY)
+
+def runRotateScenario(app, scene, send):
+    pieces = scene['furniture']
+    for i in range(ROTATE_PIECES):
+        (x, y) = getPieceCenter(pieces[i * len(pieces) // ROTATE_PIECES])
+        send(app.sendMousePress, x, y)
+        for j in range(ROTATIONS_PER_PIECE):
+            send(app.sendKeyPress, 'r')
+        send(app.sendMouseRelease, x, y)
+
+def runUndoRedoScenario(app, scene, send):
+    # one rotation gives undo something to do
+    (x, y) = getPieceCenter(scene['furniture'][0])
+    app.sendMousePress(x, y)
+    app.sendKeyPress('r')
+    app.sendMouseRelease(x, y)
+    if not app.history.canUndo():
+        # otherwise every 'z' and 'y' below would time a no-op
+        raise RuntimeError('the setup rotation left nothing to undo')
+    for i in range(UNDO_REDO_CYCLES):
+        send(app.sendKeyPress, 'z')
+        send(app.sendKeyPress, 'y')
+
+def runRulerScenario(app, scene, send):
+    # click the ruler panel, then click-move-click for each segment
+    rng = random.Random(len(scene['furniture']))
+    (roomLeft, roomTop, roomWidth, roomHeight) = scene['room']['rect']
+    def getRoomPoint():
+        return (roomLeft + 1 + rng.random() * (roomWidth - 2),
+                roomTop + 1 + rng.random() * (roomHeight - 2))
+    send(app.sendMousePress, app.measurePanelLeft + app.measurePanelWidth / 2,
+         app.measurePanelTop + app.measurePanelHeight / 2)
+    for i in range(RULER_SEGMENTS):
+        (startX, startY) = getRoomPoint()
+        (endX, endY) = getRoomPoint()
+        send(app.sendMousePress, startX, startY)
+        send(app.sendMouseMove, endX, endY)
+        send(app.sendMousePress, endX, endY)
+
+SCENARIOS = {
+    'drag' : runDragScenario,
+    'rotate' : runRotateScenario,
+    'undoRedo' : runUndoRedoScenario,
+    'ruler' : runRulerScenario
+}
+
+################################################
+# ONE RUN (IN ITS OWN PROCESS)
+################################################
+
+def getPeakRssBytes():
+    if resource == None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def getPercentile(sortedValues, percent):
+    # nearest rank
+    index = max(0, math.ceil(percent / 100 * len(sortedValues)) - 1)
+    return sortedValues[index]
+
+def summarizeLatencies(latencies):
+    latencies = sorted(1000 * seconds for seconds in latencies)
+    return {
+        'mean' : sum(latencies) / len(latencies),
+        'p50' : getPercentile(latencies, 50),
+        'p90' : getPercentile(latencies, 90),
+        'p99' : getPercentile(latencies, 99),
+        'max' : latencies[-1]
+    }
+
+def runScenario(scenario, pieces, seed = 0):
+    # starts the app headless, loads the scene, runs the scenario; returns the result dict
+    dorm_layout_studio.main()
+    images = {'bed' : app.bedImage, 'closet' : app.closetImage, 'desk' : app.deskImage}
+    scene = makeScene(pieces, seed = seed, images = images)
+    loadDocumentIntoRoom(app, scene)
+    setActiveScreen('design')
+    # handles the screen change and draws the scene once, so images are loaded
+    app.sendEvents([])
+    app.sendMouseMove(0, 0)
+
+    latencies = []
+    def send(sendEvent, *args):
+        start = time.perf_counter()
+        sendEvent(*args)
+        latencies.append(time.perf_counter() - start)
+
+    setupPeakRss = getPeakRssBytes()
+    start = time.perf_counter()
+    SCENARIOS[scenario](app, scene, send)
+    seconds = time.perf_counter() - start
+    return {
+        'scenario' : scenario,
+        'pieces' : pieces,
+        'events' : len(latencies),
+        'seconds' : seconds,
+        'fps' : len(latencies) / seconds,
+        'latencyMs' : summarizeLatencies(latencies),
+        'setupPeakRssBytes' : setupPeakRss,
+        'peakRssBytes' : getPeakRssBytes()
+    }
+
+def runScenarioInProcess(scenario, pieces, seed):
+    # the result is the last line the child prints (pygame may print a banner first)
+    command = [sys.executable, os.path.abspath(__file__), '--child', scenario, str(pieces),
+               '--seed', str(seed)]
+    completed = subprocess.run(command, capture_output = True, text = True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or len(lines) == 0:
+        error = completed.stderr.strip().splitlines()
+        return {'scenario' : scenario, 'pieces' : pieces,
+                'error' : error[-1] if len(error) > 0 else f'exit status {completed.returncode}'}
+    return json.loads(lines[-1])
+
+################################################
+# COMMAND LINE
+################################################
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the Dorm Layout Studio design screen.')
+    parser.add_argument('--scenarios', nargs = '+', choices = list(SCENARIOS), default = list(SCENARIOS),
+                        help = 'scenarios to run (default: all)')
+    parser.add_argument('--pieces', nargs = '+', type = int, default = [10, 100, 1000],
+                        help = 'scene sizes to run each scenario at (default: 10 100 1000)')
+    parser.add_argument('--seed', type = int, default = 0,
+                        help = 'seed for the synthetic scenes (default: 0)')
+    parser.add_argument('-o', '--output', default = '-',
+                        help = 'where to write the JSON report (default: stdout)')
+    parser.add_argument('--child', nargs = 2, metavar = ('SCENARIO', 'PIECES'),
+                        help = argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child != None:
+        (scenario, pieces) = args.child
+        print(json.dumps(runScenario(scenario, int(pieces), args.seed)))
+        return 0
+
+    results = []
+    for pieces in args.pieces:
+        for scenario in args.scenarios:
+            result = runScenarioInProcess(scenario, pieces, args.seed)
+            if 'error' in result:
+                print(f"{scenario} x {pieces}: {result['error']}", file = sys.stderr)
+            else:
+                print(f"{scenario} x {pieces}: {result['fps']:.1f} fps, "
+                      f"p99 {result['latencyMs']['p99']:.2f} ms", file = sys.stderr)
+            results.append(result)
+
+    report = {
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'seed' : args.seed,
+        'results' : results
+    }
+    text = json.dumps(report, indent = 1)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding = 'utf-8') as f:
+            f.write(text + '\n')
+    return 0 if all('error' not in result for result in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
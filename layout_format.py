@@ -0,0 +1,388 @@
+'''
+Save/load format for Dorm Layout Studio designs.
+
+A design document is a plain dict (version 1):
+
+    {'version' : 1,
+     'layout' : 'double',                   # preset name, or None
+     'room' : {'rect' : (left, top, width, height),
+               'doorRect' : (left, top, width, height) or None,
+               'windowRects' : [(left, top, width, height), ...]},
+     'furniture' : [{'kind', 'left', 'top', 'width', 'height', 'angle',
+                     'image', 'drawWidth', 'drawHeight'}, ...],
+     'measureSegments' : [((x1, y1), (x2, y2)), ...]}
+
+The furniture entries are the same dicts snapshotRoom makes. Documents can
+be written as JSON (readable, diffable) or as a compact struct-packed binary
+record; loadDocument tells them apart by the first bytes. Numbers read back
+from the binary form are floats.
+
+A layout library is many binary records in one file followed by an index of
+(offset, length) pairs. LayoutLibrary memory-maps the file and decodes only
+the record that is asked for, so opening entry 99999 of a 100k library
+costs the same as opening entry 0.
+'''
+
+import json
+import mmap
+import os
+import struct
+
+FORMAT_VERSION = 1
+
+class LayoutFormatError(ValueError):
+    pass
+
+################################################
+# DOCUMENTS
+################################################
+
+def makeDocument(snapshot, layout, roomRect, doorRect, windowRects):
+    # snapshot comes from snapshotRoom
+    return {
+        'version' : FORMAT_VERSION,
+        'layout' : layout,
+        'room' : {
+            'rect' : tuple(roomRect),
+            'doorRect' : None if doorRect == None else tuple(doorRect),
+            'windowRects' : [tuple(rect) for rect in windowRects]
+        },
+        'furniture' : [dict(data) for data in snapshot['furniture']],
+        'measureSegments' : [(tuple(start), tuple(end))
+                             for (start, end) in snapshot['measureSegments']]
+    }
+
+def checkVersion(version):
+    if version != FORMAT_VERSION:
+        raise LayoutFormatError(f'unsupported layout format version {version}')
+
+################################################
+# JSON VARIANT
+################################################
+
+def documentToJson(document):
+    return json.dumps(document, indent = 1)
+
+# every furniture entry has these (the same fields snapshotRoom writes)
+FURNITURE_KEYS = ('kind', 'left', 'top', 'width', 'height', 'angle', 'image', 'drawWidth', 'drawHeight')
+
+def documentFromJson(text):
+    try:
+        data = json.loads(text)
+    except ValueError as error:
+        raise LayoutFormatError(f'not a Dorm Layout Studio document ({error})') from error
+    if not isinstance(data, dict) or 'version' not in data:
+        raise LayoutFormatError('not a Dorm Layout Studio document')
+    checkVersion(data['version'])
+    try:
+        document = readJsonDocument(data)
+    except (KeyError, TypeError, ValueError) as error:
+        raise LayoutFormatError(f'damaged Dorm Layout Studio document ({error!r})') from error
+    for piece in document['furniture']:
+        if not isinstance(piece, dict) or any(key not in piece for key in FURNITURE_KEYS):
+            raise LayoutFormatError('damaged Dorm Layout Studio document (bad furniture entry)')
+    return document
+
+def readJsonDocument(data):
+    # JSON has no tuples, so put them back the way snapshotRoom/applySnapshot use them
+    room = data['room']
+    return {
+        'version' : data['version'],
+        'layout' : data['layout'],
+        'room' : {
+            'rect' : tuple(room['rect']),
+            'doorRect' : None if room['doorRect'] == None else tuple(room['doorRect']),
+            'windowRects' : [tuple(rect) for rect in room['windowRects']]
+        },
+        'furniture' : list(data['furniture']),
+        'measureSegments' : [(tuple(start), tuple(end))
+                             for (start, end) in data['measureSegments']]
+    }
+
+################################################
+# BINARY VARIANT
+################################################
+
+# little-endian throughout; strings (layout name, kinds, image URLs) are stored
+# once in a string table and referred to by index
+DOCUMENT_MAGIC = b'DLSL'
+DOCUMENT_HEADER = struct.Struct('<4sH')
+COUNT = struct.Struct('<I')
+STRING_LENGTH = struct.Struct('<H')
+MAX_STRING_BYTES = 0xFFFF
+RECT = struct.Struct('<4d')
+FLAG = struct.Struct('<B')
+FURNITURE = struct.Struct('<HH7d') # kind, image, left, top, width, height, angle, drawWidth, drawHeight
+NO_STRING = 0xFFFF
+
+def encodeDocument(document):
+    strings = []
+    stringIndexes = dict()
+    def getStringIndex(string):
+        if string == None:
+            return NO_STRING
+        if string not in stringIndexes:
+            stringIndexes[string] = len(strings)
+            strings.append(string)
+        return stringIndexes[string]
+
+    layoutIndex = getStringIndex(document['layout'])
+    furnitureParts = []
+    for data in document['furniture']:
+        furnitureParts.append(FURNITURE.pack(
+            getStringIndex(data['kind']), getStringIndex(data['image']),
+            data['left'], data['top'], data['width'], data['height'], data['angle'],
+            data['drawWidth'], data['drawHeight']))
+    if len(strings) >= NO_STRING:
+        raise LayoutFormatError('too many distinct strings for one document')
+
+    parts = [DOCUMENT_HEADER.pack(DOCUMENT_MAGIC, document['version']), COUNT.pack(len(strings))]
+    for string in strings:
+        encoded = string.encode('utf-8')
+        if len(encoded) > MAX_STRING_BYTES:
+            raise LayoutFormatError(f'string too long for a document ({len(encoded)} bytes): '
+                                    f'{string[:40]!r}...')
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    parts.append(STRING_LENGTH.pack(layoutIndex))
+
+    room = document['room']
+    parts.append(RECT.pack(*room['rect']))
+    parts.append(FLAG.pack(room['doorRect'] != None))
+    if room['doorRect'] != None:
+        parts.append(RECT.pack(*room['doorRect']))
+    parts.append(COUNT.pack(len(room['windowRects'])))
+    for rect in room['windowRects']:
+        parts.append(RECT.pack(*rect))
+
+    parts.append(COUNT.pack(len(furnitureParts)))
+    parts.extend(furnitureParts)
+
+    parts.append(COUNT.pack(len(document['measureSegments'])))
+    for ((x1, y1), (x2, y2)) in document['measureSegments']:
+        parts.append(RECT.pack(x1, y1, x2, y2))
+    return b''.join(parts)
+
+def decodeDocument(buffer, offset = 0):
+    # buffer can be bytes, a memoryview or an mmap; nothing before offset is read
+    try:
+        return readBinaryDocument(buffer, offset)
+    except (struct.error, UnicodeDecodeError, IndexError) as error:
+        # truncated or corrupt record
+        raise LayoutFormatError(f'damaged Dorm Layout Studio document ({error})') from error
+
+def readBinaryDocument(buffer, offset):
+    (magic, version) = DOCUMENT_HEADER.unpack_from(buffer, offset)
+    if magic != DOCUMENT_MAGIC:
+        raise LayoutFormatError('not a binary Dorm Layout Studio document')
+    checkVersion(version)
+    offset += DOCUMENT_HEADER.size
+
+    (stringCount,) = COUNT.unpack_from(buffer, offset)
+    offset += COUNT.size
+    strings = []
+    for i in range(stringCount):
+        (length,) = STRING_LENGTH.unpack_from(buffer, offset)
+        offset += STRING_LENGTH.size
+        strings.append(bytes(buffer[offset:offset + length]).decode('utf-8'))
+        offset += length
+    def getString(index):
+        return None if index == NO_STRING else strings[index]
+    (layoutIndex,) = STRING_LENGTH.unpack_from(buffer, offset)
+    offset += STRING_LENGTH.size
+
+    roomRect = RECT.unpack_from(buffer, offset)
+    offset += RECT.size
+    (hasDoor,) = FLAG.unpack_from(buffer, offset)
+    offset += FLAG.size
+    doorRect = None
+    if hasDoor:
+        doorRect = RECT.unpack_from(buffer, offset)
+        offset += RECT.size
+    (windowCount,) = COUNT.unpack_from(buffer, offset)
+    offset += COUNT.size
+    windowRects = []
+    for i in range(windowCount):
+        windowRects.append(RECT.unpack_from(buffer, offset))
+        offset += RECT.size
+
+    (furnitureCount,) = COUNT.unpack_from(buffer, offset)
+    offset += COUNT.size
+    furniture = []
+    for (kind, image, left, top, width, height, angle,
+         drawWidth, drawHeight) in FURNITURE.iter_unpack(
+            buffer[offset:offset + furnitureCount * FURNITURE.size]):
+        furniture.append({
+            'kind' : getString(kind),
+            'left' : left,
+            'top' : top,
+            'width' : width,
+            'height' : height,
+            'angle' : angle,
+            'image' : getString(image),
+            'drawWidth' : drawWidth,
+            'drawHeight' : drawHeight
+        })
+    offset += furnitureCount * FURNITURE.size
+
+    (segmentCount,) = COUNT.unpack_from(buffer, offset)
+    offset += COUNT.size
+    measureSegments = []
+    for i in range(segmentCount):
+        (x1, y1, x2, y2) = RECT.unpack_from(buffer, offset)
+        measureSegments.append(((x1, y1), (x2, y2)))
+        offset += RECT.size
+
+    return {
+        'version' : version,
+        'layout' : getString(layoutIndex),
+        'room' : {'rect' : roomRect, 'doorRect' : doorRect, 'windowRects' : windowRects},
+        'furniture' : furniture,
+        'measureSegments' : measureSegments
+    }
+
+################################################
+# FILES
+################################################
+
+def saveDocument(path, document, binary = None):
+    # binary defaults to True unless the file name ends in .json
+    if binary == None:
+        binary = not path.lower().endswith('.json')
+    # encode first, so a document that can't be stored leaves the old file alone
+    if binary:
+        data = encodeDocument(document)
+        with open(path, 'wb') as f:
+            f.write(data)
+    else:
+        text = documentToJson(document)
+        with open(path, 'w', encoding = 'utf-8') as f:
+            f.write(text)
+
+def loadDocument(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(DOCUMENT_MAGIC):
+        return decodeDocument(data)
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as error:
+        raise LayoutFormatError(f'not a Dorm Layout Studio document ({error})') from error
+    return documentFromJson(text)
+
+################################################
+# LAYOUT LIBRARY
+################################################
+
+# header: magic, version, entry count, byte offset of the index;
+# the index is one (offset, length) pair per entry, in entry order
+LIBRARY_MAGIC = b'DLSB'
+LIBRARY_HEADER = struct.Struct('<4sHQQ')
+LIBRARY_INDEX_ENTRY = struct.Struct('<QI')
+
+def writeLibrary(path, documents):
+    # documents can be any iterable (only the index is kept in memory)
+    with open(path, 'wb') as f:
+        f.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, FORMAT_VERSION, 0, LIBRARY_HEADER.size))
+        index = writeLibraryEntries(f, LIBRARY_HEADER.size, documents)
+        finishLibrary(f, index)
+
+def appendToLibrary(path, documents):
+    # creates the library if needed; existing entries are not rewritten. The new
+    # records and the new index go after everything already in the file and the
+    # header is rewritten last, so a crash part way leaves the old library intact
+    # (the old index is left behind as unused bytes)
+    if not os.path.exists(path):
+        writeLibrary(path, documents)
+        return None
+    with open(path, 'r+b') as f:
+        (count, indexOffset) = readLibraryHeader(f.read(LIBRARY_HEADER.size))
+        f.seek(indexOffset)
+        index = bytearray(f.read(count * LIBRARY_INDEX_ENTRY.size))
+        if len(index) != count * LIBRARY_INDEX_ENTRY.size:
+            raise LayoutFormatError('damaged Dorm Layout Studio library (index cut short)')
+        end = f.seek(0, os.SEEK_END)
+        index += writeLibraryEntries(f, end, documents)
+        finishLibrary(f, index)
+
+def writeLibraryEntries(f, offset, documents):
+    # writes records starting at offset (f must already be there); returns their index bytes
+    index = bytearray()
+    for document in documents:
+        data = encodeDocument(document)
+        f.write(data)
+        index += LIBRARY_INDEX_ENTRY.pack(offset, len(data))
+        offset += len(data)
+    return index
+
+def finishLibrary(f, index):
+    indexOffset = f.tell()
+    f.write(index)
+    # everything the new header points to is on disk before the header changes
+    f.flush()
+    os.fsync(f.fileno())
+    f.seek(0)
+    f.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, FORMAT_VERSION,
+                                len(index) // LIBRARY_INDEX_ENTRY.size, indexOffset))
+    f.seek(indexOffset + len(index))
+
+def readLibraryHeader(data):
+    if len(data) < LIBRARY_HEADER.size:
+        raise LayoutFormatError('not a Dorm Layout Studio library')
+    (magic, version, count, indexOffset) = LIBRARY_HEADER.unpack_from(data)
+    if magic != LIBRARY_MAGIC:
+        raise LayoutFormatError('not a Dorm Layout Studio library')
+    checkVersion(version)
+    return (count, indexOffset)
+
+class LayoutLibrary:
+    # read-only, memory-mapped: library[i] decodes just entry i
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError as error:
+                # an empty file can't be mapped
+                raise LayoutFormatError('not a Dorm Layout Studio library') from error
+            try:
+                (self.count, self.indexOffset) = readLibraryHeader(self.map)
+                if self.indexOffset + self.count * LIBRARY_INDEX_ENTRY.size > len(self.map):
+                    raise LayoutFormatError('damaged Dorm Layout Studio library (index cut short)')
+            except Exception:
+                self.map.close()
+                raise
+        except Exception:
+            self.file.close()
+            raise
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        (offset, length) = self.getEntrySpan(i)
+        return decodeDocument(self.map, offset)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def getEntrySpan(self, i):
+        if i < 0:
+            i += self.count
+        if not (0 <= i < self.count):
+            raise IndexError('layout library index out of range')
+        (offset, length) = LIBRARY_INDEX_ENTRY.unpack_from(self.map, self.indexOffset + i * LIBRARY_INDEX_ENTRY.size)
+        if offset + length > len(self.map):
+            raise LayoutFormatError(f'damaged Dorm Layout Studio library (entry {i} runs past the end)')
+        return (offset, length)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,296 @@
+'''
+Geometry helpers for Dorm Layout Studio that do not depend on cmu_graphics.
+
+Everything in here works on plain numbers (left, top, width, height) so it
+can be shared by the design screen and by any code that runs without a window.
+'''
+
+import math
+
+# numpy is optional: only FurnitureStore needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+################################################
+# RECTANGLE HELPERS
+################################################
+
+def rectsOverlap(left1, top1, width1, height1, left2, top2, width2, height2):
+    # touching edges count as overlapping (same rule as isValidPlacement)
+    return (left1 <= left2 + width2
+            and left1 + width1 >= left2
+            and top1 <= top2 + height2
+            and top1 + height1 >= top2)
+
+def rectInsideRect(left, top, width, height, outerLeft, outerTop, outerWidth, outerHeight):
+    return (left >= outerLeft
+            and left + width <= outerLeft + outerWidth
+            and top >= outerTop
+            and top + height <= outerTop + outerHeight)
+
+################################################
+# SPATIAL INDEX
+################################################
+
+class SpatialGrid:
+    # uniform grid: every item is stored in each cell its bounding box touches,
+    # so a query only has to look at the handful of cells under the query box
+    def __init__(self, cellSize = 64):
+        self.cellSize = cellSize
+        self.cells = dict() # (col, row) -> set of items
+        self.itemCells = dict() # item -> tuple of (col, row) keys it lives in
+
+    def __len__(self):
+        return len(self.itemCells)
+
+    def __contains__(self, item):
+        return item in self.itemCells
+
+    def getCellKeys(self, left, top, width, height):
+        # both edges are inclusive so rectangles that only touch share a cell
+        cellSize = self.cellSize
+        firstCol = math.floor(left / cellSize)
+        lastCol = math.floor((left + width) / cellSize)
+        firstRow = math.floor(top / cellSize)
+        lastRow = math.floor((top + height) / cellSize)
+        return tuple((col, row) for col in range(firstCol, lastCol + 1)
+                                for row in range(firstRow, lastRow + 1))
+
+    def insert(self, item, left, top, width, height):
+        if item in self.itemCells:
+            self.remove(item)
+        keys = self.getCellKeys(left, top, width, height)
+        for key in keys:
+            if key not in self.cells:
+                self.cells[key] = set()
+            self.cells[key].add(item)
+        self.itemCells[item] = keys
+
+    def update(self, item, left, top, width, height):
+        # most drags stay inside the same cells, so only touch the dict if needed
+        keys = self.getCellKeys(left, top, width, height)
+        oldKeys = self.itemCells.get(item)
+        if oldKeys == keys:
+            return None
+        if oldKeys != None:
+            self.remove(item)
+        for key in keys:
+            if key not in self.cells:
+                self.cells[key] = set()
+            self.cells[key].add(item)
+        self.itemCells[item] = keys
+
+    def remove(self, item):
+        keys = self.itemCells.pop(item, None)
+        if keys == None:
+            return None
+        for key in keys:
+            cell = self.cells[key]
+            cell.discard(item)
+            if len(cell) == 0:
+                del self.cells[key]
+
+    def clear(self):
+        self.cells = dict()
+        self.itemCells = dict()
+
+    def query(self, left, top, width, height):
+        # returns every item sharing a cell with the box (callers do the exact test)
+        keys = self.getCellKeys(left, top, width, height)
+        if len(keys) == 1:
+            return set(self.cells.get(keys[0], ()))
+        result = set()
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell != None:
+                result |= cell
+        return result
+
+    def queryPoint(self, x, y):
+        cellSize = self.cellSize
+        key = (math.floor(x / cellSize), math.floor(y / cellSize))
+        return set(self.cells.get(key, ()))
+
+################################################
+# COLUMNAR FURNITURE STORE
+################################################
+
+class FurnitureStore:
+    # keeps every piece's rectangle in contiguous NumPy columns so "does this box
+    # touch anything?" is one vectorized comparison instead of a Python loop;
+    # pieces get a fixed slot and freed slots are reused, so updates are O(1)
+    def __init__(self, capacity = 64):
+        if np == None:
+            raise ImportError('FurnitureStore needs numpy (pip install numpy)')
+        self.lefts = np.zeros(capacity)
+        self.tops = np.zeros(capacity)
+        self.rights = np.zeros(capacity)
+        self.bottoms = np.zeros(capacity)
+        self.angles = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype = bool)
+        self.items = [None] * capacity
+        self.slots = dict() # item -> slot
+        self.freeSlots = []
+        self.used = 0 # slots [0, used) have been handed out at least once
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, item):
+        return item in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def grow(self):
+        capacity = 2 * len(self.active)
+        for column in ('lefts', 'tops', 'rights', 'bottoms', 'angles', 'active'):
+            oldColumn = getattr(self, column)
+            newColumn = np.zeros(capacity, dtype = oldColumn.dtype)
+            newColumn[:len(oldColumn)] = oldColumn
+            setattr(self, column, newColumn)
+        self.items.extend([None] * (capacity - len(self.items)))
+
+    def add(self, item, left, top, width, height, angle = 0):
+        if item in self.slots:
+            self.update(item, left, top, width, height, angle)
+            return None
+        if len(self.freeSlots) > 0:
+            slot = self.freeSlots.pop()
+        else:
+            if self.used == len(self.active):
+                self.grow()
+            slot = self.used
+            self.used += 1
+        self.slots[item] = slot
+        self.items[slot] = item
+        self.active[slot] = True
+        self.update(item, left, top, width, height, angle)
+
+    def update(self, item, left, top, width, height, angle = 0):
+        slot = self.slots[item]
+        self.lefts[slot] = left
+        self.tops[slot] = top
+        self.rights[slot] = left + width
+        self.bottoms[slot] = top + height
+        self.angles[slot] = angle
+
+    def remove(self, item):
+        slot = self.slots.pop(item, None)
+        if slot == None:
+            return None
+        self.active[slot] = False
+        self.items[slot] = None
+        self.freeSlots.append(slot)
+
+    def clear(self):
+        self.active[:] = False
+        self.items = [None] * len(self.active)
+        self.slots = dict()
+        self.freeSlots = []
+        self.used = 0
+
+    def overlapMask(self, left, top, width, height):
+        # touching edges count as overlapping (same rule as rectsOverlap)
+        used = self.used
+        return (self.active[:used]
+                & (self.lefts[:used] <= left + width)
+                & (self.rights[:used] >= left)
+                & (self.tops[:used] <= top + height)
+                & (self.bottoms[:used] >= top))
+
+    def overlapsAny(self, left, top, width, height, exclude = None):
+        mask = self.overlapMask(left, top, width, height)
+        excludeSlot = self.slots.get(exclude)
+        if excludeSlot != None:
+            mask[excludeSlot] = False
+        return bool(mask.any())
+
+    def findOverlapping(self, left, top, width, height):
+        mask = self.overlapMask(left, top, width, height)
+        return [self.items[slot] for slot in np.flatnonzero(mask)]
+
+    def outsideMask(self, left, top, width, height):
+        # True for every active slot that is not fully inside the box
+        used = self.used
+        return (self.active[:used]
+                & ((self.lefts[:used] < left)
+                   | (self.rights[:used] > left + width)
+                   | (self.tops[:used] < top)
+                   | (self.bottoms[:used] > top + height)))
+
+    def findOutside(self, left, top, width, height):
+        mask = self.outsideMask(left, top, width, height)
+        return [self.items[slot] for slot in np.flatnonzero(mask)]
+
+################################################
+# SWEEP AND PRUNE
+################################################
+
+class SweepAndPrune:
+    # finds every overlapping pair at once: items are kept sorted by left edge,
+    # and each item is only compared against the ones whose left edge falls
+    # inside its own x-range (O(n log n + k) for k x-overlapping pairs)
+    def __init__(self):
+        self.order = [] # items sorted by left edge, kept between sweeps
+        self.rects = dict() # item -> (left, top, right, bottom)
+        self.needsSort = False
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, item):
+        return item in self.rects
+
+    def insert(self, item, left, top, width, height):
+        if item not in self.rects:
+            self.order.append(item)
+        self.rects[item] = (left, top, left + width, top + height)
+        self.needsSort = True
+
+    def update(self, item, left, top, width, height):
+        oldRect = self.rects.get(item)
+        if oldRect == None:
+            return None
+        self.rects[item] = (left, top, left + width, top + height)
+        if oldRect[0] != left:
+            self.needsSort = True
+
+    def remove(self, item):
+        if self.rects.pop(item, None) != None:
+            # removing keeps the rest in order, so no re-sort needed
+            self.order.remove(item)
+
+    def clear(self):
+        self.order = []
+        self.rects = dict()
+        self.needsSort = False
+
+    def sortOrder(self):
+        # the list is still sorted from the last sweep, and usually only one piece
+        # has moved since, so Timsort finishes in close to a single pass
+        if self.needsSort:
+            rects = self.rects
+            self.order.sort(key = lambda item: rects[item][0])
+            self.needsSort = False
+
+    def findPairs(self):
+        # touching edges count as overlapping (same rule as rectsOverlap)
+        self.sortOrder()
+        order = self.order
+        rects = self.rects
+        pairs = []
+        for i in range(len(order)):
+            item = order[i]
+            (left, top, right, bottom) = rects[item]
+            for j in range(i + 1, len(order)):
+                other = order[j]
+                (otherLeft, otherTop, otherRight, otherBottom) = rects[other]
+                if otherLeft > right:
+                    # everything after this starts even further right
+                    break
+                if otherTop <= bottom and otherBottom >= top:
+                    pairs.append((item, other))
+        return pairs
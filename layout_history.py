@@ -0,0 +1,244 @@
+'''
+Undo/redo history for Dorm Layout Studio.
+
+Each registered action is stored as a LayoutDelta holding only the pieces and
+fields it changed, so recording, undoing and redoing cost O(changed pieces)
+however big the room is. Nothing in here imports cmu_graphics: the history
+works on any app-like object with a layout_model Room in app.room and the
+ruler fields in MEASURE_FIELDS, so it runs the same without a window.
+
+Past the memory cap the oldest deltas are dropped, which only shortens how
+far back undo can go. The room itself is not part of the budget.
+'''
+
+import sys
+
+# the fields of a piece that an action can change (kind/image/draw size never change)
+FURNITURE_FIELDS = ('left', 'top', 'width', 'height', 'angle')
+MEASURE_FIELDS = ('measureMode', 'lastMeasureHintSegmentIndex', 'showMeasureEscHint')
+
+def estimateBytes(value):
+    # rough memory footprint, good enough for the history budget
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key in value:
+            size += estimateBytes(key) + estimateBytes(value[key])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimateBytes(item)
+    return size
+
+class LayoutDelta:
+    # one undoable action: only the pieces and fields that actually changed
+    def __init__(self):
+        # (furniture, stackOrder, fieldsBefore or None if added, fieldsAfter or None if removed)
+        self.furnitureChanges = []
+        self.measureBefore = dict()
+        self.measureAfter = dict()
+        # None, ('append', newSegments) or ('replace', segmentsBefore, segmentsAfter)
+        self.segmentChange = None
+        self.byteSize = 0
+
+    def computeByteSize(self):
+        size = sys.getsizeof(self) + estimateBytes(self.furnitureChanges)
+        size += estimateBytes(self.measureBefore) + estimateBytes(self.measureAfter)
+        size += estimateBytes(self.segmentChange)
+        self.byteSize = size
+
+class LayoutHistory:
+    def __init__(self, maxBytes = 4 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.deltas = []
+        self.cursor = 0 # number of deltas applied; deltas[cursor:] can be redone
+        self.totalBytes = 0 # of the deltas only
+
+        # the state at self.cursor, so we only have to diff pieces marked dirty
+        self.recordedFurniture = dict() # furniture -> (stackOrder, fields)
+        self.recordedMeasure = dict()
+        self.recordedSegments = None # list object the app was using when we recorded
+        self.recordedSegmentCount = 0
+
+    def canUndo(self):
+        return self.cursor > 0
+
+    def canRedo(self):
+        return self.cursor < len(self.deltas)
+
+    def reset(self, app):
+        self.deltas = []
+        self.cursor = 0
+        self.totalBytes = 0
+        self.recordedFurniture = dict()
+        for furniture in app.room.furnitureList:
+            self.recordFurniture(app.room, furniture)
+        self.recordMeasure(app)
+        app.room.dirtyFurniture.clear()
+
+    def recordFurniture(self, room, furniture):
+        fields = tuple(getattr(furniture, field) for field in FURNITURE_FIELDS)
+        self.recordedFurniture[furniture] = (room.stackOrder[furniture], fields)
+
+    def recordMeasure(self, app):
+        self.recordedMeasure = {field : getattr(app, field) for field in MEASURE_FIELDS}
+        self.recordedSegments = app.measureSegments
+        self.recordedSegmentCount = len(app.measureSegments)
+
+    ####################
+    # RECORDING
+    ####################
+
+    def record(self, app):
+        delta = self.makeDelta(app)
+
+        # a new action throws away everything that could have been redone
+        for oldDelta in self.deltas[self.cursor:]:
+            self.totalBytes -= oldDelta.byteSize
+        del self.deltas[self.cursor:]
+
+        self.deltas.append(delta)
+        self.cursor += 1
+        self.totalBytes += delta.byteSize
+        self.enforceBudget()
+
+    def makeDelta(self, app):
+        room = app.room
+        delta = LayoutDelta()
+        for furniture in room.dirtyFurniture:
+            recorded = self.recordedFurniture.get(furniture)
+            inRoom = furniture in room.stackOrder
+            if recorded == None and not inRoom:
+                continue # spawned and thrown away before anything was registered
+            if recorded == None:
+                self.recordFurniture(room, furniture)
+                stackOrder, fields = self.recordedFurniture[furniture]
+                delta.furnitureChanges.append((furniture, stackOrder, None,
+                                               dict(zip(FURNITURE_FIELDS, fields))))
+            elif not inRoom:
+                stackOrder, fields = recorded
+                del self.recordedFurniture[furniture]
+                delta.furnitureChanges.append((furniture, stackOrder,
+                                               dict(zip(FURNITURE_FIELDS, fields)), None))
+            else:
+                stackOrder, oldFields = recorded
+                self.recordFurniture(room, furniture)
+                newFields = self.recordedFurniture[furniture][1]
+                before = dict()
+                after = dict()
+                for i in range(len(FURNITURE_FIELDS)):
+                    if oldFields[i] != newFields[i]:
+                        before[FURNITURE_FIELDS[i]] = oldFields[i]
+                        after[FURNITURE_FIELDS[i]] = newFields[i]
+                if len(before) > 0:
+                    delta.furnitureChanges.append((furniture, stackOrder, before, after))
+        room.dirtyFurniture.clear()
+
+        for field in MEASURE_FIELDS:
+            value = getattr(app, field)
+            if value != self.recordedMeasure[field]:
+                delta.measureBefore[field] = self.recordedMeasure[field]
+                delta.measureAfter[field] = value
+
+        # ruler segments are only ever appended to, or replaced with a new list
+        segments = app.measureSegments
+        if segments is self.recordedSegments and len(segments) >= self.recordedSegmentCount:
+            if len(segments) > self.recordedSegmentCount:
+                delta.segmentChange = ('append', tuple(segments[self.recordedSegmentCount:]))
+        else:
+            before = tuple(self.recordedSegments[:self.recordedSegmentCount])
+            delta.segmentChange = ('replace', before, tuple(segments))
+        self.recordMeasure(app)
+
+        delta.computeByteSize()
+        return delta
+
+    ####################
+    # UNDO / REDO
+    ####################
+
+    def undo(self, app):
+        # returns whether anything was undone
+        if not self.canUndo():
+            return False
+        self.revertUnrecordedChanges(app)
+        self.cursor -= 1
+        self.applyDelta(app, self.deltas[self.cursor], forward = False)
+        return True
+
+    def redo(self, app):
+        # returns whether anything was redone
+        if not self.canRedo():
+            return False
+        self.revertUnrecordedChanges(app)
+        self.applyDelta(app, self.deltas[self.cursor], forward = True)
+        self.cursor += 1
+        return True
+
+    def revertUnrecordedChanges(self, app):
+        # anything touched since the last registered action goes back to its recorded
+        # state first, so undo/redo always lands exactly on a recorded state
+        room = app.room
+        for furniture in list(room.dirtyFurniture):
+            recorded = self.recordedFurniture.get(furniture)
+            inRoom = furniture in room.stackOrder
+            if recorded == None:
+                if inRoom:
+                    room.removeFurniture(furniture)
+                continue
+            stackOrder, fields = recorded
+            for i in range(len(FURNITURE_FIELDS)):
+                setattr(furniture, FURNITURE_FIELDS[i], fields[i])
+            if inRoom:
+                room.updateFurniture(furniture)
+            else:
+                room.insertFurniture(furniture, stackOrder)
+        room.dirtyFurniture.clear()
+
+        for field in MEASURE_FIELDS:
+            setattr(app, field, self.recordedMeasure[field])
+        app.measureSegments = self.recordedSegments
+        del app.measureSegments[self.recordedSegmentCount:]
+
+    def applyDelta(self, app, delta, forward):
+        room = app.room
+        for (furniture, stackOrder, before, after) in delta.furnitureChanges:
+            fields = after if forward else before
+            if fields == None:
+                room.removeFurniture(furniture)
+                del self.recordedFurniture[furniture]
+                continue
+            for field in fields:
+                setattr(furniture, field, fields[field])
+            if furniture in room.stackOrder:
+                room.updateFurniture(furniture)
+            else:
+                room.insertFurniture(furniture, stackOrder)
+            self.recordFurniture(room, furniture)
+        room.dirtyFurniture.clear()
+
+        measureFields = delta.measureAfter if forward else delta.measureBefore
+        for field in measureFields:
+            setattr(app, field, measureFields[field])
+
+        change = delta.segmentChange
+        if change != None and change[0] == 'append':
+            if forward:
+                app.measureSegments.extend(change[1])
+            else:
+                del app.measureSegments[len(app.measureSegments) - len(change[1]):]
+        elif change != None:
+            app.measureSegments = list(change[2] if forward else change[1])
+        self.recordMeasure(app)
+
+    ####################
+    # MEMORY BUDGET
+    ####################
+
+    def enforceBudget(self):
+        # drop the oldest deltas until we fit; the newest one always stays, so even
+        # an action bigger than the whole budget can still be undone
+        dropped = 0
+        while self.totalBytes > self.maxBytes and self.cursor - dropped > 1:
+            self.totalBytes -= self.deltas[dropped].byteSize
+            dropped += 1
+        del self.deltas[:dropped]
+        self.cursor -= dropped
@@ -0,0 +1,267 @@
+'''
+Room and furniture model for Dorm Layout Studio.
+
+Nothing in here imports cmu_graphics, so the same Room/Furniture objects and
+placement rules are used by the design screen (dorm_layout_studio.py) and by
+headless tools such as layout_batch.py. Drawing lives in the app.
+'''
+
+from layout_geometry import (SpatialGrid, FurnitureStore, SweepAndPrune,
+                             rectsOverlap, rectInsideRect)
+
+################################################
+# ROOM PRESETS
+################################################
+
+# on-screen room rectangle (pixels) and real size (inches) of each preset layout
+# (Source: McGill House Floor Plan for single/double, Morewood Gardens for triple)
+ROOM_PRESETS = {
+    'single' : {
+        'roomRect' : (300, 130, 420, 290),
+        'widthInches' : 12 * 12 + 11,
+        'heightInches' : 8 * 12 + 7
+    },
+    'double' : {
+        'roomRect' : (300, 100, 420, 500),
+        'widthInches' : 11 * 12 + 11,
+        'heightInches' : 14 * 12 + 3
+    },
+    'triple' : {
+        'roomRect' : (300, 100, 650, 400),
+        'widthInches' : 24 * 12 + 10,
+        'heightInches' : 12 * 12 + 9
+    }
+}
+
+def getScaleFactors(layout):
+    # inches per pixel (x, y) for a preset layout, or (None, None)
+    if layout not in ROOM_PRESETS:
+        return (None, None)
+    preset = ROOM_PRESETS[layout]
+    (roomLeft, roomTop, roomWidth, roomHeight) = preset['roomRect']
+    return preset['widthInches'] / roomWidth, preset['heightInches'] / roomHeight
+    
+def roundHalfUp(d):
+    # same rounding as cmu_graphics' rounded (0.5 rounds away from zero)
+    sign = 1 if d >= 0 else -1
+    d = abs(d)
+    n = int(d)
+    if d - n >= 0.5:
+        n += 1
+    return sign * n
+    
+def formatDistanceInches(inches):
+    total = roundHalfUp(inches)
+    feet = total // 12
+    inches = total % 12 # remainder, inches remaining
+    return f"{feet}' {inches}\""
+
+################################################
+# CLASSES
+################################################
+
+class Furniture:
+    # no per-instance __dict__ (whole-floor scenes have thousands of pieces)
+    __slots__ = ('kind', 'left', 'top', 'width', 'height', 'image', 'angle',
+                 'drawWidth', 'drawHeight')
+    
+    def __init__(self, kind, left, top, width, height, image, angle):
+        self.kind = kind
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.image = image
+        self.angle = angle
+        
+        # image draw size to maintain nice proportions
+        self.drawWidth = width
+        self.drawHeight = height
+        
+    def containsPoint(self, x, y):
+        right = self.left + self.width
+        bottom = self.top + self.height
+        return (self.left <= x <= right) and (self.top <= y <= bottom)
+        
+class Room:
+    def __init__(self, roomLeft, roomTop, roomWidth, roomHeight, doorRect, windowRects,
+                 useStore = False):
+        self.roomLeft = roomLeft
+        self.roomTop = roomTop
+        self.roomWidth = roomWidth
+        self.roomHeight = roomHeight
+        self.doorRect = doorRect
+        self.windowRects = windowRects
+        self.furnitureList = []
+        self.selectedFurniture = None
+        
+        # spatial index so hover/picking/overlap checks only look at nearby pieces
+        self.grid = SpatialGrid()
+        self.stackOrder = dict() # furniture -> insertion number (higher = drawn on top)
+        self.nextStackOrder = 0
+        
+        # every piece sorted by left edge for whole-room conflict checks
+        self.sweep = SweepAndPrune()
+        
+        # optional columnar copy of every piece for vectorized overlap checks
+        self.store = FurnitureStore() if useStore else None
+        
+        # pieces added/moved/removed since the history last looked (see LayoutHistory)
+        self.dirtyFurniture = set()
+        
+        # furniture object can drag normally no matter the location pressed
+        self.dragOffsetX = 0 # furniture's cx doesn't "snap" right/left suddenly
+        self.dragOffsetY = 0 # furniture's cy doesn't "snap" up/down suddenly
+        
+        # snap-back behavior
+        self.originalLeft = None
+        self.originalTop = None
+        self.dragFromPalette = False
+        
+        # snap-back behavior to remember original orientation and dimensions
+        self.originalAngle = None
+        self.originalWidth = None
+        self.originalHeight = None
+        
+    def addFurniture(self, furniture):
+        self.insertFurniture(furniture, self.nextStackOrder)
+        
+    def insertFurniture(self, furniture, stackOrder):
+        # furnitureList is always sorted by stack order, so find where this piece goes
+        # (undoing a delete puts the piece back exactly where it was)
+        self.nextStackOrder = max(self.nextStackOrder, stackOrder + 1)
+        lo, hi = 0, len(self.furnitureList)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.stackOrder[self.furnitureList[mid]] < stackOrder:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.furnitureList.insert(lo, furniture)
+        self.stackOrder[furniture] = stackOrder
+        self.grid.insert(furniture, furniture.left, furniture.top,
+                         furniture.width, furniture.height)
+        self.sweep.insert(furniture, furniture.left, furniture.top,
+                          furniture.width, furniture.height)
+        if self.store != None:
+            self.store.add(furniture, furniture.left, furniture.top,
+                           furniture.width, furniture.height, furniture.angle)
+        self.dirtyFurniture.add(furniture)
+        
+    def removeFurniture(self, furniture):
+        self.furnitureList.remove(furniture)
+        self.stackOrder.pop(furniture, None)
+        self.grid.remove(furniture)
+        self.sweep.remove(furniture)
+        if self.store != None:
+            self.store.remove(furniture)
+        self.dirtyFurniture.add(furniture)
+        
+    def clearFurniture(self):
+        self.dirtyFurniture.update(self.furnitureList)
+        self.furnitureList = []
+        self.stackOrder = dict()
+        self.grid.clear()
+        self.sweep.clear()
+        if self.store != None:
+            self.store.clear()
+        
+    def updateFurniture(self, furniture):
+        # call after changing a piece's left/top/width/height/angle so the index stays in sync
+        if furniture in self.stackOrder:
+            self.grid.update(furniture, furniture.left, furniture.top,
+                             furniture.width, furniture.height)
+            self.sweep.update(furniture, furniture.left, furniture.top,
+                              furniture.width, furniture.height)
+            if self.store != None:
+                self.store.update(furniture, furniture.left, furniture.top,
+                                  furniture.width, furniture.height, furniture.angle)
+        self.dirtyFurniture.add(furniture)
+        
+    def getFurnitureNear(self, left, top, width, height):
+        # every piece that could touch the given box
+        return self.grid.query(left, top, width, height)
+        
+    def isValidPlacement(self, furniture):
+        # check if furniture is in room
+        insideRoom = rectInsideRect(furniture.left, furniture.top, furniture.width, furniture.height,
+                                    self.roomLeft, self.roomTop, self.roomWidth, self.roomHeight)
+                
+        if not insideRoom:
+            return False
+            
+        # check if furniture overlaps with another furniture
+        if self.store != None:
+            # one vectorized comparison against every other piece
+            return not self.store.overlapsAny(furniture.left, furniture.top, furniture.width,
+                                              furniture.height, exclude = furniture)
+            
+        # (only pieces sharing a grid cell with it can possibly overlap)
+        for otherFurniture in self.getFurnitureNear(furniture.left, furniture.top,
+                                                    furniture.width, furniture.height):
+            if otherFurniture != furniture:
+                doesOverlap = rectsOverlap(furniture.left, furniture.top, furniture.width, furniture.height,
+                                           otherFurniture.left, otherFurniture.top,
+                                           otherFurniture.width, otherFurniture.height)
+                               
+                if doesOverlap:
+                    return False
+        return True
+        
+    def getFurnitureAt(self, mX, mY):
+        topmost = None
+        for furniture in self.grid.queryPoint(mX, mY):
+            # if furniture pieces overlap, returns topmost
+            if (furniture.containsPoint(mX, mY) and 
+                (topmost == None or self.stackOrder[furniture] > self.stackOrder[topmost])):
+                topmost = furniture
+        return topmost
+    
+    def findConflicts(self):
+        # every problem in the room at once (isValidPlacement only checks one piece):
+        # returns (overlappingPairs, outsidePieces), both in stacking order
+        overlappingPairs = []
+        for (furniture, otherFurniture) in self.sweep.findPairs():
+            if self.stackOrder[furniture] > self.stackOrder[otherFurniture]:
+                (furniture, otherFurniture) = (otherFurniture, furniture)
+            overlappingPairs.append((furniture, otherFurniture))
+        overlappingPairs.sort(key = lambda pair: (self.stackOrder[pair[0]], self.stackOrder[pair[1]]))
+        
+        if self.store != None:
+            outsidePieces = self.store.findOutside(self.roomLeft, self.roomTop,
+                                                   self.roomWidth, self.roomHeight)
+            outsidePieces.sort(key = lambda furniture: self.stackOrder[furniture])
+        else:
+            outsidePieces = [furniture for furniture in self.furnitureList
+                             if not rectInsideRect(furniture.left, furniture.top,
+                                                   furniture.width, furniture.height,
+                                                   self.roomLeft, self.roomTop,
+                                                   self.roomWidth, self.roomHeight)]
+        return overlappingPairs, outsidePieces
+    
+    # functions BELOW are called by event handlers 
+    
+    def handleMousePress(self, mX, mY):
+        furniture = self.getFurnitureAt(mX, mY)
+        if furniture != None:
+            self.selectedFurniture = furniture
+            self.dragOffsetX = mX - furniture.left
+            self.dragOffsetY = mY - furniture.top
+            
+            # drag started from the room, no the palette
+            self.dragFromPalette = False
+            
+            # remember original position for possible snap-back
+            self.originalLeft = furniture.left
+            self.originalTop = furniture.top
+            self.originalAngle = furniture.angle
+            self.originalWidth = furniture.width
+            self.originalHeight = furniture.height
+        else:
+            self.selectedFurniture = None
+        
+    def handleMouseDrag(self, mX, mY):
+        if self.selectedFurniture != None:
+            self.selectedFurniture.left = mX - self.dragOffsetX
+            self.selectedFurniture.top = mY - self.dragOffsetY
+            self.updateFurniture(self.selectedFurniture)
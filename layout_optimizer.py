@@ -0,0 +1,346 @@
+'''
+Local-search layout optimizer for Dorm Layout Studio.
+
+optimizeLayout takes a valid layout snapshot (from snapshotRoom) and moves,
+rotates and swaps pieces to improve a score, keeping every intermediate
+layout valid under the same rules as isValidPlacement. It runs simulated
+annealing from several starting points (random restarts) spread across
+worker processes and returns the best layout as a snapshot that
+applySnapshot can load.
+
+A score is any top-level function score(pieces, room) -> number, higher is
+better, where pieces is a list of [kind, left, top, width, height, angle]
+and room is a RoomGeometry. Top-level functions (and WeightedScore) can be
+sent to worker processes; lambdas and closures only work with workers = 1.
+'''
+
+import copy
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from layout_geometry import rectsOverlap, rectInsideRect
+
+################################################
+# ROOM GEOMETRY
+################################################
+
+class RoomGeometry:
+    # plain data only, so it can be sent to worker processes
+    def __init__(self, roomRect, doorRect = None, windowRects = ()):
+        (self.left, self.top, self.width, self.height) = roomRect
+        self.doorRect = doorRect
+        self.windowRects = list(windowRects)
+
+def isValidLayout(pieces, room):
+    for i in range(len(pieces)):
+        if not isValidPiece(pieces, i, room):
+            return False
+    return True
+
+def isValidPiece(pieces, i, room):
+    # same rules as isValidPlacement: inside the room and not touching any other piece
+    (kind, left, top, width, height, angle) = pieces[i]
+    if not rectInsideRect(left, top, width, height, room.left, room.top, room.width, room.height):
+        return False
+    for j in range(len(pieces)):
+        if j != i:
+            (otherKind, otherLeft, otherTop, otherWidth, otherHeight, otherAngle) = pieces[j]
+            if rectsOverlap(left, top, width, height, otherLeft, otherTop, otherWidth, otherHeight):
+                return False
+    return True
+
+################################################
+# SCORES
+################################################
+
+def scoreOpenFloor(pieces, room, cellSize = 20):
+    # total free area never changes, so measure the biggest empty rectangle instead
+    # (on a coarse grid; a cell counts as empty only if nothing touches it)
+    cols = max(1, int(room.width // cellSize))
+    rows = max(1, int(room.height // cellSize))
+    cellWidth = room.width / cols
+    cellHeight = room.height / rows
+    occupied = [[False] * cols for row in range(rows)]
+    for (kind, left, top, width, height, angle) in pieces:
+        firstCol = max(0, int((left - room.left) // cellWidth))
+        lastCol = min(cols - 1, int((left + width - room.left) // cellWidth))
+        firstRow = max(0, int((top - room.top) // cellHeight))
+        lastRow = min(rows - 1, int((top + height - room.top) // cellHeight))
+        for row in range(firstRow, lastRow + 1):
+            for col in range(firstCol, lastCol + 1):
+                occupied[row][col] = True
+
+    # largest rectangle under a histogram, one row at a time
+    heights = [0] * cols
+    bestCells = 0
+    for row in range(rows):
+        for col in range(cols):
+            heights[col] = 0 if occupied[row][col] else heights[col] + 1
+        stack = []
+        for col in range(cols + 1):
+            height = heights[col] if col < cols else 0
+            start = col
+            while len(stack) > 0 and stack[-1][1] >= height:
+                (start, stackHeight) = stack.pop()
+                bestCells = max(bestCells, stackHeight * (col - start))
+            stack.append((start, height))
+    return bestCells * cellWidth * cellHeight
+
+def scoreDoorWalkway(pieces, room):
+    # width of the clear straight walkway from the door to the middle of the room
+    if room.doorRect == None:
+        return 0
+    (doorLeft, doorTop, doorWidth, doorHeight) = room.doorRect
+    startX = doorLeft + doorWidth / 2
+    startY = doorTop + doorHeight / 2
+    endX = room.left + room.width / 2
+    endY = room.top + room.height / 2
+    clearance = min(room.width, room.height) / 2
+    for (kind, left, top, width, height, angle) in pieces:
+        clearance = min(clearance, getSegmentRectDistance(startX, startY, endX, endY,
+                                                          left, top, width, height))
+    return 2 * clearance
+
+def scoreDeskWindow(pieces, room):
+    # desks close to a window score higher (0 when every desk is at a window)
+    if len(room.windowRects) == 0:
+        return 0
+    total = 0
+    for (kind, left, top, width, height, angle) in pieces:
+        if kind == 'desk':
+            centerX = left + width / 2
+            centerY = top + height / 2
+            total -= min(math.dist((centerX, centerY), (windowX + windowWidth / 2,
+                                                        windowY + windowHeight / 2))
+                         for (windowX, windowY, windowWidth, windowHeight) in room.windowRects)
+    return total
+
+class WeightedScore:
+    # sum of named scores, e.g. WeightedScore({'openFloor' : 1, 'deskWindow' : 50})
+    def __init__(self, weights):
+        self.weights = dict(weights)
+
+    def __call__(self, pieces, room):
+        return sum(weight * getScoreFunction(name)(pieces, room)
+                   for (name, weight) in self.weights.items())
+
+SCORES = {
+    'openFloor' : scoreOpenFloor,
+    'doorWalkway' : scoreDoorWalkway,
+    'deskWindow' : scoreDeskWindow
+}
+
+def getScoreFunction(score):
+    if isinstance(score, str):
+        return SCORES[score]
+    return score
+
+def getSegmentRectDistance(x1, y1, x2, y2, left, top, width, height):
+    # 0 if the segment passes through the rectangle, else the closest approach
+    if segmentHitsRect(x1, y1, x2, y2, left, top, width, height):
+        return 0
+    right = left + width
+    bottom = top + height
+    corners = [(left, top), (right, top), (right, bottom), (left, bottom)]
+    distances = [getPointRectDistance(x1, y1, left, top, width, height),
+                 getPointRectDistance(x2, y2, left, top, width, height)]
+    for (cornerX, cornerY) in corners:
+        distances.append(getPointSegmentDistance(cornerX, cornerY, x1, y1, x2, y2))
+    return min(distances)
+
+def segmentHitsRect(x1, y1, x2, y2, left, top, width, height):
+    # Liang-Barsky clipping
+    (t0, t1) = (0, 1)
+    dx = x2 - x1
+    dy = y2 - y1
+    for (p, q) in ((-dx, x1 - left), (dx, left + width - x1),
+                   (-dy, y1 - top), (dy, top + height - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+def getPointRectDistance(x, y, left, top, width, height):
+    dx = max(left - x, 0, x - (left + width))
+    dy = max(top - y, 0, y - (top + height))
+    return math.hypot(dx, dy)
+
+def getPointSegmentDistance(x, y, x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    lengthSquared = dx * dx + dy * dy
+    if lengthSquared == 0:
+        return math.hypot(x - x1, y - y1)
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / lengthSquared))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+################################################
+# LOCAL SEARCH
+################################################
+
+def tryRandomMove(pieces, room, rng, step):
+    # applies one random valid move in place; returns an undo function or None
+    i = rng.randrange(len(pieces))
+    old = list(pieces[i])
+    moveType = rng.random()
+    if moveType < 0.7:
+        # nudge
+        scale = step * rng.choice((1, 1, 2, 4))
+        pieces[i][1] += rng.choice((-1, 0, 1)) * scale
+        pieces[i][2] += rng.choice((-1, 0, 1)) * scale
+    elif moveType < 0.85:
+        # rotate 90 degrees about the center (same as rotateSelectedFurniture)
+        (kind, left, top, width, height, angle) = old
+        centerX = left + width / 2
+        centerY = top + height / 2
+        pieces[i][1:] = [centerX - height / 2, centerY - width / 2, height, width, (angle + 90) % 360]
+    else:
+        # swap centers with another piece
+        j = rng.randrange(len(pieces))
+        if j == i:
+            return None
+        otherOld = list(pieces[j])
+        (kind, left, top, width, height, angle) = old
+        (otherKind, otherLeft, otherTop, otherWidth, otherHeight, otherAngle) = otherOld
+        pieces[i][1] = otherLeft + otherWidth / 2 - width / 2
+        pieces[i][2] = otherTop + otherHeight / 2 - height / 2
+        pieces[j][1] = left + width / 2 - otherWidth / 2
+        pieces[j][2] = top + height / 2 - otherHeight / 2
+        if isValidPiece(pieces, i, room) and isValidPiece(pieces, j, room):
+            def undo():
+                pieces[i][:] = old
+                pieces[j][:] = otherOld
+            return undo
+        pieces[i][:] = old
+        pieces[j][:] = otherOld
+        return None
+
+    if isValidPiece(pieces, i, room):
+        def undo():
+            pieces[i][:] = old
+        return undo
+    pieces[i][:] = old
+    return None
+
+def anneal(pieces, room, score, rng, iterations, startTemperature, step):
+    # simulated annealing from pieces; returns (bestScore, bestPieces)
+    currentScore = score(pieces, room)
+    bestScore = currentScore
+    bestPieces = copy.deepcopy(pieces)
+    if startTemperature == None:
+        startTemperature = 0.05 * abs(currentScore) + 1
+    endTemperature = startTemperature * 0.001
+    for iteration in range(iterations):
+        temperature = startTemperature * (endTemperature / startTemperature) ** (iteration / iterations)
+        undo = tryRandomMove(pieces, room, rng, step)
+        if undo == None:
+            continue
+        newScore = score(pieces, room)
+        change = newScore - currentScore
+        if change >= 0 or rng.random() < math.exp(change / temperature):
+            currentScore = newScore
+            if currentScore > bestScore:
+                bestScore = currentScore
+                bestPieces = copy.deepcopy(pieces)
+        else:
+            undo()
+    return (bestScore, bestPieces)
+
+def runRestart(pieces, room, score, seed, scatter, iterations, startTemperature, step):
+    # one independent search; with scatter it first takes a random walk of
+    # valid moves so restarts explore different parts of the room
+    rng = random.Random(seed)
+    pieces = copy.deepcopy(pieces)
+    score = getScoreFunction(score)
+    if scatter:
+        for i in range(len(pieces) * 20):
+            tryRandomMove(pieces, room, rng, step)
+    return anneal(pieces, room, score, rng, iterations, startTemperature, step)
+
+def runRestartArgs(args):
+    return runRestart(*args)
+
+################################################
+# WORKER POOL
+################################################
+
+# kept between calls (like layout_solver's pool) so pressing optimize again
+# doesn't pay for process startup again
+optimizerPool = None
+optimizerPoolWorkers = None
+
+def getOptimizerPool(workers):
+    global optimizerPool, optimizerPoolWorkers
+    if optimizerPool == None or optimizerPoolWorkers != workers:
+        shutdownOptimizerPool()
+        optimizerPool = ProcessPoolExecutor(max_workers = workers)
+        optimizerPoolWorkers = workers
+    return optimizerPool
+
+def shutdownOptimizerPool():
+    global optimizerPool, optimizerPoolWorkers
+    if optimizerPool != None:
+        optimizerPool.shutdown(cancel_futures = True)
+    optimizerPool = None
+    optimizerPoolWorkers = None
+
+################################################
+# PUBLIC API
+################################################
+
+# fixed, so the default result doesn't depend on how many workers there are
+DEFAULT_RESTARTS = 8
+
+def optimizeLayout(snapshot, room, score = 'openFloor', iterations = 2000,
+                   restarts = DEFAULT_RESTARTS, workers = None, seed = 0,
+                   startTemperature = None, step = 10):
+    '''
+    snapshot comes from snapshotRoom and room is a RoomGeometry. score is a
+    name in SCORES or a score function. Returns a copy of snapshot with the
+    best furniture positions found; every other field is left untouched.
+    Raises ValueError if the starting layout is not valid.
+
+    Restart i uses seed * 1000 + i and ties go to the lowest restart, so for
+    the same restarts the result is the same however many workers are used
+    (workers only changes how the restarts are spread across processes).
+    '''
+    pieces = [[data['kind'], data['left'], data['top'], data['width'], data['height'],
+               data['angle']] for data in snapshot['furniture']]
+    if not isValidLayout(pieces, room):
+        raise ValueError('optimizeLayout needs a valid starting layout')
+    if workers == None:
+        workers = os.cpu_count() or 1
+
+    # restart 0 starts exactly from the given layout
+    jobs = [(pieces, room, score, seed * 1000 + i, i > 0, iterations, startTemperature, step)
+            for i in range(restarts)]
+    if len(pieces) == 0:
+        results = []
+    elif workers <= 1 or restarts == 1:
+        results = [runRestartArgs(job) for job in jobs]
+    else:
+        results = list(getOptimizerPool(workers).map(runRestartArgs, jobs))
+
+    result = copy.deepcopy(snapshot)
+    if len(results) > 0:
+        (bestScore, bestPieces) = results[0]
+        for (restartScore, restartPieces) in results[1:]:
+            if restartScore > bestScore:
+                (bestScore, bestPieces) = (restartScore, restartPieces)
+        for (data, (kind, left, top, width, height, angle)) in zip(result['furniture'], bestPieces):
+            data['left'] = left
+            data['top'] = top
+            data['width'] = width
+            data['height'] = height
+            data['angle'] = angle
+    return result
@@ -0,0 +1,257 @@
+'''
+Automatic furniture packing for Dorm Layout Studio ("auto-fill this room").
+
+Given a room rectangle and a list of pieces, solvePacking finds a left/top
+and a 0 or 90 degree orientation for every piece so that all of them are
+inside the room and none overlap (the same rules as isValidPlacement).
+
+The search is a backtracking search over a lattice of candidate positions.
+The first piece's candidates are independent branches, so they are split
+across a ProcessPoolExecutor and the first worker to find a packing wins.
+'''
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from layout_geometry import rectsOverlap, rectInsideRect
+
+################################################
+# SEARCH
+################################################
+
+# workers check the clock and the stop flag every this many nodes
+CHECK_INTERVAL = 1024
+
+# set in each worker process by initWorker (None when searching in-process)
+stopEvent = None
+
+class PackingProblem:
+    # plain data only, so it can be sent to worker processes
+    def __init__(self, roomRect, pieces, fixedRects, step, gap, allowRotation, deadline):
+        (self.roomLeft, self.roomTop, self.roomWidth, self.roomHeight) = roomRect
+        self.pieces = pieces # (kind, width, height), biggest first
+        self.fixedRects = list(fixedRects)
+        self.step = step
+        self.gap = gap
+        self.allowRotation = allowRotation
+        self.deadline = deadline
+
+        # identical pieces are interchangeable, so only try them in one order
+        self.sameAsPrevious = [i > 0 and pieces[i][1:] == pieces[i - 1][1:]
+                               for i in range(len(pieces))]
+
+        # area still to place from each depth on (for the area bound)
+        self.remainingArea = [0] * (len(pieces) + 1)
+        for i in range(len(pieces) - 1, -1, -1):
+            (kind, width, height) = pieces[i]
+            self.remainingArea[i] = self.remainingArea[i + 1] + width * height
+
+        self.freeArea = self.roomWidth * self.roomHeight
+        for (left, top, width, height) in self.fixedRects:
+            self.freeArea -= getClippedArea(left, top, width, height, roomRect)
+
+        self.nodes = 0
+        self.gaveUp = False
+
+    def getOrientations(self, depth):
+        (kind, width, height) = self.pieces[depth]
+        orientations = [(width, height, 0)]
+        if self.allowRotation and width != height:
+            # same as rotateSelectedFurniture: width and height swap
+            orientations.append((height, width, 90))
+        return orientations
+
+    def getAxisCandidates(self, start, length, size, edges):
+        # lattice positions plus positions flush against the wall or another piece
+        end = start + length - size
+        if end < start:
+            return []
+        positions = set()
+        position = start
+        while position <= end:
+            positions.add(position)
+            position += self.step
+        positions.add(end)
+        for (low, high) in edges:
+            for position in (high + self.gap, low - self.gap - size):
+                if start <= position <= end:
+                    positions.add(position)
+        return positions
+
+    def getCandidates(self, depth, placed):
+        # every (top, left, width, height, angle) to try, top-left first
+        rects = self.fixedRects + [rect[:4] for rect in placed]
+        xEdges = [(left, left + width) for (left, top, width, height) in rects]
+        yEdges = [(top, top + height) for (left, top, width, height) in rects]
+        candidates = []
+        for (width, height, angle) in self.getOrientations(depth):
+            xs = self.getAxisCandidates(self.roomLeft, self.roomWidth, width, xEdges)
+            ys = self.getAxisCandidates(self.roomTop, self.roomHeight, height, yEdges)
+            for top in ys:
+                for left in xs:
+                    candidates.append((top, left, width, height, angle))
+        candidates.sort()
+        return candidates
+
+    def fits(self, left, top, width, height, placed):
+        if not rectInsideRect(left, top, width, height, self.roomLeft, self.roomTop,
+                              self.roomWidth, self.roomHeight):
+            return False
+        for (otherLeft, otherTop, otherWidth, otherHeight) in self.fixedRects:
+            if rectsOverlap(left, top, width, height, otherLeft, otherTop, otherWidth, otherHeight):
+                return False
+        for (otherLeft, otherTop, otherWidth, otherHeight, otherAngle) in placed:
+            if rectsOverlap(left, top, width, height, otherLeft, otherTop, otherWidth, otherHeight):
+                return False
+        return True
+
+    def shouldStop(self):
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            if time.time() > self.deadline or (stopEvent != None and stopEvent.is_set()):
+                self.gaveUp = True
+        return self.gaveUp
+
+    def search(self, depth, placed, placedArea):
+        # placed is a list of (left, top, width, height, angle), one per depth so far
+        if depth == len(self.pieces):
+            return True
+        if self.shouldStop():
+            return False
+
+        # prune: the rest can't fit if there isn't enough floor left
+        if self.remainingArea[depth] > self.freeArea - placedArea:
+            return False
+
+        for (top, left, width, height, angle) in self.getCandidates(depth, placed):
+            if self.sameAsPrevious[depth]:
+                (prevLeft, prevTop, prevWidth, prevHeight, prevAngle) = placed[depth - 1]
+                if (top, left, angle) < (prevTop, prevLeft, prevAngle):
+                    continue
+            if not self.fits(left, top, width, height, placed):
+                continue
+            placed.append((left, top, width, height, angle))
+            if self.search(depth + 1, placed, placedArea + width * height):
+                return True
+            placed.pop()
+            if self.gaveUp:
+                return False
+        return False
+
+    def getRootBranches(self):
+        return [candidate for candidate in self.getCandidates(0, [])
+                if self.fits(candidate[1], candidate[0], candidate[2], candidate[3], [])]
+
+def getClippedArea(left, top, width, height, roomRect):
+    (roomLeft, roomTop, roomWidth, roomHeight) = roomRect
+    clippedWidth = min(left + width, roomLeft + roomWidth) - max(left, roomLeft)
+    clippedHeight = min(top + height, roomTop + roomHeight) - max(top, roomTop)
+    return max(0, clippedWidth) * max(0, clippedHeight)
+
+def searchBranches(problem, branches):
+    # runs in a worker: tries each first-piece placement in turn
+    for (top, left, width, height, angle) in branches:
+        placed = [(left, top, width, height, angle)]
+        if problem.search(1, placed, width * height):
+            return placed
+        if problem.gaveUp:
+            return None
+    return None
+
+def initWorker(event):
+    global stopEvent
+    stopEvent = event
+
+################################################
+# WORKER POOL
+################################################
+
+# kept between calls so pressing auto-fill twice doesn't pay for process startup twice
+solverPool = None
+solverPoolWorkers = None
+solverStopEvent = None
+
+def getSolverPool(workers):
+    global solverPool, solverPoolWorkers, solverStopEvent
+    if solverPool == None or solverPoolWorkers != workers:
+        shutdownSolverPool()
+        solverStopEvent = multiprocessing.Event()
+        solverPool = ProcessPoolExecutor(max_workers = workers, initializer = initWorker,
+                                         initargs = (solverStopEvent,))
+        solverPoolWorkers = workers
+    return solverPool
+
+def shutdownSolverPool():
+    global solverPool, solverPoolWorkers
+    if solverPool != None:
+        solverPool.shutdown(cancel_futures = True)
+    solverPool = None
+    solverPoolWorkers = None
+
+def searchInParallel(problem, branches, workers):
+    pool = getSolverPool(workers)
+
+    # deal branches out round-robin so every chunk starts with promising top-left spots
+    chunkCount = min(len(branches), workers * 4)
+    chunks = [branches[i::chunkCount] for i in range(chunkCount)]
+    futures = {pool.submit(searchBranches, problem, chunk) for chunk in chunks}
+
+    result = None
+    pending = futures
+    while result == None and len(pending) > 0:
+        done, pending = wait(pending, return_when = FIRST_COMPLETED)
+        for future in done:
+            if future.result() != None:
+                result = future.result()
+                break
+
+    # tell the chunks that are still running to stop, then reset the flag
+    for future in pending:
+        future.cancel()
+    solverStopEvent.set()
+    wait(pending)
+    solverStopEvent.clear()
+    return result
+
+################################################
+# PUBLIC API
+################################################
+
+def solvePacking(roomRect, pieces, fixedRects = (), step = 10, gap = 1,
+                 allowRotation = True, workers = None, timeLimit = 5):
+    '''
+    roomRect is (left, top, width, height) and pieces is a list of
+    (kind, width, height). fixedRects are pieces that must stay where they are.
+    Touching edges count as overlapping, so pieces are kept gap pixels apart.
+
+    Returns one (kind, left, top, width, height, angle) per piece, in the
+    same order as pieces, or None if no packing was found within timeLimit
+    seconds. With workers > 1 whichever branch finishes first wins.
+    '''
+    if len(pieces) == 0:
+        return []
+    if workers == None:
+        workers = os.cpu_count() or 1
+
+    # biggest pieces first: they have the fewest places to go
+    order = sorted(range(len(pieces)), key = lambda i: -pieces[i][1] * pieces[i][2])
+    orderedPieces = [tuple(pieces[i]) for i in order]
+    problem = PackingProblem(roomRect, orderedPieces, fixedRects, step, gap,
+                             allowRotation, time.time() + timeLimit)
+
+    branches = problem.getRootBranches()
+    if len(branches) == 0:
+        return None
+    if workers <= 1 or len(pieces) == 1:
+        placed = searchBranches(problem, branches)
+    else:
+        placed = searchInParallel(problem, branches, workers)
+    if placed == None:
+        return None
+
+    placements = [None] * len(pieces)
+    for (i, (left, top, width, height, angle)) in zip(order, placed):
+        placements[i] = (pieces[i][0], left, top, width, height, angle)
+    return placements
@@ -0,0 +1,291 @@
+'''
+Preview thumbnails for Dorm Layout Studio layouts.
+
+renderThumbnail draws a layout document (see layout_format) the way the
+design screen shows it (room outline, door, windows and furniture images),
+cropped to the room and scaled to any size. renderThumbnails does the same
+for many layouts at once in worker processes and writes one PNG per layout:
+
+    python layout_thumbnails.py building.dlsb more/*.json -o previews --size 440x300
+
+Each PNG's inputs (the document, the size and the furniture image files it
+uses) are hashed, and the hashes are kept in thumbnails.json next to the
+PNGs. Layouts whose hash hasn't changed since the last run are skipped, so
+regenerating a whole building only redraws the rooms that changed.
+
+Only pygame is needed, and no window is opened. Furniture images are found
+by file name in imageDirs; a piece whose image can't be found is drawn as a
+plain box.
+'''
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import sys
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+from layout_format import LIBRARY_MAGIC, LayoutLibrary, loadDocument
+
+# bump when drawing changes, so every thumbnail is redrawn once
+THUMBNAIL_VERSION = 1
+MANIFEST_NAME = 'thumbnails.json'
+
+# same colors as the design screen
+BACKGROUND_COLOR = (254, 247, 232)
+BORDER_COLOR = (0, 0, 0)
+DOOR_COLOR = (255, 0, 0)
+WINDOW_COLOR = (173, 216, 230)
+MISSING_IMAGE_COLOR = (220, 220, 220)
+
+################################################
+# DRAWING ONE LAYOUT
+################################################
+
+# per process: image path -> pygame Surface
+loadedImages = dict()
+
+def findImage(image, imageDirs):
+    # the local file for a furniture image URL or path, or None
+    if image == None:
+        return None
+    name = os.path.basename(urllib.parse.urlsplit(image).path)
+    for directory in imageDirs:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def loadImage(path):
+    if path not in loadedImages:
+        loadedImages[path] = pygame.image.load(path)
+    return loadedImages[path]
+
+def renderThumbnail(document, width, height, imageDirs = ()):
+    # returns a width x height pygame Surface; the room is scaled to fit and centered
+    (roomLeft, roomTop, roomWidth, roomHeight) = document['room']['rect']
+    scale = min(width / roomWidth, height / roomHeight)
+    offsetX = (width - roomWidth * scale) / 2 - roomLeft * scale
+    offsetY = (height - roomHeight * scale) / 2 - roomTop * scale
+
+    def toThumbnailRect(left, top, rectWidth, rectHeight):
+        # at least one pixel each way so thin doors and windows still show
+        x = round(offsetX + left * scale)
+        y = round(offsetY + top * scale)
+        return pygame.Rect(x, y, max(1, round(rectWidth * scale)), max(1, round(rectHeight * scale)))
+
+    surface = pygame.Surface((width, height))
+    surface.fill(BACKGROUND_COLOR)
+
+    # room outline, door and windows first, the same order as drawRoomOutline
+    pygame.draw.rect(surface, BORDER_COLOR, toThumbnailRect(roomLeft, roomTop, roomWidth, roomHeight),
+                     max(1, round(scale)))
+    if document['room']['doorRect'] != None:
+        pygame.draw.rect(surface, DOOR_COLOR, toThumbnailRect(*document['room']['doorRect']))
+    for rect in document['room']['windowRects']:
+        pygame.draw.rect(surface, WINDOW_COLOR, toThumbnailRect(*rect))
+
+    for data in document['furniture']:
+        centerX = offsetX + (data['left'] + data['width'] / 2) * scale
+        centerY = offsetY + (data['top'] + data['height'] / 2) * scale
+        path = findImage(data['image'], imageDirs)
+        if path == None:
+            rect = toThumbnailRect(data['left'], data['top'], data['width'], data['height'])
+            pygame.draw.rect(surface, MISSING_IMAGE_COLOR, rect)
+            pygame.draw.rect(surface, BORDER_COLOR, rect, 1)
+            continue
+        # like drawFurniture: drawWidth x drawHeight, rotated about the center
+        # (cmu_graphics angles are clockwise, pygame's counterclockwise)
+        size = (max(1, round(data['drawWidth'] * scale)), max(1, round(data['drawHeight'] * scale)))
+        image = pygame.transform.smoothscale(loadImage(path), size)
+        if data['angle'] % 360 != 0:
+            image = pygame.transform.rotate(image, -data['angle'])
+        surface.blit(image, image.get_rect(center = (round(centerX), round(centerY))))
+    return surface
+
+################################################
+# HASHING
+################################################
+
+def getThumbnailHash(document, width, height, imageDirs):
+    # changes whenever the PNG would: the layout, the size or an image file
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([THUMBNAIL_VERSION, width, height, document],
+                             sort_keys = True).encode('utf-8'))
+    for image in sorted(set(data['image'] for data in document['furniture']
+                            if data['image'] != None)):
+        path = findImage(image, imageDirs)
+        if path == None:
+            hasher.update(f'\0{image}\0missing'.encode('utf-8'))
+        else:
+            stat = os.stat(path)
+            hasher.update(f'\0{image}\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode('utf-8'))
+    return hasher.hexdigest()
+
+################################################
+# MANY LAYOUTS
+################################################
+
+# per process: path -> open LayoutLibrary, so a chunk of entries opens it once
+openLibraries = dict()
+
+def loadSource(source):
+    # source is a document, a document file path, or (library path, entry index)
+    if isinstance(source, dict):
+        return source
+    if isinstance(source, str):
+        return loadDocument(source)
+    (path, index) = source
+    if path not in openLibraries:
+        openLibraries[path] = LayoutLibrary(path)
+    return openLibraries[path][index]
+
+def getThumbnailPath(outputDir, name):
+    return os.path.join(outputDir, name + '.png')
+
+def renderJob(job):
+    # one layout -> (name, hash, 'rendered' / 'unchanged' / 'error', error message)
+    (name, source, outputDir, width, height, imageDirs, oldHash) = job
+    try:
+        document = loadSource(source)
+        thumbnailHash = getThumbnailHash(document, width, height, imageDirs)
+        path = getThumbnailPath(outputDir, name)
+        if thumbnailHash == oldHash and os.path.exists(path):
+            return (name, thumbnailHash, 'unchanged', None)
+        surface = renderThumbnail(document, width, height, imageDirs)
+        # pygame picks the format from the extension, so the temporary file ends in .png too
+        tempPath = f'{path}.{os.getpid()}.tmp.png'
+        pygame.image.save(surface, tempPath)
+        os.replace(tempPath, path)
+        return (name, thumbnailHash, 'rendered', None)
+    except Exception as error:
+        return (name, None, 'error', f'{type(error).__name__}: {error}')
+
+def renderJobs(jobs):
+    # runs in a worker: a whole chunk per task keeps the pickling overhead low
+    return [renderJob(job) for job in jobs]
+
+def readManifest(outputDir):
+    try:
+        with open(os.path.join(outputDir, MANIFEST_NAME), encoding = 'utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+def writeManifest(outputDir, manifest):
+    path = os.path.join(outputDir, MANIFEST_NAME)
+    tempPath = f'{path}.{os.getpid()}.tmp'
+    with open(tempPath, 'w', encoding = 'utf-8') as f:
+        json.dump(manifest, f, indent = 1, sort_keys = True)
+    os.replace(tempPath, path)
+
+def readChunks(items, chunkSize):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+def renderThumbnails(layouts, outputDir, width, height, imageDirs = (), workers = None,
+                     chunkSize = 64, onError = None):
+    '''
+    layouts is an iterable of (name, source) where source is a document, a
+    document file path or (library path, entry index); each thumbnail is
+    written to outputDir/<name>.png. Layouts whose inputs haven't changed
+    since the last run are skipped. Returns a Counter with 'rendered',
+    'unchanged' and 'error'; onError(name, message) is called for each error.
+    '''
+    if workers == None:
+        workers = os.cpu_count() or 1
+    os.makedirs(outputDir, exist_ok = True)
+    imageDirs = [os.path.abspath(directory) for directory in imageDirs]
+    manifest = readManifest(outputDir)
+    newManifest = dict()
+    counts = collections.Counter(rendered = 0, unchanged = 0, error = 0)
+
+    jobs = ((name, source, outputDir, width, height, imageDirs, manifest.get(name))
+            for (name, source) in layouts)
+
+    def collectResults(results):
+        for (name, thumbnailHash, status, message) in results:
+            counts[status] += 1
+            if thumbnailHash != None:
+                newManifest[name] = thumbnailHash
+            elif onError != None:
+                onError(name, message)
+
+    try:
+        if workers <= 1:
+            for chunk in readChunks(jobs, chunkSize):
+                collectResults(renderJobs(chunk))
+        else:
+            # same bounded window as layout_batch: memory stays flat for huge libraries
+            maxPending = 2 * workers
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                pending = collections.deque()
+                for chunk in readChunks(jobs, chunkSize):
+                    pending.append(pool.submit(renderJobs, chunk))
+                    if len(pending) >= maxPending:
+                        collectResults(pending.popleft().result())
+                while len(pending) > 0:
+                    collectResults(pending.popleft().result())
+    finally:
+        # only layouts seen this run are kept, so deleted ones drop out
+        writeManifest(outputDir, newManifest)
+    return counts
+
+################################################
+# COMMAND LINE
+################################################
+
+def getLayoutSources(paths):
+    # (name, source) for every document file and every library entry
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            isLibrary = f.read(len(LIBRARY_MAGIC)) == LIBRARY_MAGIC
+        if not isLibrary:
+            yield (stem, path)
+            continue
+        with LayoutLibrary(path) as library:
+            count = len(library)
+        for i in range(count):
+            yield (f'{stem}-{i}', (path, i))
+
+def parseSize(text):
+    (width, height) = text.lower().split('x')
+    return (int(width), int(height))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Render Dorm Layout Studio layout previews.')
+    parser.add_argument('inputs', nargs = '+',
+                        help = 'layout documents (.json or binary) and layout libraries')
+    parser.add_argument('-o', '--output', default = 'previews',
+                        help = 'directory for the PNGs (default: previews)')
+    parser.add_argument('--size', type = parseSize, default = (440, 300),
+                        help = 'thumbnail size as WIDTHxHEIGHT (default: 440x300)')
+    parser.add_argument('--images', action = 'append', default = None,
+                        help = 'directory with the furniture images (default: next to this file)')
+    parser.add_argument('-w', '--workers', type = int, default = None,
+                        help = 'worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    imageDirs = args.images or [os.path.dirname(os.path.abspath(__file__))]
+    def printError(name, message):
+        print(f'{name}: {message}', file = sys.stderr)
+    (width, height) = args.size
+    counts = renderThumbnails(getLayoutSources(args.inputs), args.output, width, height,
+                              imageDirs, workers = args.workers, onError = printError)
+    print(f"{counts['rendered']} rendered, {counts['unchanged']} unchanged, "
+          f"{counts['error']} errors", file = sys.stderr)
+    return 0 if counts['error'] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
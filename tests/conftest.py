@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the layout_* modules live at the top of the repo, next to dorm_layout_studio.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,71 @@
+import os
+import struct
+
+import pytest
+
+from layout_format import (LIBRARY_HEADER, LayoutFormatError, LayoutLibrary, appendToLibrary,
+                           encodeDocument, loadDocument, makeDocument, saveDocument, writeLibrary)
+
+def makeTestDocument(kind = 'desk', left = 10):
+    furniture = [{'kind' : kind, 'left' : left, 'top' : 20, 'width' : 30, 'height' : 40,
+                  'angle' : 0, 'image' : 'desk.png', 'drawWidth' : 30, 'drawHeight' : 40}]
+    return makeDocument({'furniture' : furniture, 'measureSegments' : [((0, 0), (5, 5))]},
+                        'single', (300, 130, 420, 290), None, [])
+
+def test_string_too_long_is_a_format_error(tmp_path):
+    path = str(tmp_path / 'design.dls')
+    saveDocument(path, makeTestDocument())
+    with pytest.raises(LayoutFormatError):
+        encodeDocument(makeTestDocument(kind = 'x' * 70000))
+    with pytest.raises(LayoutFormatError):
+        saveDocument(path, makeTestDocument(kind = 'x' * 70000))
+    # the design already saved there is untouched
+    assert loadDocument(path)['furniture'][0]['kind'] == 'desk'
+
+def test_empty_or_short_library_is_a_format_error(tmp_path):
+    path = tmp_path / 'library.dlsb'
+    path.write_bytes(b'')
+    with pytest.raises(LayoutFormatError):
+        LayoutLibrary(str(path))
+    path.write_bytes(b'DLSB')
+    with pytest.raises(LayoutFormatError):
+        LayoutLibrary(str(path))
+
+def test_index_past_end_is_a_format_error(tmp_path):
+    path = str(tmp_path / 'library.dlsb')
+    writeLibrary(path, [makeTestDocument(left = i) for i in range(3)])
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        f.truncate(size - 1)
+    with pytest.raises(LayoutFormatError):
+        LayoutLibrary(path)
+
+    # an index entry pointing past the end of the file
+    writeLibrary(path, [makeTestDocument()])
+    with open(path, 'r+b') as f:
+        (magic, version, count, indexOffset) = LIBRARY_HEADER.unpack(f.read(LIBRARY_HEADER.size))
+        f.seek(indexOffset)
+        f.write(struct.pack('<QI', 0, 10 ** 6))
+    with LayoutLibrary(path) as library:
+        with pytest.raises(LayoutFormatError):
+            library[0]
+
+def test_append_keeps_old_library_until_header_is_rewritten(tmp_path):
+    path = str(tmp_path / 'library.dlsb')
+    writeLibrary(path, [makeTestDocument(left = i) for i in range(3)])
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    appendToLibrary(path, [makeTestDocument(left = i) for i in range(3, 5)])
+    with open(path, 'rb') as f:
+        after = f.read()
+    # nothing the old header points to was overwritten
+    assert after[LIBRARY_HEADER.size:len(before)] == before[LIBRARY_HEADER.size:]
+    with LayoutLibrary(path) as library:
+        assert [document['furniture'][0]['left'] for document in library] == [0, 1, 2, 3, 4]
+
+    # a crash before the header was rewritten still reads as the old library
+    with open(path, 'wb') as f:
+        f.write(before[:LIBRARY_HEADER.size] + after[LIBRARY_HEADER.size:])
+    with LayoutLibrary(path) as library:
+        assert [document['furniture'][0]['left'] for document in library] == [0, 1, 2]
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+from layout_history import LayoutHistory, estimateBytes
+from layout_model import Furniture, Room
+
+def makeApp(pieces):
+    # just the parts of the app the history reads and writes
+    room = Room(0, 0, 10 * pieces, 100, None, [])
+    for i in range(pieces):
+        room.addFurniture(Furniture('desk', 10 * i, 0, 5, 5, image = None, angle = 0))
+    app = SimpleNamespace(room = room, measureSegments = [], measureMode = False,
+                          lastMeasureHintSegmentIndex = None, showMeasureEscHint = False)
+    return app
+
+def movePiece(app, furniture, left):
+    furniture.left = left
+    app.room.updateFurniture(furniture)
+    app.history.record(app)
+
+def test_undo_works_when_room_is_bigger_than_budget():
+    app = makeApp(2000)
+    app.history = LayoutHistory(maxBytes = 1024)
+    app.history.reset(app)
+    roomBytes = sum(estimateBytes((f.left, f.top, f.width, f.height, f.angle))
+                    for f in app.room.furnitureList)
+    assert roomBytes > app.history.maxBytes
+
+    furniture = app.room.furnitureList[1234]
+    movePiece(app, furniture, 5.5)
+    assert app.history.canUndo()
+    assert app.history.undo(app)
+    assert furniture.left == 12340
+    assert app.history.redo(app)
+    assert furniture.left == 5.5
+
+def test_budget_drops_oldest_steps_but_keeps_newest():
+    app = makeApp(10)
+    app.history = LayoutHistory(maxBytes = 4096)
+    app.history.reset(app)
+    furniture = app.room.furnitureList[0]
+    for i in range(200):
+        movePiece(app, furniture, i + 0.5)
+    assert app.history.totalBytes <= app.history.maxBytes
+    assert 0 < app.history.cursor < 200
+    assert app.history.totalBytes == sum(delta.byteSize for delta in app.history.deltas)
+
+    steps = 0
+    while app.history.undo(app):
+        steps += 1
+    assert steps == len(app.history.deltas)
+    assert furniture.left == 199.5 - steps
+
+    # a single action bigger than the whole budget can still be undone
+    app.history.maxBytes = 1
+    movePiece(app, furniture, 3.25)
+    assert app.history.cursor == 1
+    assert app.history.undo(app)
+    assert furniture.left == 199.5 - steps
+
+def test_undo_redo_add_remove_and_ruler():
+    app = makeApp(3)
+    app.history = LayoutHistory()
+    app.history.reset(app)
+    (first, second, third) = app.room.furnitureList
+
+    app.room.removeFurniture(second)
+    app.history.record(app)
+    added = Furniture('bed', 100, 50, 20, 40, image = None, angle = 90)
+    app.room.addFurniture(added)
+    app.history.record(app)
+    app.measureSegments.append(((0, 0), (10, 0)))
+    app.measureMode = True
+    app.history.record(app)
+
+    app.history.undo(app)
+    assert app.measureSegments == [] and app.measureMode == False
+    app.history.undo(app)
+    assert added not in app.room.stackOrder
+    app.history.undo(app)
+    assert app.room.furnitureList == [first, second, third]
+    assert not app.history.canUndo()
+
+    while app.history.redo(app):
+        pass
+    assert app.room.furnitureList == [first, third, added]
+    assert app.measureSegments == [((0, 0), (10, 0))] and app.measureMode == True
+
+def test_undo_drops_unregistered_changes():
+    app = makeApp(2)
+    app.history = LayoutHistory()
+    app.history.reset(app)
+    furniture = app.room.furnitureList[0]
+    movePiece(app, furniture, 3)
+    # dragged but never registered (e.g. snapped back mid-drag)
+    furniture.left = 40
+    app.room.updateFurniture(furniture)
+    assert app.history.undo(app)
+    assert furniture.left == 0
@@ -0,0 +1,33 @@
+import pytest
+
+from layout_optimizer import RoomGeometry, optimizeLayout, shutdownOptimizerPool
+
+def makeSnapshot():
+    furniture = []
+    for (i, (kind, width, height)) in enumerate([('bed', 60, 110), ('closet', 50, 25),
+                                                 ('desk', 35, 20), ('desk', 35, 20)]):
+        furniture.append({'kind' : kind, 'left' : 310 + 80 * i, 'top' : 140, 'width' : width,
+                          'height' : height, 'angle' : 0, 'image' : None,
+                          'drawWidth' : width, 'drawHeight' : height})
+    return {'furniture' : furniture, 'measureSegments' : []}
+
+@pytest.fixture(autouse = True)
+def shutdownPool():
+    yield
+    shutdownOptimizerPool()
+
+def test_default_result_does_not_depend_on_workers():
+    room = RoomGeometry((300, 130, 420, 290), doorRect = (300, 380, 10, 40))
+    snapshot = makeSnapshot()
+    oneWorker = optimizeLayout(snapshot, room, iterations = 200, workers = 1)
+    fourWorkers = optimizeLayout(snapshot, room, iterations = 200, workers = 4)
+    # more workers than the old max(workers, 4) default used to allow for
+    eightWorkers = optimizeLayout(snapshot, room, iterations = 200, workers = 8)
+    assert oneWorker == fourWorkers == eightWorkers
+    assert oneWorker['furniture'] != snapshot['furniture']
+
+def test_invalid_start_raises():
+    snapshot = makeSnapshot()
+    snapshot['furniture'][1]['left'] = snapshot['furniture'][0]['left']
+    with pytest.raises(ValueError):
+        optimizeLayout(snapshot, RoomGeometry((300, 130, 420, 290)), workers = 1)